@@ -0,0 +1,6 @@
+import sys
+
+from home_assistant_control.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
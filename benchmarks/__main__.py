@@ -0,0 +1,45 @@
+import argparse
+
+from benchmarks import (  # noqa: F401 (registration)
+        bench_camera, bench_cli, bench_client, bench_concurrency, bench_config, bench_dispatch, bench_entities,
+        bench_replay, bench_rules, bench_scheduler, bench_services, bench_shared, bench_websocket
+        )
+from benchmarks.harness import BENCHMARKS, BenchmarkContext, run, save
+
+DEFAULT_SIZES = '1000,10000,50000'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m benchmarks',
+            description='Benchmark home_assistant_control against a local fake Home Assistant.'
+            )
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f'Comma-separated entity counts (default: {DEFAULT_SIZES}).')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of latency the fake server adds to every REST request.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions per benchmark.')
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS),
+                        help='Only run the named benchmark; may be given more than once.')
+    parser.add_argument('--output', '-o', help='Write the results as JSON to this file.')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    context = BenchmarkContext(
+            sizes=[int(size) for size in args.sizes.split(',')],
+            latency=args.latency,
+            repeat=args.repeat
+            )
+
+    run_data = run(context, args.only)
+
+    if args.output:
+        save(run_data, args.output)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import time
+import tracemalloc
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.controllers.camera import CameraController
+from home_assistant_control.utils.api import make_request
+
+FRAMES = 200
+FRAME_SIZES = (16 * 1024, 256 * 1024)
+LIVE_FPS = 10
+LIVE_FRAMES = 5
+
+
+def _naive_frames(client, entity_id: str, count: int):
+    # What ad-hoc code tends to do: append every chunk to a bytes object and cut frames off its front.
+    res = make_request(f'{client.url}{CameraController.STREAM_ENDPOINT}{entity_id}', client.token, stream=True)
+    data, frames = b'', 0
+
+    try:
+        for chunk in res.iter_content(64 * 1024):
+            data += chunk
+
+            while True:
+                start = data.find(b'\xff\xd8')
+                end = data.find(b'\xff\xd9', start + 2)
+                if start < 0 or end < 0:
+                    break
+
+                data = data[end + 2:]
+                frames += 1
+                if frames == count:
+                    return
+    finally:
+        res.close()
+
+
+def _frames(camera, count: int):
+    with camera.stream() as stream:
+        for number, _ in enumerate(stream.frames(), 1):
+            if number == count:
+                return
+
+
+def _peak(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark('camera_stream')
+def camera_stream(context):
+    """
+    Read `FRAMES` MJPEG frames from the fake camera stream with `CameraStream.frames()` and with naive bytes
+    concatenation, and compare the peak Python memory each needs.
+    """
+    results = []
+
+    for frame_size in FRAME_SIZES:
+        with context.fake_server(50, camera_frame_size=frame_size) as fake:
+            client = Client(fake.url, fake.token)
+            entity_id = next(state['entity_id'] for state in fake.states if state['entity_id'].startswith('camera.'))
+            camera = CameraController(client.entities.get(entity_id))
+
+            runs = {
+                    'parser': lambda: _frames(camera, FRAMES),
+                    'naive':  lambda: _naive_frames(client, entity_id, FRAMES),
+                    }
+
+            for mode, run in runs.items():
+                samples = measure(run, repeat=context.repeat)
+                results.append(result('camera_stream', samples, params={'frame_size': frame_size, 'mode': mode},
+                                      items=FRAMES, extra={'peak_bytes': _peak(run)}))
+
+    return results
+
+
+@benchmark('camera_live')
+def camera_live(context):
+    """
+    Time how long each of the first `LIVE_FRAMES` frames of a 10 fps camera takes to come out of `frames()`; frames
+    should arrive one every 100 ms, not in bursts.
+    """
+    results = []
+
+    with context.fake_server(50, camera_frame_size=FRAME_SIZES[0], camera_fps=LIVE_FPS) as fake:
+        client = Client(fake.url, fake.token)
+        entity_id = next(state['entity_id'] for state in fake.states if state['entity_id'].startswith('camera.'))
+        camera = CameraController(client.entities.get(entity_id))
+        gaps = []
+
+        def run():
+            start = time.perf_counter()
+
+            with camera.stream() as stream:
+                for number, _ in enumerate(stream.frames(), 1):
+                    now = time.perf_counter()
+                    gaps.append(now - start)
+                    start = now
+
+                    if number == LIVE_FRAMES:
+                        return
+
+        samples = measure(run, repeat=context.repeat)
+        results.append(result('camera_live', samples, params={'frame_size': FRAME_SIZES[0], 'fps': LIVE_FPS},
+                              items=LIVE_FRAMES, extra={'max_frame_gap': max(gaps)}))
+
+    return results
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import benchmark, measure, result
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(args: list, env: dict):
+    subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+@benchmark('cli_startup')
+def cli_startup(context):
+    """
+    Time fresh interpreters: importing the CLI against importing the full client, offline completion from the entity
+    name cache and a `state get` round trip against the fake server.
+    """
+    results = []
+    env = dict(os.environ, PYTHONPATH=ROOT, XDG_CACHE_HOME=tempfile.mkdtemp(prefix='hac-bench-'))
+
+    for module in ('home_assistant_control.cli', 'home_assistant_control.client'):
+        samples = measure(lambda: _run(['-c', f'import {module}'], env), repeat=context.repeat)
+        results.append(result('cli_import', samples, params={'module': module}))
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            env.update(HAC_URL=fake.url, HAC_TOKEN=fake.token)
+            entity_id = fake.states[0]['entity_id']
+            cli = ['-m', 'home_assistant_control.cli']
+
+            _run([*cli, 'search', '--refresh', entity_id], env)
+            samples = measure(lambda: _run([*cli, 'complete', 'light.'], env), repeat=context.repeat)
+            results.append(result('cli_complete', samples, params={'entities': size}))
+
+            samples = measure(lambda: _run([*cli, 'state', 'get', entity_id], env), repeat=context.repeat)
+            results.append(result('cli_state_get', samples, params={'entities': size}))
+
+    return results
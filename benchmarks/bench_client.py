@@ -0,0 +1,17 @@
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+
+
+@benchmark('client_startup')
+def client_startup(context):
+    """
+    Time constructing a Client: token validation, the first `/api/states` download and categorization.
+    """
+    results = []
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            samples = measure(lambda: Client(fake.url, fake.token), repeat=context.repeat)
+            results.append(result('client_startup', samples, params={'entities': size}))
+
+    return results
@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+
+from benchmarks.harness import benchmark, result
+from home_assistant_control.client import Client
+from home_assistant_control.testing.fake_server import make_state
+
+READERS = (1, 4, 16)
+DURATION = 1.0
+BATCH = 64
+
+
+def _reader(entities, sample, stop: threading.Event, counts: list, errors: list):
+    reads = 0
+
+    try:
+        while not stop.is_set():
+            index = entities.snapshot()
+            for entity_id in sample:
+                index.get(entity_id)
+            # Walk one whole category too, as `Category.members` does.
+            for entity in index.all_entities.get('light', ()):
+                entity.name
+            reads += len(sample)
+    except Exception as e:  # Any error here is a consistency bug the benchmark exists to surface.
+        errors.append(e)
+
+    counts.append(reads)
+
+
+def _writer(entities, states, mode: str, stop: threading.Event, counts: list):
+    rng = random.Random(1)
+    writes = 0
+
+    while not stop.is_set():
+        if mode == 'rebuild':
+            entities._categorize_entities(states)
+            writes += len(states)
+        else:
+            batch = []
+            for state in rng.sample(states, BATCH):
+                batch.append({'entity_id': state['entity_id'],
+                              'new_state': make_state(state['entity_id'], rng.choice(('on', 'off')))})
+            entities.apply_state_changes(batch)
+            writes += len(batch)
+
+    counts.append(writes)
+
+
+@benchmark('concurrent_reads')
+def concurrent_reads(context):
+    """
+    Measure index lookups per second from several reader threads while a writer keeps replacing the index, either with
+    full rebuilds ('rebuild') or with batches of state changes ('apply'). Readers never lock; `errors` counts reads that
+    failed because they saw a half-updated index and must stay at zero.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            entities = client.entities
+            states = fake.states
+            sample = rng.sample([state['entity_id'] for state in states], 100)
+
+            for mode in ('none', 'rebuild', 'apply'):
+                for readers in READERS:
+                    samples, writes_per_second, errors = [], [], []
+
+                    for _ in range(context.repeat):
+                        stop = threading.Event()
+                        read_counts, write_counts = [], []
+                        threads = [threading.Thread(target=_reader, args=(entities, sample, stop, read_counts, errors))
+                                   for _ in range(readers)]
+                        if mode != 'none':
+                            threads.append(threading.Thread(target=_writer,
+                                                            args=(entities, states, mode, stop, write_counts)))
+
+                        start = time.perf_counter()
+                        for thread in threads:
+                            thread.start()
+
+                        time.sleep(DURATION)
+                        stop.set()
+
+                        for thread in threads:
+                            thread.join()
+
+                        elapsed = time.perf_counter() - start
+                        # Seconds per million reads: lower stays better and `throughput` comes out in reads/second.
+                        samples.append(elapsed / max(sum(read_counts), 1) * 1e6)
+                        writes_per_second.append(sum(write_counts) / elapsed)
+
+                    extra = {
+                            'errors':            len(errors),
+                            'writes_per_second': sum(writes_per_second) / len(writes_per_second),
+                            }
+                    results.append(result('concurrent_reads', samples,
+                                          params={'entities': size, 'readers': readers, 'writer': mode},
+                                          items=1_000_000, unit='s_per_million_reads', extra=extra))
+
+    return results
@@ -0,0 +1,44 @@
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.config import ConfigManager
+from home_assistant_control.config.keys import KEYS, ConfigKey
+
+LOOKUPS = 100000
+
+
+@benchmark('config_get')
+def config_get(context):
+    """
+    Time `ConfigManager.get` for a declared (typed, snapshotted) setting and an undeclared (memoized) one, and a
+    `reload()` of both config files.
+    """
+    directory = tempfile.mkdtemp(prefix='hac-bench-')
+    ini = os.path.join(directory, 'config.ini')
+    config_json = os.path.join(directory, 'config.json')
+
+    with open(ini, 'w') as f:
+        f.write('[DEFAULT]\nurl = http://localhost:8123\ntimeout = 0\n')
+
+    with open(config_json, 'w') as f:
+        json.dump({'token': 'secret', 'theme': 'dark'}, f)
+
+    manager = ConfigManager(ini, config_json, env_prefix='HAC_BENCH_', cli_args=argparse.Namespace(),
+                            keys=KEYS + (ConfigKey('timeout', float),))
+    manager.load()
+    results = []
+
+    for key in ('timeout', 'theme'):
+        def lookups():
+            for _ in range(LOOKUPS):
+                manager.get(key)
+
+        samples = measure(lookups, repeat=context.repeat)
+        results.append(result('config_get', samples, params={'key': key}, items=LOOKUPS))
+
+    results.append(result('config_reload', measure(manager.reload, repeat=context.repeat)))
+
+    return results
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.dispatch import BULK, INTERACTIVE, CommandDispatcher
+
+BULK_COMMANDS = 2000
+PRESSES = 50
+PRESS_INTERVAL = 0.01
+SERVICE_LATENCY = 0.002
+
+
+@benchmark('dispatch_priority')
+def dispatch_priority(context):
+    """
+    Time a 2,000-command bulk job on a CommandDispatcher while "wall switch presses" arrive every 10 ms, once with the
+    presses queued as bulk work (plain FIFO) and once as interactive commands, and report the presses' latency.
+    """
+    size = min(context.sizes)
+    results = []
+
+    with context.fake_server(size, latency=max(context.latency, SERVICE_LATENCY)) as fake:
+        client = Client(fake.url, fake.token)
+        entity_ids = [state['entity_id'] for state in fake.states if state['entity_id'].startswith('light.')]
+        targets = [entity_ids[number % len(entity_ids)] for number in range(BULK_COMMANDS)]
+
+        for mode, priority in (('fifo', BULK), ('priority', INTERACTIVE)):
+            latencies = []
+
+            with CommandDispatcher(client, bulk_workers=None if priority == INTERACTIVE else 4) as dispatcher:
+                def run():
+                    job = threading.Thread(target=dispatcher.submit_many, args=(targets, 'turn_off'))
+                    job.start()
+
+                    for number in range(PRESSES):
+                        start = time.perf_counter()
+                        dispatcher.submit(entity_ids[number % len(entity_ids)], 'turn_on', priority=priority).result()
+                        latencies.append(time.perf_counter() - start)
+                        time.sleep(PRESS_INTERVAL)
+
+                    job.join()
+
+                    while dispatcher.queued():
+                        time.sleep(0.001)
+
+                samples = measure(run, repeat=context.repeat)
+
+            latencies.sort()
+            results.append(result('dispatch_priority', samples, params={'entities': size, 'mode': mode},
+                                  items=BULK_COMMANDS + PRESSES,
+                                  extra={'press_p50': latencies[len(latencies) // 2],
+                                         'press_p99': latencies[int(len(latencies) * 0.99)]}))
+
+    return results
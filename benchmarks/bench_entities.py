@@ -0,0 +1,148 @@
+import random
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.entities import EntityJSON
+from home_assistant_control.testing.fake_server import make_state
+
+
+@benchmark('gather')
+def gather(context):
+    """
+    Time downloading and decoding `/api/states` with a cold cache, then categorizing the result into the index.
+    """
+    results = []
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+
+            samples = measure(lambda: EntityJSON(fake.url, fake.token).gather(), repeat=context.repeat)
+            results.append(result('gather', samples, params={'entities': size}, items=size))
+
+            data = client.entity_json.gather()
+            samples = measure(lambda: client.entities._categorize_entities(data), repeat=context.repeat)
+            results.append(result('categorize', samples, params={'entities': size}, items=size))
+
+    return results
+
+
+@benchmark('lookup')
+def lookup(context):
+    """
+    Time looking entities up by ID through the index, by name through a Category, and searching by substring.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            entity_ids = [state['entity_id'] for state in fake.states]
+            sample = [entity_id.split('.', 1) for entity_id in rng.sample(entity_ids, min(1000, len(entity_ids)))]
+
+            def by_id():
+                for category, name in sample:
+                    client.entities.get_all_in_category(category)[name]
+
+            samples = measure(by_id, repeat=context.repeat)
+            results.append(result('lookup_by_id', samples, params={'entities': size}, items=len(sample)))
+
+            few = sample[:100]
+
+            def by_name():
+                for category, name in few:
+                    client.entities.categories[category]['object'].find_by_name(name)
+
+            samples = measure(by_name, repeat=context.repeat)
+            results.append(result('find_by_name', samples, params={'entities': size}, items=len(few)))
+
+            queries = [name[-3:] for _, name in sample[:20]]
+
+            def search():
+                for query in queries:
+                    for category in client.entities.categories.values():
+                        category['object'].search_by_name(query)
+
+            samples = measure(search, repeat=context.repeat)
+            results.append(result('search_by_name', samples, params={'entities': size}, items=len(queries)))
+
+    return results
+
+
+@benchmark('read_many')
+def read_many(context):
+    """
+    Time `Entities.read_many` answering from the index, and refreshing stale entities with each strategy.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            entity_ids = [state['entity_id'] for state in fake.states]
+            wanted = rng.sample(entity_ids, 50)
+
+            samples = measure(lambda: client.entities.read_many(wanted), repeat=context.repeat)
+            results.append(result('read_many', samples, params={'entities': size, 'stale': 0}, items=len(wanted)))
+
+            for stale in (1, 8, 50):
+                for strategy in ('single', 'full'):
+                    # max_age=0 makes every requested entity stale.
+                    samples = measure(lambda: client.entities.read_many(wanted[:stale], max_age=0, strategy=strategy),
+                                      repeat=context.repeat)
+                    results.append(result('read_many', samples,
+                                          params={'entities': size, 'stale': stale, 'strategy': strategy},
+                                          items=stale))
+
+    return results
+
+
+@benchmark('change_feed')
+def change_feed(context):
+    """
+    Compare two ways a poller finds out what changed since its last poll, with a few entities changing in between:
+    diffing every entity against its previous copy, and asking `Entities.changes_since()`.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            entities = client.entities
+            states = fake.states
+
+            for changed in (1, 10, 100):
+                def change():
+                    batch = []
+                    for state in rng.sample(states, changed):
+                        batch.append({'entity_id': state['entity_id'],
+                                      'new_state': make_state(state['entity_id'], str(rng.random()))})
+                    entities.apply_state_changes(batch)
+
+                previous = {entity.entity_id: entity for members in entities.all_entities.values()
+                            for entity in members}
+
+                def diff():
+                    nonlocal previous
+                    change()
+                    current = {entity.entity_id: entity for members in entities.all_entities.values()
+                               for entity in members}
+                    [entity_id for entity_id, entity in current.items() if previous.get(entity_id) is not entity]
+                    previous = current
+
+                cursor = entities.change_cursor
+
+                def poll():
+                    nonlocal cursor
+                    change()
+                    cursor = entities.changes_since(cursor).cursor
+
+                for mode, func in (('diff', diff), ('cursor', poll)):
+                    samples = measure(func, repeat=context.repeat)
+                    results.append(result('change_feed', samples,
+                                          params={'entities': size, 'changed': changed, 'mode': mode}))
+
+    return results
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.testing.fake_server import make_state
+from home_assistant_control.testing.recorder import TrafficRecorder, TrafficReplayer
+
+EVENTS = 10000
+
+
+def _record(path: str, states: list, count: int):
+    with TrafficRecorder(path) as recorder:
+        recorder.record_states(states)
+
+        for i in range(count):
+            state = states[i % len(states)]
+            new = make_state(state['entity_id'], 'off' if i // len(states) % 2 else 'on', state['attributes'])
+            recorder.record_event({'event_type': 'state_changed', 'data': {'entity_id': new['entity_id'],
+                                                                           'new_state': new}})
+
+
+@benchmark('replay')
+def replay(context):
+    """
+    Replay a recorded snapshot plus `EVENTS` state changes as fast as possible into a client's entity index and through
+    the fake server. The report's p99 lag and per-stage seconds are kept as extras, with the recording's size.
+    """
+    results = []
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            path = os.path.join(tempfile.mkdtemp(prefix='hac-bench-'), 'traffic.hacr')
+            _record(path, fake.states, EVENTS)
+            bytes_per_event = os.path.getsize(path) / EVENTS
+
+            targets = {
+                    'entities': lambda replayer: replayer.replay_into(client.entities),
+                    'server':   lambda replayer: replayer.replay_to_server(fake),
+                    }
+
+            for target, run in targets.items():
+                reports = []
+                samples = measure(lambda: reports.append(run(TrafficReplayer(path, speed=None))),
+                                  repeat=context.repeat)
+                report = reports[-1]
+                extra = {'lag_p99': report['lag']['p99'], 'bytes_per_event': bytes_per_event,
+                         **{f'{stage}_seconds': summary['seconds'] for stage, summary in report['stages'].items()}}
+
+                results.append(result('replay', samples, params={'entities': size, 'target': target},
+                                      items=EVENTS, extra=extra))
+
+            os.remove(path)
+
+    return results
@@ -0,0 +1,47 @@
+import random
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.rules import Rule, RuleEngine, Trigger, numeric
+from home_assistant_control.testing.fake_server import make_state
+
+RULES = (10, 1000)
+CHANGES = 10000
+
+
+@benchmark('rule_evaluation')
+def rule_evaluation(context):
+    """
+    Time `RuleEngine.process` over a batch of state changes with few and with many rules, half of them on patterns.
+    Most changes touch entities no rule watches, as on a real instance.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            entity_ids = [state['entity_id'] for state in fake.states]
+            changes = []
+
+            for entity_id in rng.choices(entity_ids, k=CHANGES):
+                old_state, new_state = rng.sample(('on', 'off', '12', '40'), 2)
+                changes.append({'entity_id': entity_id, 'old_state': make_state(entity_id, old_state),
+                                'new_state': make_state(entity_id, new_state)})
+
+            for rule_count in RULES:
+                engine = RuleEngine(client)
+
+                for number, entity_id in enumerate(rng.sample(entity_ids, min(rule_count, len(entity_ids)))):
+                    # Every other rule watches a pattern covering its entity's whole domain.
+                    pattern = entity_id if number % 2 else f'{entity_id.split(".")[0]}.*{entity_id[-2:]}'
+                    engine.add_rule(Rule(f'rule_{number}', [Trigger(pattern, to='on')], action=lambda change: None,
+                                         conditions=[numeric(entity_id, below=1000)]))
+
+                samples = measure(lambda: engine.process(changes), repeat=context.repeat)
+                engine.close()
+
+                results.append(result('rule_evaluation', samples, params={'entities': size, 'rules': rule_count},
+                                      items=CHANGES))
+
+    return results
@@ -0,0 +1,56 @@
+import time
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.scheduler import Scheduler
+
+COMMANDS = 10000
+
+
+@benchmark('scheduler')
+def scheduler(context):
+    """
+    Time scheduling, rescheduling and cancelling many commands, then firing a burst of them that all come due in one
+    tick; `service_calls` shows how many calls the batching turned the burst into.
+    """
+    size = min(context.sizes)
+    results = []
+
+    with context.fake_server(size) as fake:
+        client = Client(fake.url, fake.token)
+        entity_ids = [state['entity_id'] for state in fake.states]
+        targets = [entity_ids[number % len(entity_ids)] for number in range(COMMANDS)]
+
+        with Scheduler(client) as sched:
+            def schedule():
+                return [sched.schedule(entity_id, 'turn_off', 3600, key=str(number))
+                        for number, entity_id in enumerate(targets)]
+
+            samples = measure(lambda: (schedule(), sched.cancel_all()), repeat=context.repeat)
+            results.append(result('scheduler_schedule', samples, items=COMMANDS))
+
+            handles = schedule()
+            samples = measure(lambda: [handle.reschedule(3600) for handle in handles], repeat=context.repeat)
+            results.append(result('scheduler_reschedule', samples, items=COMMANDS))
+
+            samples = measure(lambda: [handle.cancel() for handle in schedule()], repeat=context.repeat)
+            results.append(result('scheduler_schedule_cancel', samples, items=COMMANDS))
+
+            burst = entity_ids[:min(1000, len(entity_ids))]
+            samples = []
+
+            for _ in range(context.repeat):
+                calls_before = sum(fake.request_counts.get(key, 0) for key in fake.request_counts if 'services' in key)
+                start = time.perf_counter()
+                last = [sched.schedule(entity_id, 'turn_off', 0.1) for entity_id in burst][-1]
+
+                while not last.fired and not last.last_error:
+                    time.sleep(0.001)
+
+                samples.append(time.perf_counter() - start)
+                calls = sum(fake.request_counts.get(key, 0) for key in fake.request_counts if 'services' in key)
+
+            results.append(result('scheduler_burst', samples, params={'commands': len(burst)}, items=len(burst),
+                                  extra={'service_calls': calls - calls_before}))
+
+    return results
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.controllers.lights import LightController
+
+CALLS = 200
+SLOW_DEVICE_DELAY = 0.5
+THREADS = 8
+
+
+@benchmark('service_calls')
+def service_calls(context):
+    """
+    Time `LightController.turn_on` calls, one after the other and from a pool of threads.
+    """
+    size = min(context.sizes)
+
+    with context.fake_server(size) as fake:
+        client = Client(fake.url, fake.token)
+        lights = list(client.entities.get_all_in_category('light').values())
+        controllers = [LightController(lights[index % len(lights)]) for index in range(CALLS)]
+
+        def sequential():
+            for controller in controllers:
+                controller.turn_on()
+
+        def threaded():
+            with ThreadPoolExecutor(THREADS) as pool:
+                list(pool.map(lambda controller: controller.turn_on(), controllers))
+
+        return [
+                result('service_calls', measure(sequential, repeat=context.repeat),
+                       params={'entities': size, 'threads': 1}, items=CALLS),
+                result('service_calls', measure(threaded, repeat=context.repeat),
+                       params={'entities': size, 'threads': THREADS}, items=CALLS),
+                ]
+
+
+@benchmark('command_then_read')
+def command_then_read(context):
+    """
+    Time what a UI does after a button press: `turn_on()` followed by `get_state()`, with and without optimistic mode,
+    and count the REST requests each pair costs. The fake devices are slow (the change lands after the call returns),
+    so optimistic states stay pending while they are read back.
+    """
+    size = min(context.sizes)
+    results = []
+
+    with context.fake_server(size, service_delay=SLOW_DEVICE_DELAY) as fake:
+        for optimistic in (False, True):
+            client = Client(fake.url, fake.token, optimistic=optimistic)
+            lights = list(client.entities.get_all_in_category('light').values())
+            controllers = [LightController(lights[index % len(lights)]) for index in range(CALLS)]
+
+            def press():
+                for controller in controllers:
+                    controller.turn_on()
+                    controller.get_state()
+
+            before = sum(fake.request_counts.values())
+            samples = measure(press, repeat=context.repeat)
+            requests = (sum(fake.request_counts.values()) - before) / (CALLS * (context.repeat + 1))
+
+            results.append(result('command_then_read', samples, params={'entities': size, 'optimistic': optimistic},
+                                  items=CALLS, extra={'requests_per_command': requests}))
+
+            if client.optimistic is not None:
+                client.optimistic.close()
+
+    return results
+
+
+@benchmark('controller_overhead')
+def controller_overhead(context):
+    """
+    Time the client-side work of preparing a `turn_on` (controller, URL and payload, but no request), building a new
+    LightController per command against reusing the one from `client.controllers`.
+    """
+    results = []
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            lights = list(client.entities.get_all_in_category('light').values())[:CALLS]
+            entity_ids = [light.entity_id for light in lights]
+
+            def fresh():
+                for light in lights:
+                    controller = LightController(light)
+                    controller.get_endpoint_url('turn_on')
+                    controller.service_payload.get_payload()
+
+            def registry():
+                controllers = client.controllers
+                for entity_id in entity_ids:
+                    controller = controllers[entity_id]
+                    controller.service_url('turn_on')
+                    controller.base_payload
+
+            for mode, func in (('fresh', fresh), ('registry', registry)):
+                samples = measure(func, repeat=context.repeat)
+                results.append(result('controller_overhead', samples, params={'entities': size, 'mode': mode},
+                                      items=len(lights)))
+
+    return results
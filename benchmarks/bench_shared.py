@@ -0,0 +1,71 @@
+import os
+import random
+import tempfile
+import tracemalloc
+
+from benchmarks.harness import benchmark, measure, result
+from home_assistant_control.client import Client
+from home_assistant_control.client.shared import SharedStatePublisher
+
+WORKERS = 20
+
+
+def _upstream_requests(fake) -> int:
+    return sum(fake.request_counts.values())
+
+
+def _allocated(func) -> tuple:
+    tracemalloc.start()
+    try:
+        value = func()
+        return value, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark('shared_state')
+def shared_state(context):
+    """
+    Compare starting `WORKERS` clients the usual way with attaching them to a SharedStatePublisher, and time publishing
+    and looking entities up through shared memory. `upstream_requests` counts what the workers asked of Home Assistant;
+    `bytes_per_worker` is the Python memory each client holds right after starting.
+    """
+    results = []
+    rng = random.Random(0)
+
+    for size in context.sizes:
+        with context.fake_server(size) as fake:
+            client = Client(fake.url, fake.token)
+            path = os.path.join(tempfile.gettempdir(), f'hac-bench-{os.getpid()}.state')
+            publisher = SharedStatePublisher(client.entities, path=path)
+
+            try:
+                samples = measure(publisher.publish, repeat=context.repeat)
+                results.append(result('shared_publish', samples, params={'entities': size}, items=size))
+
+                for mode in ('polling', 'shared'):
+                    kwargs = {'shared_state': path} if mode == 'shared' else {}
+                    before = _upstream_requests(fake)
+                    _, allocated = _allocated(lambda: Client(fake.url, fake.token, **kwargs))
+                    samples = measure(lambda: [Client(fake.url, fake.token, **kwargs) for _ in range(WORKERS)],
+                                      repeat=context.repeat, warmup=0)
+                    requests_per_worker = (_upstream_requests(fake) - before) / (WORKERS * context.repeat + 1)
+
+                    results.append(result('shared_attach', samples, params={'entities': size, 'mode': mode},
+                                          items=WORKERS, extra={'upstream_requests_per_worker': requests_per_worker,
+                                                                'bytes_per_worker': allocated}))
+
+                    worker = Client(fake.url, fake.token, **kwargs)
+                    entity_ids = rng.sample([state['entity_id'] for state in fake.states], min(1000, size))
+
+                    def lookup():
+                        for entity_id in entity_ids:
+                            worker.entities.get(entity_id)
+
+                    samples = measure(lookup, repeat=context.repeat)
+                    results.append(result('shared_lookup', samples, params={'entities': size, 'mode': mode},
+                                          items=len(entity_ids)))
+            finally:
+                publisher.close(unlink=True)
+
+    return results
@@ -0,0 +1,141 @@
+import asyncio
+import io
+import threading
+import time
+from contextlib import redirect_stdout
+from functools import partial
+
+from benchmarks.harness import benchmark, result
+from home_assistant_control.client import Client
+from home_assistant_control.client.ingest import EventIngestor
+from home_assistant_control.client.websocket import WebSocketClient
+from home_assistant_control.utils.jsonlib import available_backends
+
+EVENTS = 5000
+COUNTERS = ('hac_websocket_messages_received_total', 'hac_websocket_bytes_received_total',
+            'hac_websocket_decode_seconds_total')
+
+
+async def _connect(client, json_backend: str = None) -> WebSocketClient:
+    ws = WebSocketClient(client, json_backend=json_backend)
+    await ws.connect()
+    await ws.authenticate()
+    return ws
+
+
+def _counters(client, baseline: tuple = None) -> tuple:
+    values = tuple(client.metrics.counter(name) for name in COUNTERS)
+    if baseline is None:
+        return values
+
+    return tuple(value - base for value, base in zip(values, baseline))
+
+
+def _emit(fake, count: int) -> threading.Thread:
+    emitter = threading.Thread(target=fake.emit_state_changes, args=(count,), daemon=True)
+    emitter.start()
+    return emitter
+
+
+async def _receive_one_by_one(client, fake, count: int, json_backend: str = None) -> tuple:
+    ws = await _connect(client, json_backend)
+    await ws.send_message({'id': 1, 'type': 'subscribe_events', 'event_type': 'state_changed'})
+    await ws.receive_message()
+
+    baseline = _counters(client)
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    emitter = _emit(fake, count)
+
+    received = 0
+    while received < count:
+        message = await ws.receive_message()
+        if message.get('type') == 'event':
+            received += 1
+
+    elapsed, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+    counters = _counters(client, baseline)
+    emitter.join()
+    await ws.close()
+
+    return elapsed, cpu, counters
+
+
+async def _ingest_batched(client, fake, count: int, json_backend: str = None, stream: str = 'state_changed') -> tuple:
+    ws = await _connect(client, json_backend)
+    ingestor = EventIngestor(ws, batch_size=512, batch_interval=0.01, max_queue=count + len(fake.states),
+                             stream=stream)
+    # The entities stream starts with a snapshot of every entity; let that land before timing the changes.
+    target = count + (len(fake.states) if stream == 'entities' else 0)
+    done = asyncio.Event()
+    ready = asyncio.Event()
+    ingestor.add_batch_listener(lambda batch: ingestor.processed >= target - count and ready.set())
+    ingestor.add_batch_listener(lambda batch: ingestor.processed >= target and done.set())
+    await ingestor.start()
+
+    if stream == 'entities':
+        await ready.wait()
+
+    # Only the changes count towards the per-message figures, not the snapshot or the handshake.
+    baseline = _counters(client)
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    emitter = _emit(fake, count)
+    await done.wait()
+    elapsed, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+    counters = _counters(client, baseline)
+
+    emitter.join()
+    await ingestor.stop()
+    await ws.close()
+
+    return elapsed, cpu, counters
+
+
+@benchmark('websocket_ingest')
+def websocket_ingest(context):
+    """
+    Time receiving and decoding a burst of state changes, one `state_changed` message at a time through
+    WebSocketClient and through the batching EventIngestor, with every available JSON backend. The batched path is
+    also run on the compressed `subscribe_entities` stream; compare `bytes_per_message` and the CPU figures. The
+    per-message figures only count the messages carrying the changes, not the initial snapshot.
+
+    The fake server shares this process, so besides wall time the CPU time of the client's own thread is reported as
+    `websocket_ingest_cpu`; that is the figure to compare for the client's ingestion cost.
+    """
+    size = min(context.sizes)
+    results = []
+
+    with context.fake_server(size, latency=0) as fake:
+        runs = (
+                ('receive', 'state_changed', _receive_one_by_one),
+                ('batched', 'state_changed', _ingest_batched),
+                ('batched', 'entities', partial(_ingest_batched, stream='entities')),
+                )
+
+        for backend in available_backends():
+            for mode, stream, run_once in runs:
+                client = Client(fake.url, fake.token)
+                samples, cpu_samples = [], []
+                received, received_bytes, decode_seconds = 0, 0, 0.0
+
+                # Keep the client's connection messages out of the benchmark's output.
+                with redirect_stdout(io.StringIO()):
+                    for _ in range(context.repeat):
+                        elapsed, cpu, (messages, size_bytes, decode) = asyncio.run(
+                                run_once(client, fake, EVENTS, backend))
+                        samples.append(elapsed)
+                        cpu_samples.append(cpu)
+                        received += messages
+                        received_bytes += size_bytes
+                        decode_seconds += decode
+
+                extra = {
+                        'bytes_per_message':          received_bytes / received,
+                        'decode_seconds_per_message': decode_seconds / received,
+                        }
+
+                params = {'entities': size, 'mode': mode, 'stream': stream, 'json': backend}
+                results.append(result('websocket_ingest', samples, params=params, items=EVENTS, extra=extra))
+                results.append(result('websocket_ingest_cpu', cpu_samples, params=params, items=EVENTS,
+                                      unit='cpu_s'))
+
+    return results
@@ -0,0 +1,67 @@
+import argparse
+import json
+import sys
+
+from benchmarks.harness import result_key
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10):
+    """
+    Compare the median of every result present in both runs.
+
+    Args:
+        baseline (dict): The older run.
+        current (dict): The newer run.
+        threshold (float): Relative slowdown above which a result counts as a regression.
+
+    Returns:
+        tuple: The report lines and the keys of the regressed results.
+    """
+    old = {result_key(entry): entry for entry in baseline['results']}
+    new = {result_key(entry): entry for entry in current['results']}
+
+    lines = [f'{"benchmark":<60} {"baseline ms":>12} {"current ms":>12} {"change":>8}']
+    regressions = []
+
+    for key in sorted(old.keys() & new.keys()):
+        before = old[key]['stats']['median']
+        after = new[key]['stats']['median']
+        change = (after - before) / before if before else 0.0
+        flag = ' !' if change > threshold else ''
+
+        if flag:
+            regressions.append(key)
+
+        lines.append(f'{key:<60} {before * 1000:12.3f} {after * 1000:12.3f} {change:+8.1%}{flag}')
+
+    for key in sorted(new.keys() - old.keys()):
+        lines.append(f'{key:<60} {"-":>12} {new[key]["stats"]["median"] * 1000:12.3f}      new')
+
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare',
+                                     description='Compare two benchmark result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown that counts as a regression (default: 0.10).')
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    lines, regressions = compare(baseline, current, args.threshold)
+
+    print(f'baseline: {baseline["revision"]}  current: {current["revision"]}')
+    print('\n'.join(lines))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
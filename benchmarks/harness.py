@@ -0,0 +1,181 @@
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from home_assistant_control.testing.fake_server import FakeHomeAssistant
+
+SCHEMA_VERSION = 1
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """
+    Register a benchmark function under the given name.
+
+    The function is called with a `BenchmarkContext` and must return a list of results built with `result()`.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+class BenchmarkContext:
+    """
+    Options shared by every benchmark in a run.
+    """
+
+    def __init__(self, sizes: List[int], latency: float = 0.0, repeat: int = 5):
+        self.sizes = sizes
+        self.latency = latency
+        self.repeat = repeat
+
+    @contextmanager
+    def fake_server(self, entity_count: int, **kwargs):
+        """
+        Run a FakeHomeAssistant for the duration of a `with` block.
+        """
+        kwargs.setdefault('latency', self.latency)
+        with FakeHomeAssistant(entity_count=entity_count, **kwargs) as fake:
+            yield fake
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> List[float]:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        func (Callable): The function to time.
+        repeat (int): The number of timed calls.
+        warmup (int): The number of untimed calls made first.
+
+    Returns:
+        List[float]: The duration of each timed call, in seconds.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return samples
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def result(name: str, samples: List[float], params: Dict[str, Any] = None, items: int = None,
+           unit: str = 's', extra: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Build a machine-readable benchmark result.
+
+    Args:
+        name (str): The benchmark's name.
+        samples (list): The measured durations, in seconds.
+        params (dict): The parameters the benchmark ran with, e.g. the entity count.
+        items (int): How many operations each sample covered; enables the throughput figure.
+        unit (str): The unit of the samples.
+        extra (dict): Any further figures worth keeping, e.g. bytes transferred.
+
+    Returns:
+        dict: The result.
+    """
+    median = statistics.median(samples)
+    entry = {
+            'name':    name,
+            'params':  params or {},
+            'unit':    unit,
+            'samples': samples,
+            'stats':   {
+                    'min':    min(samples),
+                    'max':    max(samples),
+                    'mean':   statistics.fmean(samples),
+                    'median': median,
+                    'p95':    percentile(samples, 0.95),
+                    'stdev':  statistics.stdev(samples) if len(samples) > 1 else 0.0,
+                    },
+            }
+
+    if items:
+        entry['items'] = items
+        entry['stats']['throughput'] = items / median if median else float('inf')
+
+    if extra:
+        entry['extra'] = extra
+
+    return entry
+
+
+def result_key(entry: Dict[str, Any]) -> str:
+    """
+    Get the key identifying a result across runs, e.g. `gather[entities=1000]`.
+    """
+    params = ','.join(f'{key}={value}' for key, value in sorted(entry['params'].items()))
+    return f'{entry["name"]}[{params}]' if params else entry['name']
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(
+                ['git', 'describe', '--always', '--dirty'],
+                capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+                ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(context: BenchmarkContext, names: List[str] = None, report=print) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks (all of them by default).
+
+    Returns:
+        dict: The run's metadata and results, ready to be written as JSON.
+    """
+    results = []
+
+    for name in names or list(BENCHMARKS):
+        report(f'# {name}')
+
+        for entry in BENCHMARKS[name](context):
+            stats = entry['stats']
+            throughput = f'  {stats["throughput"]:,.0f}/s' if 'throughput' in stats else ''
+            report(f'{result_key(entry):<60} median {stats["median"] * 1000:10.3f} ms{throughput}')
+            results.append(entry)
+
+    return {
+            'schema':    SCHEMA_VERSION,
+            'revision':  revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python':    sys.version.split()[0],
+            'platform':  platform.platform(),
+            'options':   {'sizes': context.sizes, 'latency': context.latency, 'repeat': context.repeat},
+            'results':   results,
+            }
+
+
+def save(run_data: Dict[str, Any], path: str):
+    with open(path, 'w') as f:
+        json.dump(run_data, f, indent=2)
@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# Only the standard library is imported up front. `requests` and the rest of the package load when a command actually
+# talks to Home Assistant, so `--help` and `complete` stay fast enough to run from a shell completion hook.
+
+CACHE_TTL = 24 * 60 * 60
+ENV_PREFIX = 'HAC_'
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+
+
+def _config(args):
+    from home_assistant_control.config import ConfigManager
+    from home_assistant_control.config.default_dirs import CONFIG_DIR
+
+    config_file = args.config or os.path.join(CONFIG_DIR, 'config.ini')
+    manager = ConfigManager(config_file, os.path.join(CONFIG_DIR, 'config.json'), env_prefix=ENV_PREFIX, cli_args=args)
+    manager.load()
+
+    return manager
+
+
+def _connection(args):
+    manager = _config(args)
+    # --url/--token, then HAC_URL/HAC_TOKEN, then the config files.
+    url = manager.get('url')
+    token = manager.get('token')
+
+    if not url or not token:
+        raise SystemExit(f'error: no Home Assistant URL or token; pass --url/--token, set {ENV_PREFIX}URL/'
+                         f'{ENV_PREFIX}TOKEN or add them to {manager.file.file_path}')
+
+    from home_assistant_control.utils import validate_and_transform_url
+
+    return validate_and_transform_url(url), token
+
+
+def _policy(args):
+    from home_assistant_control.utils.resilience import RequestPolicy
+
+    return RequestPolicy(read_timeout=args.timeout, max_retries=1)
+
+
+def _request(args, path: str, method: str = 'GET', data: dict = None, connection: tuple = None):
+    from home_assistant_control.utils.api import make_request
+
+    # No up-front token check: a bad token fails the real request just the same, one round trip sooner.
+    url, token = connection or _connection(args)
+    return make_request(f'{url}{path}', token, method=method, data=data, policy=_policy(args)).json()
+
+
+def cache_path(url: str) -> str:
+    """
+    Get where the entity name cache for a Home Assistant instance is kept.
+
+    Args:
+        url (str): The URL of the Home Assistant instance.
+
+    Returns:
+        str: The path.
+    """
+    import hashlib
+
+    from home_assistant_control.config.default_dirs import CACHE_DIR
+
+    return os.path.join(CACHE_DIR, f'entities-{hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]}.json')
+
+
+def read_cache(url: str, max_age: float = None) -> list:
+    """
+    Read the cached entity IDs and friendly names.
+
+    Args:
+        url (str): The URL of the Home Assistant instance.
+        max_age (float): Ignore a cache older than this many seconds.
+
+    Returns:
+        list: `[entity_id, friendly_name]` pairs, or None if there is no usable cache.
+    """
+    try:
+        with open(cache_path(url), 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if max_age is not None and time.time() - cache.get('fetched_at', 0) > max_age:
+        return None
+
+    return cache.get('entities')
+
+
+def write_cache(url: str, states: list) -> list:
+    """
+    Cache the entity IDs and friendly names from a `/api/states` response.
+
+    Args:
+        url (str): The URL of the Home Assistant instance.
+        states (list): The states.
+
+    Returns:
+        list: The cached `[entity_id, friendly_name]` pairs.
+    """
+    entities = sorted([state['entity_id'], state.get('attributes', {}).get('friendly_name') or '']
+                      for state in states)
+    path = cache_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write aside and rename, so a completion running at the same time never reads half a file.
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'url': url, 'fetched_at': time.time(), 'entities': entities}, f)
+    os.replace(temporary, path)
+
+    return entities
+
+
+def _cached_url(args) -> str:
+    # Completion must never block on the network or fail loudly; settle for whatever URL is configured.
+    try:
+        return _connection(args)[0]
+    except (SystemExit, ValueError):
+        return None
+
+
+def cmd_state_get(args) -> int:
+    state = _request(args, f'/api/states/{args.entity_id}')
+
+    if args.json:
+        print(json.dumps(state, indent=2))
+    elif args.attribute:
+        value = state.get('attributes', {}).get(args.attribute)
+        print(json.dumps(value) if isinstance(value, (dict, list)) else value)
+    else:
+        print(state['state'])
+
+    return EXIT_OK
+
+
+def _service_data(args) -> dict:
+    data = json.loads(args.data) if args.data else {}
+
+    for pair in args.set or ():
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise SystemExit(f'error: --set expects key=value, got {pair!r}')
+
+        # Numbers, booleans and lists come through as JSON; anything else is a plain string.
+        try:
+            data[key] = json.loads(value)
+        except ValueError:
+            data[key] = value
+
+    if args.entity_ids:
+        data['entity_id'] = args.entity_ids if len(args.entity_ids) > 1 else args.entity_ids[0]
+
+    return data
+
+
+def cmd_service_call(args) -> int:
+    domain, separator, service = args.service.partition('.')
+    if not separator:
+        raise SystemExit(f'error: expected <domain>.<service>, got {args.service!r}')
+
+    changed = _request(args, f'/api/services/{domain}/{service}', method='POST', data=_service_data(args))
+
+    if args.json:
+        print(json.dumps(changed, indent=2))
+    else:
+        for state in changed:
+            print(f'{state["entity_id"]}\t{state["state"]}')
+
+    return EXIT_OK
+
+
+def cmd_search(args) -> int:
+    connection = _connection(args)
+    url = connection[0]
+    entities = None if args.refresh else read_cache(url, CACHE_TTL)
+
+    if entities is None:
+        entities = write_cache(url, _request(args, '/api/states', connection=connection))
+
+    query = args.query.lower()
+
+    for entity_id, friendly_name in entities:
+        if args.domain and not entity_id.startswith(f'{args.domain}.'):
+            continue
+
+        if query in entity_id or query in friendly_name.lower():
+            print(f'{entity_id}\t{friendly_name}' if friendly_name else entity_id)
+
+    return EXIT_OK
+
+
+def cmd_complete(args) -> int:
+    url = _cached_url(args)
+    entities = read_cache(url) if url else None
+
+    for entity_id, _ in entities or ():
+        if entity_id.startswith(args.prefix):
+            print(entity_id)
+
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog='hac', description='Control Home Assistant from the command line.')
+    parser.add_argument('--url', help=f'The URL of Home Assistant (or {ENV_PREFIX}URL, or "url" in the config file).')
+    parser.add_argument('--token', help=f'A long-lived access token (or {ENV_PREFIX}TOKEN).')
+    parser.add_argument('--config', help='The config file to read; defaults to config.ini in the config directory.')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for Home Assistant.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    state = commands.add_parser('state', help='Read entity states.').add_subparsers(dest='action', required=True)
+    get = state.add_parser('get', help="Print an entity's state.")
+    get.add_argument('entity_id')
+    get.add_argument('-a', '--attribute', help='Print this attribute instead of the state.')
+    get.add_argument('--json', action='store_true', help='Print the whole state object.')
+    get.set_defaults(handler=cmd_state_get)
+
+    service = commands.add_parser('service', help='Call services.').add_subparsers(dest='action', required=True)
+    call = service.add_parser('call', help='Call a service, e.g. "light.turn_on light.kitchen".')
+    call.add_argument('service', help='<domain>.<service>')
+    call.add_argument('entity_ids', nargs='*', metavar='entity_id')
+    call.add_argument('--data', help='Service data as a JSON object.')
+    call.add_argument('-s', '--set', action='append', metavar='KEY=VALUE', help='One service data field.')
+    call.add_argument('--json', action='store_true', help='Print the changed states as JSON.')
+    call.set_defaults(handler=cmd_service_call)
+
+    search = commands.add_parser('search', help='Find entities by ID or friendly name.')
+    search.add_argument('query')
+    search.add_argument('-d', '--domain', help='Only search this domain.')
+    search.add_argument('--refresh', action='store_true', help='Reload the entity name cache first.')
+    search.set_defaults(handler=cmd_search)
+
+    complete = commands.add_parser('complete', help='Print cached entity IDs starting with a prefix (offline).')
+    complete.add_argument('prefix', nargs='?', default='')
+    complete.set_defaults(handler=cmd_complete)
+
+    return parser
+
+
+def main(argv: list = None) -> int:
+    """
+    Run the command line.
+
+    Args:
+        argv (list): The arguments; `sys.argv[1:]` by default.
+
+    Returns:
+        int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+
+    try:
+        return args.handler(args)
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception as e:
+        from home_assistant_control.errors.client import APIError
+
+        if not isinstance(e, APIError):
+            raise
+
+        print(f'error: {e}', file=sys.stderr)
+        return EXIT_USAGE if getattr(e, 'status_code', None) in (401, 403, 404) else EXIT_ERROR
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,165 @@
+from typing import Iterable, List
+
+from home_assistant_control.controllers.registry import ControllerRegistry
 from home_assistant_control.entities import EntityJSON, Entity, Entities
+from home_assistant_control.entities.optimistic import OptimisticUpdates
+from home_assistant_control.entities.registry import Registry
 from home_assistant_control.utils import validate_and_transform_url
 from home_assistant_control.utils.api import validate_and_return_token, validate_token
+from home_assistant_control.utils.metrics import Metrics
+from home_assistant_control.utils.resilience import RequestPolicy, CircuitBreaker
 
 
 class Client:
 
-    def __init__(self, url, token):
+    def __init__(self, url, token, policy: RequestPolicy = None, metrics: Metrics = None, shared_state: str = None,
+                 optimistic: bool = False):
+        """
+        Initializes a new instance of the Client class.
+
+        Args:
+            url (str): The URL of the Home Assistant instance.
+            token (str): A long-lived access token.
+            policy (RequestPolicy): The timeout/retry/circuit-breaker policy for every REST call made by this client.
+                Defaults to a policy with its own circuit breaker.
+            metrics (Metrics): The registry this client records its instrumentation in. Defaults to a new one.
+            shared_state (str): Attach read-only to the states a `SharedStatePublisher` in another process publishes to
+                this file, instead of validating the token and downloading `/api/states`. Service calls still go to
+                Home Assistant directly.
+            optimistic (bool): Put the expected outcome of successful service calls made through controllers in the
+                entity index right away, until Home Assistant confirms it; see `OptimisticUpdates`.
+        """
+        self.__policy = policy or RequestPolicy(breaker=CircuitBreaker())
+        self.__metrics = metrics or Metrics()
         self.__url = validate_and_transform_url(url)
-        self.__token = validate_and_return_token(self.__url, token)
+        self.__optimistic = None
+        self.__controllers = None
+        self.__registry = None
+        self.entity_data = None
+
+        if shared_state is not None:
+            if optimistic:
+                raise ValueError('A client reading shared state cannot write optimistic states to it!')
 
-        self.entity_json = EntityJSON(self.__url, self.__token)
+            # The publishing process already checked the token.
+            from home_assistant_control.client.shared import SharedEntities, SharedStateReader
+
+            self.__token = token
+            self.entity_json = None
+            self.entities = SharedEntities(self, SharedStateReader(shared_state))
+            return
+
+        self.__token = validate_and_return_token(self.__url, token, policy=self.__policy, metrics=self.__metrics)
+
+        self.entity_json = EntityJSON(self.__url, self.__token, policy=self.__policy, metrics=self.__metrics)
         self.entities = Entities(self, self.entity_json)
 
-        self.entity_data = None
+        if optimistic:
+            self.__optimistic = OptimisticUpdates(self.entities)
+
         self.entities.refresh()
 
     @property
     def entity_category_names(self):
-        return sorted(list(self.entities.categories.keys()))
+        return sorted(self.entities.category_names)
+
+    @property
+    def controllers(self) -> ControllerRegistry:
+        """
+        The registry handing out one reusable controller per entity, created on first use.
+        """
+        if self.__controllers is None:
+            self.__controllers = ControllerRegistry(self)
+
+        return self.__controllers
+
+    @property
+    def optimistic(self) -> OptimisticUpdates:
+        """
+        The optimistic state tracker, or None unless the client was created with `optimistic=True`.
+        """
+        return self.__optimistic
+
+    @property
+    def registry(self) -> Registry:
+        """
+        The area, device and entity registries, or None until `load_registry()` was awaited.
+        """
+        return self.__registry
+
+    async def load_registry(self, ws_client) -> Registry:
+        """
+        Load Home Assistant's area, device and entity registries and keep them up to date from then on.
+
+        Args:
+            ws_client (WebSocketClient): A connected and authenticated WebSocket client of this client.
+
+        Returns:
+            Registry: The loaded registry; the same one on later calls.
+        """
+        if self.__registry is None:
+            registry = Registry(ws_client)
+            await registry.start()
+            self.__registry = registry
+
+        return self.__registry
+
+    async def unload_registry(self):
+        """
+        Stop following registry updates and drop the registry.
+        """
+        registry, self.__registry = self.__registry, None
+
+        if registry is not None:
+            await registry.stop()
+
+    def entities_in_area(self, area: str, domain: str = None) -> List[Entity]:
+        """
+        Get the entities of an area from the index, through the registry's area index.
+
+        Args:
+            area (str): The area's ID, name or alias.
+            domain (str): Only entities of this domain, e.g. 'light'.
+
+        Returns:
+            list: The entities, in the registry's order; entities missing from the index are left out.
+
+        Raises:
+            RuntimeError: If the registry wasn't loaded.
+        """
+        if self.__registry is None:
+            raise RuntimeError('Load the registry with `load_registry()` first!')
+
+        entities = (self.entities.get(entity_id) for entity_id in self.__registry.entities_in_area(area, domain=domain))
+        return [entity for entity in entities if entity is not None]
+
+    @property
+    def shared(self) -> bool:
+        """
+        Whether this client reads its states from another process through shared memory.
+        """
+        return self.entity_json is None
 
     def refresh(self):
         self.entities.refresh()
-        self.entity_data = self.entities.entity_json
+        self.entity_data = self.entity_json
+
+    @property
+    def policy(self) -> RequestPolicy:
+        return self.__policy
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
+    def metrics_snapshot(self) -> dict:
+        """
+        Get a point-in-time copy of this client's instrumentation.
+
+        Returns:
+            dict: See `Metrics.snapshot`.
+        """
+        return self.__metrics.snapshot()
 
     @property
     def url(self):
@@ -29,12 +167,7 @@ class Client:
 
     @url.setter
     def url(self, new):
-        try:
-            self.__url = validate_and_transform_url(new)
-        except ValueError as e:
-            raise e from e
-
-        self.refresh()
+        self.set_credentials(url=new)
 
     @property
     def token(self):
@@ -42,10 +175,86 @@ class Client:
 
     @token.setter
     def token(self, new):
+        self.set_credentials(token=new)
+
+    def set_credentials(self, url: str = None, token: str = None) -> bool:
+        """
+        Switch to another URL and/or token. Both are validated together before either is used, so moving to a new
+        instance with its own token works in one step; the states are refreshed when the URL changes.
+
+        Args:
+            url (str): The new URL of the Home Assistant instance; the current one if omitted.
+            token (str): The new long-lived access token; the current one if omitted.
+
+        Returns:
+            bool: Whether anything changed.
+
+        Raises:
+            ValueError: If the URL is malformed or Home Assistant rejects the token; the client is left as it was.
+        """
+        new_url = validate_and_transform_url(url) if url is not None else self.__url
+        new_token = token if token is not None else self.__token
+
+        if new_url == self.__url and new_token == self.__token:
+            return False
+
         try:
-            if not validate_token(self.url, new):
-                raise ValueError('Invalid token!')
+            if not validate_token(new_url, new_token, policy=self.policy, metrics=self.metrics):
+                raise ValueError('Home Assistant rejected it')
         except Exception as e:
             raise ValueError(f'Invalid token: {e}') from e
 
-        self.__token = new
+        url_changed = new_url != self.__url
+        self.__url = new_url
+        self.__token = new_token
+
+        if self.entity_json is not None:
+            self.entity_json.set_credentials(new_url, new_token)
+
+        if url_changed:
+            self.refresh()
+
+        return True
+
+    def apply_config(self, config, changed: Iterable[str] = None):
+        """
+        Take over the URL and token of a config snapshot. Suitable as a `ConfigManager` listener, so that rotating the
+        token in the config files reaches a running client.
+
+        Args:
+            config (Config): The snapshot.
+            changed (Iterable[str]): The settings that changed; nothing is done unless 'url' or 'token' is one of them.
+
+        Usage example:
+        >>> manager.add_listener(client.apply_config)
+        >>> manager.watch()
+        """
+        if changed is not None and not {'url', 'token'}.intersection(changed):
+            return
+
+        self.set_credentials(config.get('url'), config.get('token'))
+
+    @classmethod
+    def from_config(cls, manager, **kwargs) -> 'Client':
+        """
+        Create a client from the URL and token a ConfigManager resolved, and keep it in step with them.
+
+        Args:
+            manager (ConfigManager): The loaded config. Call its `watch()` to pick up changes to the files.
+            **kwargs: Passed on to the constructor.
+
+        Returns:
+            Client: The client, registered as a listener of the manager.
+
+        Raises:
+            ValueError: If the config has no URL or token.
+        """
+        config = manager.snapshot
+
+        if config.get('url') is None or config.get('token') is None:
+            raise ValueError('The config has no URL or token!')
+
+        client = cls(config['url'], config['token'], **kwargs)
+        manager.add_listener(client.apply_config)
+
+        return client
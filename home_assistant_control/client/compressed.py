@@ -0,0 +1,217 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+# Keys of the compressed state format used by Home Assistant's `subscribe_entities` command.
+STATE = 's'
+ATTRIBUTES = 'a'
+CONTEXT = 'c'
+LAST_CHANGED = 'lc'
+LAST_UPDATED = 'lu'
+
+ADDED = 'a'
+CHANGED = 'c'
+REMOVED = 'r'
+
+
+def _timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def _context(value, previous: Dict[str, Any] = None) -> Dict[str, Any]:
+    # A bare string is just a new context ID.
+    if isinstance(value, str):
+        base = dict(previous) if previous else {'parent_id': None, 'user_id': None}
+        base['id'] = value
+        return base
+
+    return {**(previous or {}), **value}
+
+
+def expand_state(entity_id: str, compressed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Expand a compressed state into the full state object returned by `/api/states`.
+
+    Args:
+        entity_id (str): The ID of the entity.
+        compressed (dict): The compressed state.
+
+    Returns:
+        dict: The full state object.
+
+    Usage Examples:
+        >>> expand_state('light.kitchen', {'s': 'on', 'a': {}, 'c': 'abc', 'lc': 0})['state']
+        'on'
+    """
+    last_changed = _timestamp(compressed[LAST_CHANGED])
+
+    return {
+            'entity_id':    entity_id,
+            'state':        compressed[STATE],
+            'attributes':   compressed.get(ATTRIBUTES, {}),
+            'last_changed': last_changed,
+            'last_updated': _timestamp(compressed[LAST_UPDATED]) if LAST_UPDATED in compressed else last_changed,
+            'context':      _context(compressed.get(CONTEXT, '')),
+            }
+
+
+def compress_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compress a full state object into the `subscribe_entities` format.
+
+    Args:
+        state (dict): The full state object.
+
+    Returns:
+        dict: The compressed state.
+    """
+    last_changed = datetime.fromisoformat(state['last_changed']).timestamp()
+    last_updated = datetime.fromisoformat(state['last_updated']).timestamp()
+    context = state.get('context') or {}
+
+    compressed = {
+            STATE:        state['state'],
+            ATTRIBUTES:   state.get('attributes', {}),
+            CONTEXT:      context['id'] if not context.get('parent_id') and not context.get('user_id') else context,
+            LAST_CHANGED: last_changed,
+            }
+
+    if last_updated != last_changed:
+        compressed[LAST_UPDATED] = last_updated
+
+    return compressed
+
+
+def diff_states(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the compressed diff that turns one full state object into another.
+
+    Args:
+        old (dict): The previous full state.
+        new (dict): The new full state.
+
+    Returns:
+        dict: The diff, with '+' holding additions/changes and '-' removed attribute names.
+    """
+    old_compressed, new_compressed = compress_state(old), compress_state(new)
+    additions = {}
+
+    for key in (STATE, CONTEXT, LAST_CHANGED, LAST_UPDATED):
+        if key in new_compressed and new_compressed[key] != old_compressed.get(key):
+            additions[key] = new_compressed[key]
+
+    old_attributes, new_attributes = old_compressed[ATTRIBUTES], new_compressed[ATTRIBUTES]
+    changed_attributes = {key: value for key, value in new_attributes.items() if old_attributes.get(key) != value}
+    if changed_attributes:
+        additions[ATTRIBUTES] = changed_attributes
+
+    diff = {'+': additions} if additions else {}
+
+    removed_attributes = [key for key in old_attributes if key not in new_attributes]
+    if removed_attributes:
+        diff['-'] = {ATTRIBUTES: removed_attributes}
+
+    return diff
+
+
+class CompressedStateDecoder:
+    """
+    Tracks the entity states described by a `subscribe_entities` stream and turns its messages into state changes.
+
+    Each decoded change has the same shape as the data of a `state_changed` event (`entity_id`, `old_state` and
+    `new_state`), so it can be fed straight into `Entities.apply_state_changes`. Messages must be decoded in the order
+    they were received.
+
+    Usage example:
+    >>> decoder = CompressedStateDecoder()
+    >>> decoder.decode({'a': {'light.kitchen': {'s': 'on', 'a': {}, 'c': 'abc', 'lc': 0}}})[0]['new_state']['state']
+    'on'
+    """
+
+    def __init__(self):
+        self.__states: Dict[str, Dict[str, Any]] = {}
+
+    def __repr__(self):
+        return f'<CompressedStateDecoder entities={len(self.__states)}>'
+
+    @property
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the current full state of every entity in the stream, keyed by entity ID.
+        """
+        return self.__states
+
+    def decode(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Decode one `subscribe_entities` event.
+
+        Args:
+            event (dict): The event, holding any of 'a' (added), 'c' (changed) and 'r' (removed).
+
+        Returns:
+            List[Dict[str, Any]]: The resulting state changes.
+        """
+        states = self.__states
+        changes = []
+
+        for entity_id, compressed in event.get(ADDED, {}).items():
+            new_state = expand_state(entity_id, compressed)
+            changes.append({'entity_id': entity_id, 'old_state': states.get(entity_id), 'new_state': new_state})
+            states[entity_id] = new_state
+
+        for entity_id, diff in event.get(CHANGED, {}).items():
+            old_state = states.get(entity_id)
+            if old_state is None:
+                # A diff for an entity we never saw added; nothing to apply it to.
+                continue
+
+            new_state = self.apply_diff(old_state, diff)
+            changes.append({'entity_id': entity_id, 'old_state': old_state, 'new_state': new_state})
+            states[entity_id] = new_state
+
+        for entity_id in event.get(REMOVED, ()):
+            old_state = states.pop(entity_id, None)
+            if old_state is not None:
+                changes.append({'entity_id': entity_id, 'old_state': old_state, 'new_state': None})
+
+        return changes
+
+    @staticmethod
+    def apply_diff(state: Dict[str, Any], diff: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Apply a compressed diff to a full state object.
+
+        The given state is left untouched, since entities already in the index still refer to it.
+
+        Args:
+            state (dict): The current full state.
+            diff (dict): The compressed diff.
+
+        Returns:
+            dict: The new full state.
+        """
+        new_state = dict(state)
+        additions = diff.get('+')
+        removals = diff.get('-')
+
+        if additions:
+            if STATE in additions:
+                new_state['state'] = additions[STATE]
+
+            if CONTEXT in additions:
+                new_state['context'] = _context(additions[CONTEXT], state.get('context'))
+
+            if LAST_CHANGED in additions:
+                new_state['last_changed'] = new_state['last_updated'] = _timestamp(additions[LAST_CHANGED])
+            elif LAST_UPDATED in additions:
+                new_state['last_updated'] = _timestamp(additions[LAST_UPDATED])
+
+            if ATTRIBUTES in additions:
+                new_state['attributes'] = {**state['attributes'], **additions[ATTRIBUTES]}
+
+        if removals and ATTRIBUTES in removals:
+            attributes = dict(new_state['attributes'])
+            for key in removals[ATTRIBUTES]:
+                attributes.pop(key, None)
+            new_state['attributes'] = attributes
+
+        return new_state
@@ -0,0 +1,275 @@
+import asyncio
+from typing import Any, Callable, Dict, List
+
+from home_assistant_control.client.compressed import CompressedStateDecoder
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+class EventIngestor:
+    """
+    Feeds entity state changes from a WebSocketClient into the entity index in micro-batches.
+
+    Two streams are supported. 'state_changed' subscribes to `state_changed` events, each of which carries the full old
+    and new state. 'entities' uses the `subscribe_entities` command instead: one compact snapshot followed by compressed
+    diffs, which is far cheaper on the wire and to decode. Diffs are expanded on the reader, so a dropped queue entry
+    loses one change, never the decoder's view of the stream. The initial snapshot is applied directly rather than
+    queued, so it is never dropped, however large it is.
+
+    The socket reader only decodes each message and puts it on a bounded queue; a separate consumer drains the queue in
+    batches of up to `batch_size` events (or whatever arrived within `batch_interval` seconds) and applies each batch
+    to `Entities` in one pass. When the queue is full, `overflow` decides what happens:
+
+    - 'drop_oldest': discard the oldest queued event to make room (default).
+    - 'drop_newest': discard the incoming event.
+    - 'block': make the reader wait for room. This applies backpressure to the socket itself.
+
+    Usage example:
+    >>> ingestor = EventIngestor(ws_client, batch_size=500, batch_interval=0.05)
+    >>> await ingestor.start()
+    >>> ...
+    >>> await ingestor.stop()
+    """
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+    STREAMS = ('state_changed', 'entities')
+
+    def __init__(
+            self,
+            ws_client,
+            entities=None,
+            batch_size: int = 256,
+            batch_interval: float = 0.05,
+            max_queue: int = 10000,
+            overflow: str = 'drop_oldest',
+            event_type: str = 'state_changed',
+            stream: str = 'state_changed',
+            entity_ids: list = None
+            ):
+        """
+        Initializes a new instance of the EventIngestor class.
+
+        Args:
+            ws_client (WebSocketClient): A connected and authenticated WebSocket client.
+            entities (Entities): The index to apply events to. Defaults to the client's.
+            batch_size (int): The maximum number of events applied at once.
+            batch_interval (float): How long, in seconds, to wait for a batch to fill up.
+            max_queue (int): The maximum number of queued events.
+            overflow (str): What to do when the queue is full; one of `OVERFLOW_POLICIES`.
+            event_type (str): The event type to subscribe to with the 'state_changed' stream.
+            stream (str): Either 'state_changed' or 'entities'; see above.
+            entity_ids (list): With the 'entities' stream, only follow these entities.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'Invalid overflow policy: {overflow}. Must be one of {self.OVERFLOW_POLICIES}')
+
+        if stream not in self.STREAMS:
+            raise ValueError(f'Invalid stream: {stream}. Must be one of {self.STREAMS}')
+
+        if batch_size < 1 or max_queue < 1:
+            raise ValueError('"batch_size" and "max_queue" must be at least 1!')
+
+        self.__ws_client = ws_client
+        self.__entities = entities if entities is not None else ws_client.client.entities
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.__overflow = overflow
+        self.__event_type = event_type
+        self.__stream = stream
+        self.__entity_ids = entity_ids
+        self.__decoder = CompressedStateDecoder() if stream == 'entities' else None
+        self.__awaiting_snapshot = False
+        self.__queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.__listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.__subscription_id = None
+        self.__consumer_task = None
+        # The batch the consumer is collecting; already off the queue, so `stop()` must apply it.
+        self.__in_flight: List[Dict[str, Any]] = []
+        self.__processed = 0
+        self.__dropped = 0
+        self.__last_error = None
+
+    def __repr__(self):
+        return (f'<EventIngestor queued={self.__queue.qsize()} processed={self.__processed} '
+                f'dropped={self.__dropped} overflow={self.__overflow}>')
+
+    @property
+    def metrics(self):
+        return self.__ws_client.metrics
+
+    @property
+    def overflow(self) -> str:
+        return self.__overflow
+
+    @property
+    def stream(self) -> str:
+        return self.__stream
+
+    @property
+    def processed(self) -> int:
+        """
+        The number of events applied so far, before coalescing.
+        """
+        return self.__processed
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of events discarded because the queue was full.
+        """
+        return self.__dropped
+
+    @property
+    def queue_depth(self) -> int:
+        return self.__queue.qsize()
+
+    @property
+    def last_error(self) -> Exception:
+        """
+        The last exception applying a batch raised (e.g. in a batch listener), if any. The consumer keeps going.
+        """
+        return self.__last_error
+
+    def add_batch_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        """
+        Register a callable to receive each batch of event data after it was applied.
+        """
+        self.__listeners.append(listener)
+
+    def remove_batch_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        self.__listeners.remove(listener)
+
+    async def start(self):
+        """
+        Subscribe to the events and start the consumer.
+        """
+        self.__consumer_task = asyncio.get_running_loop().create_task(self._consume())
+
+        if self.__stream == 'entities':
+            self.__awaiting_snapshot = True
+            self.__subscription_id = await self.__ws_client.subscribe_entities(self._enqueue_compressed,
+                                                                               self.__entity_ids)
+        else:
+            self.__subscription_id = await self.__ws_client.subscribe_events(self._enqueue, self.__event_type)
+
+    async def stop(self):
+        """
+        Unsubscribe, apply whatever is still queued and stop the consumer.
+        """
+        if self.__subscription_id is not None:
+            await self.__ws_client.unsubscribe(self.__subscription_id)
+            self.__subscription_id = None
+
+        if self.__consumer_task is not None:
+            self.__consumer_task.cancel()
+            try:
+                await self.__consumer_task
+            except asyncio.CancelledError:
+                pass
+            self.__consumer_task = None
+
+        remaining, self.__in_flight = self.__in_flight, []
+        while not self.__queue.empty():
+            remaining.append(self.__queue.get_nowait())
+
+        if remaining:
+            self._apply_safely(remaining)
+
+    def _enqueue_compressed(self, event: Dict[str, Any]):
+        changes = self.__decoder.decode(event)
+
+        if self.__awaiting_snapshot:
+            # The first message is the snapshot of every entity. It may well be larger than the queue, and dropping
+            # part of it would leave the index incomplete with nothing to trigger a resync; so it bypasses the queue.
+            # Nothing was queued before it, so the order of changes is kept.
+            self.__awaiting_snapshot = False
+            self._apply_safely([{'data': change} for change in changes])
+            return None
+
+        for index, change in enumerate(changes):
+            # Wrap each change like a `state_changed` event so both streams share the consumer.
+            pending = self._enqueue({'data': change})
+
+            if pending is not None:
+                # The queue is full under the 'block' policy; queue the rest, in order, as room frees up.
+                return self._put_remaining(pending, changes[index + 1:])
+
+        return None
+
+    async def _put_remaining(self, pending, changes: List[Dict[str, Any]]):
+        await pending
+
+        for change in changes:
+            await self.__queue.put({'data': change})
+
+    def _enqueue(self, event: Dict[str, Any]):
+        queue = self.__queue
+
+        if not queue.full():
+            queue.put_nowait(event)
+            return None
+
+        if self.__overflow == 'block':
+            return queue.put(event)
+
+        self.__dropped += 1
+        self.metrics.increment('hac_ingest_dropped_total', policy=self.__overflow)
+
+        if self.__overflow == 'drop_oldest':
+            queue.get_nowait()
+            queue.put_nowait(event)
+
+        return None
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        queue = self.__queue
+        batch = self.__in_flight = []
+        batch.append(await queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _consume(self):
+        while True:
+            batch = await self._next_batch()
+            # `_apply` doesn't await, so the consumer can't be cancelled half-way through it.
+            self.__in_flight = []
+            self.metrics.set_gauge('hac_ingest_queue_depth', self.__queue.qsize())
+            self._apply_safely(batch)
+
+    def _apply_safely(self, batch: List[Dict[str, Any]]):
+        try:
+            self._apply(batch)
+        except Exception as e:
+            # One bad batch or listener must not silently end ingestion.
+            self.__last_error = e
+            self.metrics.increment('hac_ingest_errors_total')
+
+    def _apply(self, batch: List[Dict[str, Any]]):
+        data = [event['data'] for event in batch]
+
+        with self.metrics.timer('hac_ingest_batch_apply_seconds'):
+            self.__entities.apply_state_changes(data)
+
+        self.__processed += len(batch)
+        self.metrics.increment('hac_ingest_events_total', len(batch))
+        self.metrics.observe('hac_ingest_batch_size', len(batch), buckets=BATCH_SIZE_BUCKETS)
+
+        for listener in list(self.__listeners):
+            listener(data)
@@ -0,0 +1,577 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from home_assistant_control.utils.cache import Subscriber
+from home_assistant_control.utils.jsonlib import get_backend
+
+MAGIC = b'HACS'
+LAYOUT_VERSION = 1
+
+# File header: magic, layout version, active region, seqlock counter, publish version, region size.
+HEADER = struct.Struct('<4sHHQQQ')
+HEADER_SIZE = 64
+SEQ_OFFSET = 8
+# Region header: entity count, slot count, categories offset, categories length, published at (time.monotonic()).
+REGION = struct.Struct('<IIIId')
+# Hash table slot: key hash, record offset (relative to the region), record length, unused.
+SLOT = struct.Struct('<IIII')
+# Record header: key length, value length; followed by the key and the JSON-encoded state.
+RECORD = struct.Struct('<HI')
+
+INITIAL_REGION_SIZE = 1 << 20
+
+# How long a reader waits for a write in progress before giving up on the publisher.
+STALL_TIMEOUT = 1.0
+
+
+def default_path(url: str) -> str:
+    """
+    Get the default location of the shared state file for a Home Assistant instance.
+
+    It lives in `/dev/shm` where that exists, so the pages never touch the disk, and in the temporary directory
+    otherwise.
+
+    Args:
+        url (str): The URL of the Home Assistant instance.
+
+    Returns:
+        str: The path.
+    """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f'hac-{hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]}.state')
+
+
+def _key_hash(key: bytes) -> int:
+    # Stable across processes, unlike `hash()`. Collisions are resolved by comparing keys.
+    return zlib.crc32(key)
+
+
+class SharedStatePublisher(Subscriber):
+    """
+    Publishes a client's entity states into a memory-mapped file that other processes read without polling Home
+    Assistant themselves.
+
+    The file holds two regions. Each publish writes a complete, self-contained region (an open-addressing hash table
+    over length-prefixed JSON records) into the region readers aren't using and then flips the active region, bumping a
+    seqlock counter around the flip. Readers never block the publisher; they retry the rare lookup that overlapped two
+    publishes. Records are encoded once per Entity object and reused until the entity changes.
+
+    The publisher follows full refreshes of the client's EntityJSON on its own; call `attach()` to also publish every
+    batch an EventIngestor applies.
+
+    Usage example:
+    >>> publisher = SharedStatePublisher(client.entities, min_interval=0.1)
+    >>> publisher.attach(ingestor)
+    >>> # In every worker process:
+    >>> worker = Client(url, token, shared_state=publisher.path)
+    """
+
+    def __init__(self, entities, path: str = None, min_interval: float = 0.0, json_backend: str = None):
+        """
+        Initializes a new instance of the SharedStatePublisher class.
+
+        Args:
+            entities (Entities): The index to publish.
+            path (str): The file to publish to. Defaults to `default_path()` for the client's URL.
+            min_interval (float): Publish at most this often, in seconds; changes in between are coalesced.
+            json_backend (str): The JSON backend to serialize states with; the fastest available by default.
+        """
+        self.__entities = entities
+        self.__path = path or default_path(entities.client.url)
+        self.__min_interval = min_interval
+        self.__json = get_backend(json_backend)
+        self.__lock = threading.Lock()
+        # entity_id -> (the Entity it was built from, the encoded record, the key hash)
+        self.__records: Dict[str, Tuple[Any, bytes, int]] = {}
+        self.__last_published = None
+        self.__timer = None
+        self.__version = 0
+
+        # Never truncated: readers of a previous publisher may still have the file mapped, and touching pages past
+        # its end would kill them with SIGBUS. The file only ever grows.
+        self.__file = os.fdopen(os.open(self.__path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        self.__region_size = INITIAL_REGION_SIZE
+        self.__active = 0
+        size = os.fstat(self.__file.fileno()).st_size
+        taken_over = False
+
+        if size >= HEADER_SIZE:
+            magic, layout, active, _, version, region_size = HEADER.unpack(self.__file.read(HEADER.size))
+            if magic == MAGIC and layout == LAYOUT_VERSION and HEADER_SIZE + 2 * region_size <= size:
+                # Take over from the previous publisher: readers keep their region until the first flip, and the
+                # version keeps going up, so they drop what they cached.
+                self.__region_size = region_size
+                self.__active = active
+                self.__version = version
+                taken_over = True
+
+        if size < HEADER_SIZE + 2 * self.__region_size:
+            os.ftruncate(self.__file.fileno(), HEADER_SIZE + 2 * self.__region_size)
+
+        self.__map = mmap.mmap(self.__file.fileno(), 0)
+
+        if not taken_over:
+            HEADER.pack_into(self.__map, 0, MAGIC, LAYOUT_VERSION, 0, 0, 0, self.__region_size)
+
+        entities.entity_json.subscribe(self)
+        self.publish()
+
+    def __repr__(self):
+        return f'<SharedStatePublisher path={self.__path} version={self.__version}>'
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def metrics(self):
+        return self.__entities.client.metrics
+
+    def update(self):
+        """
+        Update method for the Subscriber interface. Called when the client's EntityJSON cache is refreshed.
+        """
+        self.publish_soon()
+
+    def attach(self, ingestor):
+        """
+        Publish after every batch an EventIngestor applies, subject to `min_interval`.
+
+        Args:
+            ingestor (EventIngestor): The ingestor feeding the published index.
+        """
+        ingestor.add_batch_listener(self._on_batch)
+
+    def detach(self, ingestor):
+        ingestor.remove_batch_listener(self._on_batch)
+
+    def _on_batch(self, changes: List[Dict[str, Any]]):
+        self.publish_soon()
+
+    def publish_soon(self):
+        """
+        Publish now, or once `min_interval` has passed since the last publish.
+        """
+        with self.__lock:
+            if self.__timer is not None:
+                return
+
+            wait = 0.0
+            if self.__last_published is not None:
+                wait = self.__min_interval - (time.monotonic() - self.__last_published)
+
+            if wait > 0:
+                self.__timer = threading.Timer(wait, self.publish)
+                self.__timer.daemon = True
+                self.__timer.start()
+                return
+
+        self.publish()
+
+    def publish(self) -> int:
+        """
+        Publish the index's current snapshot.
+
+        Returns:
+            int: The new publish version.
+        """
+        with self.__lock:
+            self.__timer = None
+
+            with self.metrics.timer('hac_shared_publish_seconds'):
+                region = self._build_region(self.__entities.snapshot())
+                self._write(region)
+
+            self.__last_published = time.monotonic()
+            self.metrics.set_gauge('hac_shared_region_bytes', len(region))
+
+            return self.__version
+
+    def _record(self, entity) -> Tuple[bytes, int]:
+        cached = self.__records.get(entity.entity_id)
+        if cached is not None and cached[0] is entity:
+            return cached[1], cached[2]
+
+        key = entity.entity_id.encode('utf-8')
+        value = self.__json.dumps(entity.entity_data).encode('utf-8')
+        record = RECORD.pack(len(key), len(value)) + key + value
+        key_hash = _key_hash(key)
+
+        self.__records[entity.entity_id] = (entity, record, key_hash)
+        return record, key_hash
+
+    def _build_region(self, index) -> bytearray:
+        entities = [entity for members in index.all_entities.values() for entity in members]
+        slot_count = 1 << max(4, (2 * len(entities) - 1).bit_length())
+        mask = slot_count - 1
+        table = bytearray(slot_count * SLOT.size)
+        used = bytearray(slot_count)
+        records = []
+        offset = REGION.size + len(table)
+
+        for entity in entities:
+            record, key_hash = self._record(entity)
+
+            position = key_hash & mask
+            while used[position]:
+                position = (position + 1) & mask
+
+            used[position] = 1
+            SLOT.pack_into(table, position * SLOT.size, key_hash, offset, len(record), 0)
+            records.append(record)
+            offset += len(record)
+
+        # Entities that disappeared shouldn't keep their serialized state alive.
+        if len(self.__records) > len(entities):
+            live = {entity.entity_id for entity in entities}
+            self.__records = {entity_id: cached for entity_id, cached in self.__records.items() if entity_id in live}
+
+        categories = ','.join(index.categories).encode('utf-8')
+        region = bytearray(REGION.pack(len(entities), slot_count, offset, len(categories), time.monotonic()))
+        region += table
+        region += b''.join(records)
+        region += categories
+
+        return region
+
+    def _write(self, region: bytearray):
+        seq = struct.unpack_from('<Q', self.__map, SEQ_OFFSET)[0]
+        if seq & 1:
+            # A previous publisher died mid-write; readers are waiting for this write to finish it.
+            seq -= 1
+
+        if len(region) > self.__region_size:
+            # Both regions move, so readers have to wait for the whole write: an odd counter tells them to retry.
+            struct.pack_into('<Q', self.__map, SEQ_OFFSET, seq + 1)
+            self._grow(len(region))
+            target = 0
+        else:
+            # Readers use the active region; the other one is ours until the flip.
+            target = 1 - self.__active
+
+        start = HEADER_SIZE + target * self.__region_size
+        self.__map[start:start + len(region)] = region
+
+        struct.pack_into('<Q', self.__map, SEQ_OFFSET, seq + 1)
+        self.__version += 1
+        HEADER.pack_into(self.__map, 0, MAGIC, LAYOUT_VERSION, target, seq + 1, self.__version, self.__region_size)
+        struct.pack_into('<Q', self.__map, SEQ_OFFSET, seq + 2)
+
+        self.__active = target
+
+    def _grow(self, needed: int):
+        self.__region_size = 1 << needed.bit_length()
+        self.__map.close()
+        os.ftruncate(self.__file.fileno(), HEADER_SIZE + 2 * self.__region_size)
+        self.__map = mmap.mmap(self.__file.fileno(), 0)
+
+    def close(self, unlink: bool = False):
+        """
+        Stop publishing.
+
+        Args:
+            unlink (bool): Also delete the file. Attached readers keep their mapping but see no more updates.
+        """
+        self.__entities.entity_json.unsubscribe(self)
+
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+            self.__map.close()
+            self.__file.close()
+
+        if unlink:
+            os.unlink(self.__path)
+
+
+class SharedStateReader:
+    """
+    Read-only view of the states a SharedStatePublisher publishes.
+
+    Lookups probe the hash table in the mapping directly; only the one state asked for is copied out and decoded.
+
+    Usage example:
+    >>> reader = SharedStateReader(path)
+    >>> reader.get('light.kitchen')['state']
+    'on'
+    """
+
+    def __init__(self, path: str, json_backend: str = None, stall_timeout: float = STALL_TIMEOUT):
+        """
+        Initializes a new instance of the SharedStateReader class.
+
+        Args:
+            path (str): The file the publisher writes.
+            json_backend (str): The JSON backend to decode states with; the fastest available by default.
+            stall_timeout (float): How long a lookup waits for a publish in progress, in seconds, before raising.
+
+        Raises:
+            ValueError: If the file isn't a shared state file.
+        """
+        self.__path = path
+        self.__json = get_backend(json_backend)
+        self.__stall_timeout = stall_timeout
+        self.__file = open(path, 'rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.__map[:4] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a shared state file!')
+
+    def __repr__(self):
+        return f'<SharedStateReader path={self.__path} version={self.version}>'
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def _read(self, reader):
+        """
+        Run `reader(mapping, region_start)` against a consistent version of the file, retrying while it changes.
+
+        Raises:
+            TimeoutError: If the file didn't settle within `stall_timeout` seconds, e.g. because the publisher died
+                mid-write.
+        """
+        deadline = None
+
+        while True:
+            seq = struct.unpack_from('<Q', self.__map, SEQ_OFFSET)[0]
+            if seq & 1:
+                # A publish takes microseconds to milliseconds; one that doesn't finish won't.
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.__stall_timeout
+                elif now > deadline:
+                    raise TimeoutError(f'The publisher of {self.__path} stalled mid-write!')
+
+                time.sleep(0)
+                continue
+
+            _, _, active, _, version, region_size = HEADER.unpack_from(self.__map, 0)
+
+            if HEADER_SIZE + 2 * region_size > len(self.__map):
+                # The publisher grew the file.
+                self.__map.close()
+                self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+                continue
+
+            try:
+                value = reader(self.__map, HEADER_SIZE + active * region_size)
+            except (struct.error, UnicodeDecodeError, IndexError):
+                # Torn by a concurrent publish; the counter check below catches it.
+                value = None
+
+            if struct.unpack_from('<Q', self.__map, SEQ_OFFSET)[0] == seq:
+                return value
+
+    @property
+    def version(self) -> int:
+        """
+        Get the publish version; it goes up with every publish.
+        """
+        return HEADER.unpack_from(self.__map, 0)[4]
+
+    @property
+    def published_at(self) -> float:
+        """
+        Get when the current version was published, on the `time.monotonic()` clock, which is shared by every process
+        on the host.
+        """
+        return self._read(lambda mapping, start: REGION.unpack_from(mapping, start)[4])
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.published_at
+
+    def get_raw(self, entity_id: str) -> Optional[bytes]:
+        """
+        Get an entity's JSON-encoded state.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            bytes: The encoded state, or None if the entity isn't published.
+        """
+        key = entity_id.encode('utf-8')
+        key_hash = _key_hash(key)
+
+        def lookup(mapping, start):
+            _, slot_count, _, _, _ = REGION.unpack_from(mapping, start)
+            mask = slot_count - 1
+            slots = start + REGION.size
+            position = key_hash & mask
+
+            # Bounded, so a table torn by a concurrent publish can't spin forever.
+            for _ in range(slot_count):
+                slot_hash, offset, length, _ = SLOT.unpack_from(mapping, slots + position * SLOT.size)
+                if not length:
+                    return None
+
+                if slot_hash == key_hash:
+                    record = start + offset
+                    key_length, value_length = RECORD.unpack_from(mapping, record)
+                    key_start = record + RECORD.size
+
+                    if mapping[key_start:key_start + key_length] == key:
+                        value_start = key_start + key_length
+                        return mapping[value_start:value_start + value_length]
+
+                position = (position + 1) & mask
+
+            return None
+
+        return self._read(lookup)
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an entity's state.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            dict: The state object, or None if the entity isn't published.
+        """
+        raw = self.get_raw(entity_id)
+        return self.__json.loads(raw) if raw is not None else None
+
+    def entity_ids(self) -> List[str]:
+        """
+        Get the ID of every published entity.
+        """
+        def collect(mapping, start):
+            _, slot_count, _, _, _ = REGION.unpack_from(mapping, start)
+            entity_ids = []
+
+            for position in range(slot_count):
+                _, offset, length, _ = SLOT.unpack_from(mapping, start + REGION.size + position * SLOT.size)
+                if length:
+                    key_length, _ = RECORD.unpack_from(mapping, start + offset)
+                    key_start = start + offset + RECORD.size
+                    entity_ids.append(mapping[key_start:key_start + key_length].decode('utf-8'))
+
+            return entity_ids
+
+        return self._read(collect)
+
+    @property
+    def category_names(self) -> Tuple[str, ...]:
+        def collect(mapping, start):
+            _, _, offset, length, _ = REGION.unpack_from(mapping, start)
+            names = mapping[start + offset:start + offset + length].decode('utf-8')
+            return tuple(names.split(',')) if names else ()
+
+        return self._read(collect)
+
+    def states(self, entity_ids: Iterable[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get several states at once.
+
+        Args:
+            entity_ids (Iterable[str]): The entities to get; all of them by default.
+
+        Returns:
+            List[Dict[str, Any]]: The state objects of the entities that are published.
+        """
+        states = (self.get(entity_id) for entity_id in (entity_ids if entity_ids is not None else self.entity_ids()))
+        return [state for state in states if state is not None]
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+
+class SharedEntities:
+    """
+    A read-only stand-in for `Entities` backed by a SharedStateReader, used by clients attached to shared state.
+
+    Entities are built from the shared file when they are looked up and cached until the publisher's next version, so a
+    worker only ever holds the entities it actually uses.
+    """
+
+    def __init__(self, client, reader: SharedStateReader):
+        self.__client = client
+        self.__reader = reader
+        self.__cache: Dict[str, Any] = {}
+        self.__cache_version = None
+
+    def __repr__(self):
+        return f'<SharedEntities reader={self.__reader}>'
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def reader(self) -> SharedStateReader:
+        return self.__reader
+
+    @property
+    def version(self) -> int:
+        return self.__reader.version
+
+    @property
+    def category_names(self) -> Tuple[str, ...]:
+        return self.__reader.category_names
+
+    def get(self, entity_id: str):
+        """
+        Look an entity up by its ID.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Entity: The entity, or None if it isn't published.
+        """
+        from home_assistant_control.entities import Entity
+
+        version = self.__reader.version
+        if version != self.__cache_version:
+            self.__cache = {}
+            self.__cache_version = version
+
+        entity = self.__cache.get(entity_id)
+        if entity is None:
+            state = self.__reader.get(entity_id)
+            if state is None:
+                return None
+
+            entity = self.__cache[entity_id] = Entity(state, self.__client, self.__reader.published_at)
+
+        return entity
+
+    def read_many(self, entity_ids: Iterable[str], max_age: float = None, strategy: str = None) -> Dict[str, Any]:
+        """
+        Read several entities at once. Keeping them fresh is the publisher's job, so `max_age` and `strategy` are
+        accepted for compatibility with `Entities.read_many` and ignored.
+
+        Args:
+            entity_ids (Iterable[str]): The IDs of the entities to read.
+
+        Returns:
+            Dict[str, Entity]: The entities keyed by ID; unpublished ones map to None.
+        """
+        return {entity_id: self.get(entity_id) for entity_id in dict.fromkeys(entity_ids)}
+
+    def refresh(self):
+        """
+        Drop the cached entities; the next lookups read the shared file again.
+        """
+        self.__cache = {}
+        self.__cache_version = None
@@ -1,19 +1,82 @@
 import asyncio
+import inspect
+import itertools
+import time
+from typing import Any, Callable, Dict
+
 import websockets
-import json
+
+from home_assistant_control.errors.client import APIError, AuthenticationError
+from home_assistant_control.utils.jsonlib import get_backend
 
 
 class WebSocketClient:
+    METRICS_FLUSH_MESSAGES = 256
+    METRICS_FLUSH_SECONDS = 1.0
 
-    def __init__(self, client):
+    def __init__(self, client, json_backend: str = None):
         """
         Initializes a new instance of the WebSocketClient class.
 
         Args:
             client (Client): An instance of the Client class.
+            json_backend (str): The JSON backend used to encode and decode messages ('orjson' or 'json'). Defaults to
+                the fastest one installed.
         """
         self.client = client
         self.websocket = None
+        self.__json = get_backend(json_backend)
+        self.__ids = itertools.count(1)
+        self.__pending: Dict[int, asyncio.Future] = {}
+        self.__subscriptions: Dict[int, Callable] = {}
+        self.__reader_task = None
+
+    @property
+    def metrics(self):
+        return self.client.metrics
+
+    @property
+    def json_backend(self):
+        return self.__json
+
+    @property
+    def url(self) -> str:
+        """
+        Get the WebSocket URL derived from the client's REST URL.
+
+        Returns:
+            str: The `ws://` (or `wss://`) URL of the WebSocket API.
+        """
+        base = self.client.url
+        if base.startswith('https://'):
+            base = f'wss://{base[len("https://"):]}'
+        elif base.startswith('http://'):
+            base = f'ws://{base[len("http://"):]}'
+
+        return f'{base}/api/websocket'
+
+    @property
+    def listening(self) -> bool:
+        """
+        Whether the background reader is dispatching incoming messages.
+        """
+        return self.__reader_task is not None and not self.__reader_task.done()
+
+    def _record_sent(self, raw: str):
+        self.metrics.increment('hac_websocket_messages_sent_total')
+        self.metrics.increment('hac_websocket_bytes_sent_total', len(raw))
+
+    def _record_received(self, messages: int, size: int, decode_seconds: float):
+        self.metrics.increment('hac_websocket_messages_received_total', messages)
+        self.metrics.increment('hac_websocket_bytes_received_total', size)
+        self.metrics.increment('hac_websocket_decode_seconds_total', decode_seconds)
+
+    def _decode(self, raw) -> Any:
+        start = time.perf_counter()
+        message = self.__json.loads(raw)
+        self._record_received(1, len(raw), time.perf_counter() - start)
+
+        return message
 
     async def connect(self):
         """
@@ -22,7 +85,9 @@ class WebSocketClient:
         Returns:
             None: Establishes the WebSocket connection.
         """
-        self.websocket = await websockets.connect(f"{self.client.url}/api/websocket")
+        with self.metrics.timer('hac_websocket_connect_seconds'):
+            # Home Assistant can send very large `get_states` results; don't cap message size.
+            self.websocket = await websockets.connect(self.url, max_size=None)
         print(f"Connected to WebSocket at {self.client.url}")
 
     async def authenticate(self):
@@ -31,21 +96,28 @@ class WebSocketClient:
 
         Returns:
             None: Sends the authentication message over the WebSocket.
+
+        Raises:
+            AuthenticationError: If Home Assistant rejected the token.
         """
-        auth_message = json.dumps({
+        auth_message = self.__json.dumps({
                 "type":         "auth",
                 "access_token": self.client.token
                 })
         await self.websocket.send(auth_message)
 
-        # Wait for acknowledgment or error
-        response = await self.websocket.recv()
-        response_data = json.loads(response)
+        # Wait for acknowledgment or error, skipping the `auth_required` greeting sent on connect.
+        response_data = {"type": "auth_required"}
+        while response_data["type"] == "auth_required":
+            response = await self.websocket.recv()
+            response_data = self.__json.loads(response)
 
         if response_data["type"] == "auth_ok":
             print("WebSocket authentication successful")
         else:
-            print(f"WebSocket authentication failed: {response_data.get('message', 'Unknown error')}")
+            message = response_data.get('message', 'Unknown error')
+            print(f"WebSocket authentication failed: {message}")
+            raise AuthenticationError(f'WebSocket authentication failed: {message}')
 
     async def send_message(self, message: dict):
         """
@@ -57,19 +129,202 @@ class WebSocketClient:
         Returns:
             None: Sends the message over the WebSocket.
         """
-        await self.websocket.send(json.dumps(message))
-        print(f"Sent message: {message}")
+        raw = self.__json.dumps(message)
+        await self.websocket.send(raw)
+        self._record_sent(raw)
 
     async def receive_message(self):
         """
         Receive a message from the WebSocket connection.
 
+        This can't be used while the background reader started by `listen()` owns the connection.
+
         Returns:
             dict: The received message.
         """
-        response = await self.websocket.recv()
-        print(f"Received message: {response}")
-        return json.loads(response)
+        if self.listening:
+            raise RuntimeError('The WebSocket reader is running; use call() and subscriptions instead.')
+
+        return self._decode(await self.websocket.recv())
+
+    def listen(self):
+        """
+        Start the background reader that routes command results to `call()` and events to subscription handlers.
+
+        Returns:
+            asyncio.Task: The reader task.
+        """
+        if not self.listening:
+            self.__reader_task = asyncio.get_running_loop().create_task(self._reader())
+
+        return self.__reader_task
+
+    async def call(self, message_type: str, **payload) -> Any:
+        """
+        Send a command and wait for its result.
+
+        Args:
+            message_type (str): The command type, e.g. 'get_states'.
+            **payload: The command's other fields.
+
+        Returns:
+            Any: The command's result.
+
+        Raises:
+            APIError: If Home Assistant reported an error.
+        """
+        self.listen()
+
+        message_id = next(self.__ids)
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[message_id] = future
+
+        try:
+            await self.send_message({'id': message_id, 'type': message_type, **payload})
+            return await future
+        finally:
+            self.__pending.pop(message_id, None)
+
+    async def subscribe_events(self, handler: Callable[[dict], Any], event_type: str = None) -> int:
+        """
+        Subscribe to events and hand each one to a handler.
+
+        The handler runs on the reader, so it must be quick. If it returns an awaitable, the reader awaits it before
+        reading the next message.
+
+        Args:
+            handler (Callable): Called with the `event` object of every matching event message.
+            event_type (str): The event type to subscribe to; all events if omitted.
+
+        Returns:
+            int: The subscription ID, to pass to `unsubscribe()`.
+        """
+        payload = {'event_type': event_type} if event_type else {}
+        return await self.subscribe('subscribe_events', handler, **payload)
+
+    async def subscribe_entities(self, handler: Callable[[dict], Any], entity_ids: list = None) -> int:
+        """
+        Subscribe to the compressed entity state stream.
+
+        The first event holds the compressed state of every entity under 'a'; later events carry only what changed.
+        Use a `CompressedStateDecoder` to turn them into state changes.
+
+        Args:
+            handler (Callable): Called with every compressed event.
+            entity_ids (list): Only stream these entities; all of them if omitted.
+
+        Returns:
+            int: The subscription ID, to pass to `unsubscribe()`.
+        """
+        payload = {'entity_ids': list(entity_ids)} if entity_ids else {}
+        return await self.subscribe('subscribe_entities', handler, **payload)
+
+    async def subscribe(self, message_type: str, handler: Callable[[dict], Any], **payload) -> int:
+        """
+        Send a subscription command and route the events it produces to a handler.
+
+        Args:
+            message_type (str): The subscription command, e.g. 'subscribe_events'.
+            handler (Callable): Called with the `event` object of every event message of the subscription.
+            **payload: The command's other fields.
+
+        Returns:
+            int: The subscription ID.
+        """
+        self.listen()
+
+        message_id = next(self.__ids)
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[message_id] = future
+        # Register before sending: the first event may arrive right behind the result.
+        self.__subscriptions[message_id] = handler
+
+        try:
+            await self.send_message({'id': message_id, 'type': message_type, **payload})
+            await future
+        except BaseException:
+            self.__subscriptions.pop(message_id, None)
+            raise
+        finally:
+            self.__pending.pop(message_id, None)
+
+        return message_id
+
+    async def unsubscribe(self, subscription_id: int):
+        """
+        Cancel a subscription made with `subscribe_events()` or `subscribe()`.
+
+        Args:
+            subscription_id (int): The subscription ID.
+        """
+        self.__subscriptions.pop(subscription_id, None)
+        await self.call('unsubscribe_events', subscription=subscription_id)
+
+    async def _reader(self):
+        loads = self.__json.loads
+        clock = time.perf_counter
+        # Metrics are tallied locally and flushed in bulk; per-message registry updates cost more than decoding.
+        messages, size, decode_seconds = 0, 0, 0.0
+        last_flush = clock()
+
+        try:
+            async for raw in self.websocket:
+                start = clock()
+                message = loads(raw)
+                now = clock()
+
+                messages += 1
+                size += len(raw)
+                decode_seconds += now - start
+
+                if messages >= self.METRICS_FLUSH_MESSAGES or now - last_flush >= self.METRICS_FLUSH_SECONDS:
+                    self._record_received(messages, size, decode_seconds)
+                    messages, size, decode_seconds = 0, 0, 0.0
+                    last_flush = now
+
+                # Home Assistant may coalesce several messages into one JSON array.
+                for item in message if isinstance(message, list) else (message,):
+                    outcome = self._dispatch(item)
+                    if inspect.isawaitable(outcome):
+                        try:
+                            await outcome
+                        except Exception:
+                            self.metrics.increment('hac_websocket_handler_errors_total')
+        finally:
+            if messages:
+                self._record_received(messages, size, decode_seconds)
+
+            error = ConnectionError('WebSocket connection closed')
+            for future in self.__pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    def _dispatch(self, message: dict):
+        message_type = message.get('type')
+
+        if message_type == 'event':
+            handler = self.__subscriptions.get(message.get('id'))
+            if handler is None:
+                return None
+
+            try:
+                return handler(message['event'])
+            except Exception:
+                # One broken handler must not take the reader down with it.
+                self.metrics.increment('hac_websocket_handler_errors_total')
+                return None
+
+        future = self.__pending.get(message.get('id'))
+        if future is None or future.done():
+            return None
+
+        if message_type == 'result' and not message.get('success', True):
+            error = message.get('error') or {}
+            future.set_exception(APIError(f'{error.get("code", "error")}: {error.get("message", "Unknown error")}'))
+        else:
+            future.set_result(message.get('result'))
+
+        return None
 
     async def close(self):
         """
@@ -79,4 +334,12 @@ class WebSocketClient:
             None: Closes the WebSocket connection.
         """
         await self.websocket.close()
+
+        if self.__reader_task is not None:
+            try:
+                await self.__reader_task
+            except websockets.ConnectionClosed:
+                pass
+            self.__reader_task = None
+
         print("WebSocket connection closed")
@@ -1,32 +1,321 @@
 import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from home_assistant_control.config.args import CLIArguments
 from home_assistant_control.config.env import ConfigEnv
 from home_assistant_control.config.file import ConfigFile
+from home_assistant_control.config.keys import KEYS, ConfigKey
+from home_assistant_control.config.snapshot import Config
+
+DEFAULT_SECTION = 'DEFAULT'
 
 
 class ConfigManager:
+    """
+    Resolves settings from the command line, the environment, an INI file and a JSON file, in that order of precedence.
+
+    A source only loses to the next one when it doesn't have the setting at all, so falsy values (0, '', 'false')
+    are kept. The declared keys (see `ConfigKey`) are resolved and converted to their types once, into an immutable
+    `Config` snapshot; reading one is a dictionary lookup. Other settings are resolved on first use and remembered until
+    the next reload.
+
+    `reload()` reads the files again and, if anything changed, swaps in a new snapshot and calls the listeners with it.
+    `watch()` does that whenever either file changes, from a thread polling their modification times, so e.g. a
+    rotated token reaches a running `Client` (see `Client.apply_config()`) without a restart.
+
+    Usage example:
+    >>> manager = ConfigManager('config.ini', 'config.json', env_prefix='HAC_')
+    >>> manager.load()
+    >>> client = Client.from_config(manager)
+    >>> manager.watch()
+    """
 
-    def __init__(self, config_file_path, config_json_path):
-        self.config_json = None
-        self.cli = CLIArguments()
-        self.env = ConfigEnv()
+    def __init__(self, config_file_path, config_json_path, env_prefix: str = '', cli_args=None,
+                 keys: Iterable[ConfigKey] = KEYS):
+        """
+        Initializes a new instance of the ConfigManager class.
+
+        Args:
+            config_file_path (str): The INI file.
+            config_json_path (str): The JSON file.
+            env_prefix (str): Prepended to setting names to get their environment variables; see `ConfigEnv`.
+            cli_args (argparse.Namespace): Command-line arguments the caller already parsed. Options of settings should
+                default to None, so that an option that wasn't passed doesn't hide the other sources.
+            keys (Iterable[ConfigKey]): The settings resolved into the snapshot.
+        """
+        self.config_json = {}
+        self.cli = CLIArguments(cli_args)
+        self.env = ConfigEnv(env_prefix)
         self.file = ConfigFile(config_file_path)
         self.config_json_path = config_json_path
+        self.__keys: Dict[str, ConfigKey] = {key.name: key for key in keys}
+        # The snapshot and the memo of other settings, replaced together.
+        self.__current: Optional[Tuple[Config, Dict[Tuple[str, str], Any]]] = None
+        self.__listeners: List[Callable[[Config, Tuple[str, ...]], None]] = []
+        self.__lock = threading.RLock()
+        self.__stamps = None
+        self.__watcher = None
+        self.__stop = threading.Event()
+        self.__last_error = None
+
+    def __repr__(self):
+        return (f'<ConfigManager file={self.file.file_path} json={self.config_json_path} '
+                f'watching={self.__watcher is not None}>')
+
+    @property
+    def keys(self) -> Tuple[ConfigKey, ...]:
+        return tuple(self.__keys.values())
+
+    @property
+    def snapshot(self) -> Config:
+        """
+        The current resolved settings. Built on first use if `load()` wasn't called.
+        """
+        current = self.__current
+
+        if current is None:
+            with self.__lock:
+                if self.__current is None:
+                    self.__current = (self._build(), {})
+
+                current = self.__current
+
+        return current[0]
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        """
+        The last error a reload or a listener raised, e.g. a half-written JSON file or a token the client rejected.
+        """
+        return self.__last_error
+
+    @property
+    def watching(self) -> bool:
+        return self.__watcher is not None
 
     def add_argument(self, *args, **kwargs):
         self.cli.add_argument(*args, **kwargs)
 
+    def add_key(self, key: ConfigKey):
+        """
+        Declare a setting to resolve into the snapshot. The snapshot is rebuilt; listeners aren't called.
+
+        Args:
+            key (ConfigKey): The setting.
+        """
+        with self.__lock:
+            self.__keys[key.name] = key
+
+            if self.__current is not None:
+                self.__current = (self._build(self.__current[0].version + 1), {})
+
+    def add_listener(self, listener: Callable[[Config, Tuple[str, ...]], None]):
+        """
+        Register a callable to receive each new snapshot, with the names of the settings that changed.
+        """
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Config, Tuple[str, ...]], None]):
+        self.__listeners.remove(listener)
+
     def load(self):
-        self.file.load()
-        with open(self.config_json_path, 'r') as f:
-            self.config_json = json.load(f)
-
-    def get(self, key, section='DEFAULT', default=None):
-        # Order of precedence: CLI > Environment > Config File > Config JSON > Default
-        value = getattr(self.cli.parse(), key, None) or \
-                self.env.get(key) or \
-                self.file.get(section, key) or \
-                self.config_json.get(key) or \
-                default
-        return value
+        """
+        Read the config files and resolve a new snapshot. Listeners aren't called; see `reload()`.
+
+        Raises:
+            ValueError: If a declared setting's value can't be converted to its type.
+        """
+        with self.__lock:
+            version = self.__current[0].version + 1 if self.__current is not None else 1
+            sources = self._read()
+            snapshot = self._build(version, *sources[1:])
+            self._swap(sources)
+            self.__current = (snapshot, {})
+
+    def reload(self) -> Tuple[str, ...]:
+        """
+        Read the config files again. If a declared setting resolves differently, swap in a new snapshot and call the
+        listeners with it. An exception a listener raises is kept in `last_error` and doesn't stop the others.
+
+        Returns:
+            tuple: The names of the declared settings that changed.
+
+        Raises:
+            ValueError: If the JSON file can't be parsed or a setting converted; the current snapshot stays.
+            configparser.Error: If the INI file can't be parsed; the current snapshot stays.
+        """
+        with self.__lock:
+            previous = self.snapshot
+
+            try:
+                sources = self._read()
+                snapshot = self._build(previous.version + 1, *sources[1:])
+            except Exception as e:
+                self.__last_error = e
+                raise
+
+            self._swap(sources)
+            changed = previous.diff(snapshot)
+            # Settings outside the snapshot may have changed either way; forget them.
+            self.__current = (snapshot if changed else previous, {})
+
+        if changed:
+            for listener in list(self.__listeners):
+                try:
+                    listener(snapshot, changed)
+                except Exception as e:
+                    self.__last_error = e
+
+        return changed
+
+    def watch(self, interval: float = 1.0):
+        """
+        Reload whenever the INI or JSON file is changed, created or removed, checking every `interval` seconds from a
+        daemon thread.
+
+        Args:
+            interval (float): Seconds between checks.
+        """
+        if interval <= 0:
+            raise ValueError('"interval" must be positive!')
+
+        with self.__lock:
+            if self.__watcher is not None:
+                return
+
+            if self.__stamps is None:
+                self.load()
+
+            self.__stop.clear()
+            self.__watcher = threading.Thread(target=self._watch, args=(interval,), name='hac-config-watch',
+                                              daemon=True)
+            self.__watcher.start()
+
+    def unwatch(self):
+        """
+        Stop watching the config files.
+        """
+        watcher = self.__watcher
+        if watcher is None:
+            return
+
+        self.__stop.set()
+        watcher.join()
+        self.__watcher = None
+
+    def get(self, key, section=DEFAULT_SECTION, default=None):
+        """
+        Get a setting.
+
+        Order of precedence: CLI > Environment > Config File > Config JSON > the key's default > `default`.
+
+        Args:
+            key (str): The name of the setting.
+            section (str): The section of the INI file to read it from.
+            default (Any): Returned when no source has the setting.
+
+        Returns:
+            Any: The value; converted to its type for a declared setting, as the source had it otherwise.
+        """
+        snapshot = self.snapshot
+        declared = self.__keys.get(key)
+
+        if declared is not None and declared.section == section:
+            value = snapshot[key]
+        else:
+            memo = self.__current[1]
+
+            try:
+                value = memo[(section, key)]
+            except KeyError:
+                value = memo.setdefault((section, key), self._lookup(key, section)[0])
+
+        return default if value is None else value
+
+    def _lookup(self, key: str, section: str, config_file: ConfigFile = None,
+                config_json: dict = None) -> Tuple[Any, Optional[str]]:
+        value = getattr(self.cli.parse(), key, None)
+        if value is not None:
+            return value, 'cli'
+
+        value = self.env.get(key)
+        if value is not None:
+            return value, 'env'
+
+        value = (config_file or self.file).get(section, key)
+        if value is not None:
+            return value, 'file'
+
+        value = (self.config_json if config_json is None else config_json).get(key)
+        if value is not None:
+            return value, 'json'
+
+        return None, None
+
+    def _build(self, version: int = 1, config_file: ConfigFile = None, config_json: dict = None) -> Config:
+        values = {}
+        sources = {}
+
+        for key in self.__keys.values():
+            value, source = self._lookup(key.name, key.section, config_file, config_json)
+
+            if source is None:
+                values[key.name] = key.default
+                sources[key.name] = 'default'
+                continue
+
+            try:
+                values[key.name] = key.convert(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'Invalid value for "{key.name}" from {source}: {e}') from e
+
+            sources[key.name] = source
+
+        return Config(values, sources, version)
+
+    def _read(self) -> Tuple[tuple, ConfigFile, dict]:
+        # Stamp first: a write landing while the files are read shows up as a change on the next check.
+        stamps = self._stamps()
+
+        # A new parser, so settings removed from the file don't linger.
+        config_file = ConfigFile(self.file.file_path)
+        config_file.load()
+
+        # Like the config file, the JSON file is optional.
+        config_json = {}
+        if os.path.exists(self.config_json_path):
+            with open(self.config_json_path, 'r') as f:
+                config_json = json.load(f)
+
+        return stamps, config_file, config_json
+
+    def _swap(self, sources: Tuple[tuple, ConfigFile, dict]):
+        self.__stamps, self.file, self.config_json = sources
+
+    def _stamps(self) -> Tuple[Optional[Tuple[int, int, int]], ...]:
+        stamps = []
+
+        for path in (self.file.file_path, self.config_json_path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stamps.append(None)
+            else:
+                # The inode catches a file replaced by a rename with the same size and (coarse) mtime.
+                stamps.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+
+        return tuple(stamps)
+
+    def _watch(self, interval: float):
+        while not self.__stop.wait(interval):
+            if self._stamps() == self.__stamps:
+                continue
+
+            try:
+                self.reload()
+            except Exception:
+                # Kept in `last_error`. The stamps weren't updated, so the next check tries again (e.g. once a
+                # half-written file is complete).
+                pass
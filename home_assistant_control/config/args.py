@@ -3,11 +3,21 @@ import argparse
 
 class CLIArguments:
 
-    def __init__(self):
+    def __init__(self, namespace: argparse.Namespace = None):
+        """
+        Args:
+            namespace (argparse.Namespace): Arguments a caller already parsed with its own parser. When given, they are
+                used as-is instead of parsing `sys.argv`.
+        """
         self.parser = argparse.ArgumentParser()
+        self.__namespace = namespace
 
     def add_argument(self, *args, **kwargs):
         self.parser.add_argument(*args, **kwargs)
 
     def parse(self):
-        return self.parser.parse_args()
+        # Parse once; every `ConfigManager.get` asks again.
+        if self.__namespace is None:
+            self.__namespace = self.parser.parse_args()
+
+        return self.__namespace
@@ -3,6 +3,13 @@ import os
 
 class ConfigEnv:
 
-    @staticmethod
-    def get(key, default=None):
-        return os.getenv(key, default)
+    def __init__(self, prefix: str = ''):
+        """
+        Args:
+            prefix (str): Prepended to every key, which is then upper-cased; with 'HAC_', `get('url')` reads `HAC_URL`.
+        """
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        name = f'{self.prefix}{key}'.upper() if self.prefix else key
+        return os.getenv(name, default)
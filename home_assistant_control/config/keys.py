@@ -0,0 +1,111 @@
+from typing import Any
+
+TRUE_STRINGS = frozenset(('1', 'true', 'yes', 'on'))
+FALSE_STRINGS = frozenset(('0', 'false', 'no', 'off', ''))
+
+
+def to_bool(value: Any) -> bool:
+    """
+    Convert a config value to a boolean, the way configparser reads them.
+
+    Args:
+        value (Any): A bool, or a string such as 'yes', 'off' or '0'.
+
+    Returns:
+        bool: The boolean.
+
+    Raises:
+        ValueError: If the value isn't recognized.
+    """
+    if isinstance(value, bool):
+        return value
+
+    text = str(value).strip().lower()
+
+    if text in TRUE_STRINGS:
+        return True
+
+    if text in FALSE_STRINGS:
+        return False
+
+    raise ValueError(f'Not a boolean: {value!r}')
+
+
+class ConfigKey:
+    """
+    A setting the ConfigManager resolves up front, and the type its value is converted to.
+
+    Values from the environment and the INI file are always strings; declaring a key converts them once, when the
+    snapshot is built, instead of on every read.
+
+    Usage example:
+    >>> ConfigKey('timeout', float, default=10.0).convert('2.5')
+    2.5
+    """
+
+    def __init__(self, name: str, value_type: type = str, default: Any = None, section: str = 'DEFAULT'):
+        """
+        Initializes a new instance of the ConfigKey class.
+
+        Args:
+            name (str): The name of the setting, e.g. 'url'.
+            value_type (type): What the value is converted to: `str`, `int`, `float`, `bool` or any callable taking
+                the raw value.
+            default (Any): The value when no source has the setting.
+            section (str): The section of the INI file the setting is read from.
+        """
+        self.__name = name
+        self.__value_type = value_type
+        self.__default = default
+        self.__section = section
+
+    def __repr__(self):
+        return f'<ConfigKey name={self.__name} type={getattr(self.__value_type, "__name__", self.__value_type)}>'
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def value_type(self) -> type:
+        return self.__value_type
+
+    @property
+    def default(self) -> Any:
+        return self.__default
+
+    @property
+    def section(self) -> str:
+        return self.__section
+
+    def convert(self, value: Any) -> Any:
+        """
+        Convert a raw value to the key's type.
+
+        Args:
+            value (Any): The value as a source had it.
+
+        Returns:
+            Any: The converted value; None stays None.
+
+        Raises:
+            ValueError: If the value can't be converted.
+        """
+        if value is None:
+            return None
+
+        if self.__value_type is bool:
+            return to_bool(value)
+
+        # bool is an int, but a JSON `true` isn't a valid port number.
+        if isinstance(value, self.__value_type) and not isinstance(value, bool):
+            return value
+
+        return self.__value_type(value)
+
+
+# The settings every ConfigManager resolves unless given its own list.
+KEYS = (
+        ConfigKey('url'),
+        ConfigKey('token'),
+        )
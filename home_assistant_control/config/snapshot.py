@@ -0,0 +1,72 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Tuple
+
+
+class Config(Mapping):
+    """
+    An immutable, resolved set of settings: what a ConfigManager hands out and replaces as a whole on reload.
+
+    Holding on to one snapshot gives a consistent view (e.g. a URL and the token that goes with it) even while the
+    config files change underneath.
+
+    Usage example:
+    >>> config = manager.snapshot
+    >>> config['url'], config.source('url')
+    ('http://homeassistant.local:8123', 'env')
+    """
+
+    def __init__(self, values: Dict[str, Any], sources: Dict[str, str], version: int = 1):
+        """
+        Initializes a new instance of the Config class.
+
+        Args:
+            values (dict): The resolved values, keyed by setting name.
+            sources (dict): Where each value came from: 'cli', 'env', 'file', 'json' or 'default'.
+            version (int): Counts the snapshots a manager built; a reload that changes nothing keeps the version.
+        """
+        self.__values = MappingProxyType(dict(values))
+        self.__sources = MappingProxyType(dict(sources))
+        self.__version = version
+
+    def __repr__(self):
+        # Values aren't shown; the token is one of them.
+        return f'<Config version={self.__version} keys={sorted(self.__values)}>'
+
+    def __getitem__(self, key: str) -> Any:
+        return self.__values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__values)
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def source(self, key: str) -> str:
+        """
+        Get where a setting's value came from.
+
+        Args:
+            key (str): The name of the setting.
+
+        Returns:
+            str: 'cli', 'env', 'file', 'json' or 'default'.
+        """
+        return self.__sources[key]
+
+    def diff(self, other: Mapping) -> Tuple[str, ...]:
+        """
+        Get the settings whose values differ between this snapshot and another one.
+
+        Args:
+            other (Mapping): The other snapshot.
+
+        Returns:
+            tuple: The names of the settings that differ, sorted.
+        """
+        keys = set(self.__values) | set(other)
+        return tuple(sorted(key for key in keys if self.get(key) != other.get(key)))
@@ -1,5 +1,3 @@
-import requests
-
 from home_assistant_control.utils.api import make_request
 
 
@@ -7,6 +5,35 @@ def get_entities(client, category):
     return client.entities.categories[category]
 
 
+def call_service(client, domain: str, service: str, data: dict):
+    """
+    Call a Home Assistant service using the client's request policy.
+
+    Unlike `Controller.send_payload`, this isn't tied to one entity; `data['entity_id']` may list several entities of
+    the domain, which Home Assistant handles in a single call.
+
+    Args:
+        client (Client): The client to make the call with.
+        domain (str): The service's domain, e.g. 'light'.
+        service (str): The service, e.g. 'turn_off'.
+        data (dict): The service data.
+
+    Returns:
+        Response: The HTTP response.
+
+    Usage example:
+    >>> call_service(client, 'light', 'turn_off', {'entity_id': ['light.hall', 'light.stairs']})
+    """
+    return make_request(
+            f'{client.url}{Controller.SERVICES_ENDPOINT}{domain}/{service}',
+            client.token,
+            method='POST',
+            data=data,
+            policy=client.policy,
+            metrics=client.metrics
+            )
+
+
 class Payload:
     """
     A generic class for creating payloads for Home Assistant RESTful API calls.
@@ -24,7 +51,11 @@ class Payload:
         Args:
             entity_name (str): The name of the entity.
         """
-        self.entity_name = entity_name
+        self.__entity_name = entity_name
+
+    @property
+    def entity_name(self):
+        return self.__entity_name
 
     def get_payload(self) -> dict:
         """
@@ -33,7 +64,7 @@ class Payload:
         Returns:
             dict: The payload dictionary.
         """
-        return {'entity_id': self.entity_name}
+        return {'entity_id': self.__entity_name}
 
     @property
     def payload(self):
@@ -49,6 +80,7 @@ class Controller:
     """
     API_STUB = '/api/'
     STATE_ENDPOINT = f'{API_STUB}states/'
+    SERVICES_ENDPOINT = f'{API_STUB}services/'
 
     def __init__(self, entity):
         """
@@ -61,6 +93,9 @@ class Controller:
         self.__client = entity.client
         self.__entity = entity
         self.__last_response = None
+        self.__payload = None
+        self.__urls = {}
+        self.__urls_base = None
         self.category_name = self.entity.category
 
     @property
@@ -85,8 +120,9 @@ class Controller:
         if not isinstance(new, str):
             raise ValueError('Invalid category name! Category name must be a string!')
 
-        # Make sure category_name is one of the valid categories
-        if new not in self.client.entity_category_names:
+        # Make sure category_name is one of the valid categories. Checking the index's keys is O(1); only the error
+        # message pays for listing them.
+        if new not in self.client.entities.category_names:
             raise ValueError(f'Invalid category name: {new}. Must be one of {self.client.entity_category_names}')
 
         # Set the category_name
@@ -104,34 +140,108 @@ class Controller:
     def last_response(self):
         return self.__last_response
 
+    @property
+    def base_payload(self) -> dict:
+        """
+        Get the payload addressing this controller's entity, built once. Don't modify it; copy it to add fields.
+
+        Returns:
+            dict: `{'entity_id': ...}`.
+        """
+        if self.__payload is None:
+            self.__payload = Payload(self.entity.entity_id).get_payload()
+
+        return self.__payload
+
+    def service_url(self, service: str) -> str:
+        """
+        Get the URL of one of the entity's domain services, formatted once per service.
+
+        Args:
+            service (str): The service, e.g. 'turn_on'.
+
+        Returns:
+            str: The URL.
+        """
+        base = self.client.url
+
+        # The client's URL can be changed; start over if it was.
+        if base is not self.__urls_base:
+            self.__urls = {}
+            self.__urls_base = base
+
+        url = self.__urls.get(service)
+        if url is None:
+            url = self.__urls[service] = f'{base}{self.SERVICES_ENDPOINT}{self.entity.category}/{service}'
+
+        return url
+
     def get_entity_state(self):
         """
         Get the state of the entity.
         """
         return make_request(
                 f'{self.client.url}{self.STATE_ENDPOINT}{self.entity.entity_id}',
-                self.client.token
+                self.client.token,
+                policy=self.client.policy,
+                metrics=self.client.metrics
                 ).json()
 
-    def send_payload(self, payload: dict):
+    def send_payload(self, payload: dict, service: str = 'turn_on'):
         """
         Sends a payload to the Home Assistant server.
 
         Args:
             payload (dict): The payload to send.
+            service (str): The service of the entity's domain to call with the payload.
 
         Returns:
-            None: The method is responsible for sending the payload to the server.
+            Response: The response to the service call.
         """
-        # Logic to send the payload to the Home Assistant server goes here
-        # For instance, using your `self.__client` object
-        payload =
+        return self._post(self.service_url(service), payload, service)
 
-    def _post(self, url, data, headers):
+    def _post(self, url, data, service: str = None):
+        """
+        Post data to the Home Assistant server using the client's request policy.
 
-        res = requests.post(url, headers=headers, json=data)
+        Args:
+            url (str): The URL to post to.
+            data (dict): The JSON body.
+            service (str): The service the post calls. When the client is in optimistic mode, its expected outcome is
+                put in the entity index as soon as the call succeeds.
 
-        if res.status_code != 200:
-            res.raise_for_status()
+        Returns:
+            Response: The HTTP response.
+
+        Raises:
+            APIError: If the request failed.
+        """
+        optimistic = getattr(self.client, 'optimistic', None)
+        # Read before the call, so a state that arrives while it is in flight isn't overwritten.
+        before = self.client.entities.get(self.entity.entity_id) if optimistic is not None and service else None
+
+        res = make_request(
+                url,
+                self.client.token,
+                method='POST',
+                data=data,
+                policy=self.client.policy,
+                metrics=self.client.metrics
+                )
 
         self.__last_response = res
+
+        if before is not None:
+            optimistic.service_called(before, service, data, self._changed_states(res))
+
+        return res
+
+    @staticmethod
+    def _changed_states(res) -> list:
+        # A service call answers with the states it changed; anything else means we learned nothing.
+        try:
+            changed = res.json()
+        except ValueError:
+            return []
+
+        return changed if isinstance(changed, list) else []
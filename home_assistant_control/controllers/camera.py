@@ -0,0 +1,626 @@
+import asyncio
+import threading
+from collections import deque
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from home_assistant_control.controllers import Controller
+from home_assistant_control.utils.api import make_request
+from home_assistant_control.utils.metrics import endpoint_label
+
+CHUNK_SIZE = 64 * 1024
+FRAME_BUFFER_SIZE = 64 * 1024
+
+JPEG_START = b'\xff\xd8'
+JPEG_END = b'\xff\xd9'
+
+
+def _writer(destination) -> Callable[[memoryview], None]:
+    # Sockets take `sendall`, files `write`; both accept a memoryview, so nothing is copied on the way out.
+    sendall = getattr(destination, 'sendall', None)
+    if sendall is not None:
+        return sendall
+
+    return destination.write
+
+
+def _read_into(source, view: memoryview) -> int:
+    # Return whatever has arrived, up to the size of the view. `readinto()` on a urllib3 response reads (into a
+    # temporary as large as the view) until the view is full, which on a live stream means waiting for several frames;
+    # `read1()` makes at most one read of the socket.
+    read1 = getattr(source, 'read1', None)
+    if read1 is None:
+        return source.readinto(view) or 0
+
+    # Capped, since the read allocates as much as it asks for before trimming to what arrived.
+    data = read1(min(len(view), CHUNK_SIZE))
+    size = len(data)
+    view[:size] = data
+    return size
+
+
+def _boundary(content_type: str) -> Optional[bytes]:
+    for parameter in content_type.split(';')[1:]:
+        name, _, value = parameter.strip().partition('=')
+        if name.lower() == 'boundary' and value:
+            value = value.strip('"')
+            return (value[2:] if value.startswith('--') else value).encode('latin-1')
+
+    return None
+
+
+class FrameQueue:
+    """
+    A bounded, thread-safe queue of frames that drops the oldest frame when a new one arrives and it is full.
+
+    A camera keeps sending frames however slowly they are consumed. Dropping stale frames keeps memory bounded at
+    `maxsize` frames and hands a slow consumer the newest picture instead of an ever-growing backlog.
+
+    Usage example:
+    >>> queue = FrameQueue(maxsize=2)
+    >>> stream.feed(queue)
+    >>> frame = queue.get(timeout=5)
+    """
+
+    def __init__(self, maxsize: int = 2):
+        """
+        Initializes a new instance of the FrameQueue class.
+
+        Args:
+            maxsize (int): The number of frames to hold.
+        """
+        if maxsize < 1:
+            raise ValueError('"maxsize" must be at least 1!')
+
+        self.__frames = deque(maxlen=maxsize)
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__received = 0
+        self.__dropped = 0
+
+    def __repr__(self):
+        return f'<FrameQueue queued={len(self)} received={self.__received} dropped={self.__dropped}>'
+
+    def __len__(self):
+        return len(self.__frames)
+
+    @property
+    def maxsize(self) -> int:
+        return self.__frames.maxlen
+
+    @property
+    def received(self) -> int:
+        """
+        The number of frames put on the queue.
+        """
+        return self.__received
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of frames discarded unread to make room for newer ones.
+        """
+        return self.__dropped
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def put(self, frame: bytes) -> bool:
+        """
+        Queue a frame, dropping the oldest queued one if the queue is full.
+
+        Args:
+            frame (bytes): The frame.
+
+        Returns:
+            bool: False if an older frame was dropped for it.
+        """
+        with self.__condition:
+            dropped = len(self.__frames) == self.__frames.maxlen
+            self.__frames.append(frame)
+            self.__received += 1
+            self.__dropped += dropped
+            self.__condition.notify()
+
+        return not dropped
+
+    def get(self, timeout: float = None) -> Optional[bytes]:
+        """
+        Take the oldest queued frame, waiting for one if the queue is empty.
+
+        Args:
+            timeout (float): How long to wait, in seconds; forever if omitted.
+
+        Returns:
+            bytes: The frame, or None if the wait timed out or the queue was closed and drained.
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__frames or self.__closed, timeout):
+                return None
+
+            return self.__frames.popleft() if self.__frames else None
+
+    def close(self):
+        """
+        Wake every waiting consumer; they drain what is queued and then get None.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+
+class MJPEGParser:
+    """
+    Splits an MJPEG (`multipart/x-mixed-replace`) stream into JPEG frames.
+
+    The parser reads whatever data has arrived (with `read1()` where the source has it, so a frame is handed out as
+    soon as it is complete) into one reusable buffer, and yields every frame as a memoryview of that buffer, so no
+    frame gets an allocation of its own. A frame is only valid until the next one is requested; keep `bytes(frame)` to
+    hold on to it. The buffer grows to fit the largest frame seen and no further.
+
+    Parts with a `Content-Length` header are cut by length; otherwise the parser scans for the next boundary. Without
+    a boundary it falls back to looking for JPEG start and end markers.
+
+    Usage example:
+    >>> for frame in MJPEGParser(response.raw, b'frameboundary'):
+    ...     decode(frame)
+    """
+
+    def __init__(self, source, boundary: bytes = None, buffer_size: int = FRAME_BUFFER_SIZE):
+        """
+        Initializes a new instance of the MJPEGParser class.
+
+        Args:
+            source: A binary file-like object with `read1()` or `readinto()`, such as `response.raw`.
+            boundary (bytes): The multipart boundary, without the leading dashes.
+            buffer_size (int): The initial size of the buffer.
+        """
+        self.__source = source
+        self.__boundary = b'--' + boundary if boundary else None
+        self.__buffer = bytearray(buffer_size)
+        self.__view = memoryview(self.__buffer)
+        self.__start = 0
+        self.__end = 0
+        self.__eof = False
+        self.bytes_read = 0
+        self.frames = 0
+
+    def __iter__(self) -> Iterator[memoryview]:
+        next_frame = self._next_part if self.__boundary else self._next_jpeg
+
+        while True:
+            frame = next_frame()
+            if frame is None:
+                return
+
+            self.frames += 1
+            yield frame
+
+    def _fill(self) -> Optional[int]:
+        # Read more data. Returns how far the data still needed moved towards the front of the buffer, or None at
+        # the end of the stream.
+        if self.__eof:
+            return None
+
+        shift = 0
+
+        if self.__end == len(self.__buffer):
+            pending = self.__end - self.__start
+
+            if self.__start:
+                # Reuse the space of frames already handed out. Same-size slice assignment never resizes the buffer,
+                # so memoryviews of earlier frames stay safe to hold (if stale).
+                self.__view[:pending] = self.__view[self.__start:self.__end]
+                shift = self.__start
+            else:
+                # One frame fills the whole buffer: allocate a larger one, since the old one may still be exported.
+                buffer = bytearray(len(self.__buffer) * 2)
+                buffer[:pending] = self.__view[:pending]
+                self.__buffer, self.__view = buffer, memoryview(buffer)
+
+            self.__start, self.__end = 0, pending
+
+        read = _read_into(self.__source, self.__view[self.__end:])
+        if not read:
+            self.__eof = True
+            return None
+
+        self.__end += read
+        self.bytes_read += read
+        return shift
+
+    def _find(self, marker: bytes, position: int) -> int:
+        # Find a marker at or after `position`, reading more as needed, without scanning any byte twice.
+        while True:
+            index = self.__buffer.find(marker, position, self.__end)
+            if index >= 0:
+                return index
+
+            position = max(position, self.__end - len(marker) + 1)
+            shift = self._fill()
+            if shift is None:
+                return -1
+            position -= shift
+
+    def _ensure(self, position: int, size: int) -> int:
+        # Make sure `size` bytes from `position` are in the buffer; returns where they now start, or -1.
+        while self.__end - position < size:
+            shift = self._fill()
+            if shift is None:
+                return -1
+            position -= shift
+
+        return position
+
+    def _next_part(self) -> Optional[memoryview]:
+        boundary = self.__boundary
+
+        while True:
+            index = self._find(boundary, self.__start)
+            if index < 0:
+                return None
+
+            self.__start = index
+            headers_end = self._find(b'\r\n\r\n', index + len(boundary))
+            if headers_end < 0:
+                return None
+
+            index = self.__start
+            headers = bytes(self.__view[index + len(boundary):headers_end]).split(b'\r\n')
+            body = headers_end + 4
+            length = None
+
+            for header in headers:
+                name, _, value = header.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+
+            if length is not None:
+                self.__start = body
+                body = self._ensure(body, length)
+                if body < 0:
+                    return None
+                frame_end = body + length
+            else:
+                self.__start = body
+                frame_end = self._find(b'\r\n' + boundary, body)
+                if frame_end < 0:
+                    return None
+                body = self.__start
+
+            self.__start = frame_end
+
+            if frame_end > body:
+                return self.__view[body:frame_end]
+
+    def _next_jpeg(self) -> Optional[memoryview]:
+        start = self._find(JPEG_START, self.__start)
+        if start < 0:
+            return None
+
+        self.__start = start
+        end = self._find(JPEG_END, start + len(JPEG_START))
+        if end < 0:
+            return None
+
+        start = self.__start
+        self.__start = end + len(JPEG_END)
+        return self.__view[start:self.__start]
+
+
+class CameraStream:
+    """
+    A streamed response from one of the camera proxy endpoints.
+
+    The body is never held in memory as a whole: read it as chunks, copy it to a file or socket, or (for MJPEG) split
+    it into frames, all through reusable buffers. Close the stream when done, or use it as a context manager.
+
+    Usage example:
+    >>> with camera.stream() as stream:
+    ...     for frame in stream.frames():
+    ...         decode(frame)
+    """
+
+    def __init__(self, response, entity_id: str, metrics=None, buffer_size: int = FRAME_BUFFER_SIZE):
+        """
+        Initializes a new instance of the CameraStream class.
+
+        Args:
+            response (Response): A response requested with `stream=True`.
+            entity_id (str): The camera's entity ID, used as a metrics label.
+            metrics (Metrics): Where to count bytes and frames.
+            buffer_size (int): The initial size of the frame buffer.
+        """
+        self.__response = response
+        self.__entity_id = entity_id
+        self.__metrics = metrics
+        self.__buffer_size = buffer_size
+        self.__endpoint = endpoint_label(response.url)
+        self.__counted = 0
+        self.__closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'<CameraStream entity_id={self.__entity_id} content_type={self.content_type} closed={self.__closed}>'
+
+    @property
+    def response(self):
+        return self.__response
+
+    @property
+    def content_type(self) -> str:
+        return self.__response.headers.get('Content-Type', '')
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def _count(self, size: int, frames: int = 0):
+        if self.__metrics is None:
+            return
+
+        if size:
+            self.__metrics.increment('hac_request_bytes_received_total', size, endpoint=self.__endpoint)
+        if frames:
+            self.__metrics.increment('hac_camera_frames_total', frames, entity_id=self.__entity_id)
+
+    def _source(self):
+        # `raw` skips `requests`' own chunk allocation; only fall back to it for a content-encoded body.
+        if self.__response.headers.get('Content-Encoding'):
+            return None
+
+        return self.__response.raw
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE, buffer: bytearray = None) -> Iterator[memoryview]:
+        """
+        Iterate over the body in chunks read into one reusable buffer.
+
+        Args:
+            chunk_size (int): The size of the buffer, if none is given.
+            buffer (bytearray): A buffer to reuse, e.g. across several downloads.
+
+        Returns:
+            Iterator[memoryview]: The chunks. Each is only valid until the next one is requested.
+        """
+        source = self._source()
+
+        if source is None:
+            for chunk in self.__response.iter_content(chunk_size):
+                self._count(len(chunk))
+                yield memoryview(chunk)
+            return
+
+        view = memoryview(buffer if buffer is not None else bytearray(chunk_size))
+
+        while True:
+            read = _read_into(source, view)
+            if not read:
+                return
+
+            self._count(read)
+            yield view[:read]
+
+    async def achunks(self, chunk_size: int = CHUNK_SIZE, buffer: bytearray = None) -> AsyncIterator[memoryview]:
+        """
+        Like `chunks()`, for use with `async for`. The blocking reads run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.chunks(chunk_size, buffer)
+        done = object()
+
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, done)
+                if chunk is done:
+                    return
+
+                yield chunk
+        finally:
+            chunks.close()
+
+    def write_to(self, destination, chunk_size: int = CHUNK_SIZE, buffer: bytearray = None) -> int:
+        """
+        Copy the body to a file or socket through a reusable buffer.
+
+        Args:
+            destination: A path, or an object with `write()` (a file) or `sendall()` (a socket).
+            chunk_size (int): The size of the buffer, if none is given.
+            buffer (bytearray): A buffer to reuse.
+
+        Returns:
+            int: The number of bytes written.
+        """
+        if isinstance(destination, str):
+            with open(destination, 'wb') as f:
+                return self.write_to(f, chunk_size, buffer)
+
+        write = _writer(destination)
+        written = 0
+
+        for chunk in self.chunks(chunk_size, buffer):
+            write(chunk)
+            written += len(chunk)
+
+        return written
+
+    def frames(self) -> Iterator[memoryview]:
+        """
+        Split an MJPEG body into JPEG frames that are views into one reusable buffer.
+
+        Returns:
+            Iterator[memoryview]: The frames; see `MJPEGParser` for how long each one stays valid.
+        """
+        source = self._source()
+        if source is None:
+            raise ValueError('Cannot parse a content-encoded camera stream.')
+
+        parser = MJPEGParser(source, _boundary(self.content_type), self.__buffer_size)
+        counted_bytes = counted_frames = 0
+
+        try:
+            for frame in parser:
+                yield frame
+
+                # Batch the metrics updates; a stream can run at hundreds of frames per second.
+                if parser.frames - counted_frames >= 32:
+                    self._count(parser.bytes_read - counted_bytes, parser.frames - counted_frames)
+                    counted_bytes, counted_frames = parser.bytes_read, parser.frames
+        except (OSError, ValueError, AttributeError):
+            # Reading from a stream closed under us (see `feed()`) ends it like the end of the body does.
+            if not self.__closed:
+                raise
+        finally:
+            self._count(parser.bytes_read - counted_bytes, parser.frames - counted_frames)
+
+    def feed(self, queue: FrameQueue) -> threading.Thread:
+        """
+        Put every frame on a FrameQueue from a background thread, dropping old frames when the consumer falls behind.
+
+        The queue is closed when the stream ends or is closed.
+
+        Args:
+            queue (FrameQueue): The queue.
+
+        Returns:
+            threading.Thread: The thread reading the stream.
+        """
+
+        def run():
+            try:
+                dropped = 0
+
+                for frame in self.frames():
+                    # The one copy per frame: a queued frame must outlive the parser's buffer.
+                    dropped += not queue.put(bytes(frame))
+
+                    if dropped >= 32:
+                        self._count_dropped(dropped)
+                        dropped = 0
+
+                self._count_dropped(dropped)
+            finally:
+                queue.close()
+
+        thread = threading.Thread(target=run, name=f'camera-{self.__entity_id}', daemon=True)
+        thread.start()
+
+        return thread
+
+    def _count_dropped(self, dropped: int):
+        if dropped and self.__metrics is not None:
+            self.__metrics.increment('hac_camera_frames_dropped_total', dropped, entity_id=self.__entity_id)
+
+    async def aframes(self, maxsize: int = 2) -> AsyncIterator[bytes]:
+        """
+        Iterate over the frames of an MJPEG body with `async for`, through a FrameQueue of `maxsize` frames.
+
+        Frames arrive as `bytes`, since they cross threads. A consumer slower than the camera gets the newest frames
+        and skips the rest. Breaking out of the loop closes the stream.
+
+        Args:
+            maxsize (int): The number of frames to buffer.
+
+        Returns:
+            AsyncIterator[bytes]: The frames.
+        """
+        loop = asyncio.get_running_loop()
+        queue = FrameQueue(maxsize)
+        self.feed(queue)
+
+        try:
+            while True:
+                frame = await loop.run_in_executor(None, queue.get)
+                if frame is None:
+                    return
+
+                yield frame
+        finally:
+            self.close()
+
+    def close(self):
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.__response.close()
+
+
+class CameraController(Controller):
+    """
+    A controller for camera entities that streams images and MJPEG video from Home Assistant's camera proxy.
+
+    Usage example:
+    >>> camera = CameraController(client.entities.get('camera.front_door'))
+    >>> camera.save_snapshot('front_door.jpg')
+    >>> with camera.stream() as stream:
+    ...     for frame in stream.frames():
+    ...         decode(frame)
+    """
+    PROXY_ENDPOINT = f'{Controller.API_STUB}camera_proxy/'
+    STREAM_ENDPOINT = f'{Controller.API_STUB}camera_proxy_stream/'
+
+    def _open(self, endpoint: str, buffer_size: int = FRAME_BUFFER_SIZE) -> CameraStream:
+        response = make_request(
+                f'{self.client.url}{endpoint}{self.entity.entity_id}',
+                self.client.token,
+                policy=self.client.policy,
+                metrics=self.client.metrics,
+                stream=True
+                )
+
+        return CameraStream(response, self.entity.entity_id, self.client.metrics, buffer_size)
+
+    def snapshot_stream(self) -> CameraStream:
+        """
+        Request the camera's current image from `/api/camera_proxy/<entity_id>` without reading it yet.
+
+        Returns:
+            CameraStream: The open response; read it with `chunks()` or `write_to()` and close it.
+        """
+        return self._open(self.PROXY_ENDPOINT)
+
+    def snapshot(self) -> bytes:
+        """
+        Get the camera's current image.
+
+        Returns:
+            bytes: The image.
+        """
+        image = bytearray()
+
+        with self.snapshot_stream() as stream:
+            for chunk in stream.chunks():
+                image += chunk
+
+        return bytes(image)
+
+    def save_snapshot(self, destination, buffer: bytearray = None) -> int:
+        """
+        Write the camera's current image to a file or socket without holding it in memory.
+
+        Args:
+            destination: A path, or an object with `write()` or `sendall()`.
+            buffer (bytearray): A buffer to reuse across calls.
+
+        Returns:
+            int: The size of the image.
+        """
+        with self.snapshot_stream() as stream:
+            return stream.write_to(destination, buffer=buffer)
+
+    def stream(self, buffer_size: int = FRAME_BUFFER_SIZE) -> CameraStream:
+        """
+        Open the camera's MJPEG stream at `/api/camera_proxy_stream/<entity_id>`.
+
+        Args:
+            buffer_size (int): The initial size of the frame buffer; it grows to fit the largest frame.
+
+        Returns:
+            CameraStream: The open stream; iterate over `frames()`, `aframes()`, or `feed()` a FrameQueue.
+        """
+        return self._open(self.STREAM_ENDPOINT, buffer_size)
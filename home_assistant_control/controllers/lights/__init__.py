@@ -1,7 +1,5 @@
 from home_assistant_control.controllers import Controller, Payload
 from home_assistant_control.controllers.lights.maps import COLORS
-from home_assistant_control.utils.api import make_request
-from home_assistant_control.utils import get_headers
 
 
 class LightPayload(Payload):
@@ -98,31 +96,38 @@ class LightController(Controller):
         self.send_payload(payload)
 
     def get_state(self):
-        return self.get_entity_state()['state']
-
-    def _post(self, url, *args):
-        headers = get_headers(self.client.token)
+        # In optimistic mode the index holds the outcome of our own pending commands, and an attached ingestor keeps the
+        # rest of it live; skip the round trip then. Otherwise the index may be stale, so ask Home Assistant.
+        optimistic = self.client.optimistic
+        if optimistic is not None:
+            entity = self.client.entities.get(self.entity.entity_id)
+            if entity is not None and (entity.pending or optimistic.attached):
+                return entity.entity_data['state']
 
-        return super()._post(url, headers=headers, json=data)
+        return self.get_entity_state()['state']
 
     def get_endpoint_url(self, service):
-        ep = self.SERVICE_URL_MAP.get(service.lower())
-        return f'{self.client.url}{ep}'
+        """
+        Get the URL of one of the light services in `SERVICE_URL_MAP`.
 
-    def turn_on(self):
-        # Assemble the url
-        url = self.get_endpoint_url('turn_on')
+        Args:
+            service (str): The service, e.g. 'turn_on'.
 
-        # Assemble the data
-        data = self.service_payload
+        Returns:
+            str: The URL.
 
-        # Post the data
-        return self._post(url, data.get_payload())
+        Raises:
+            ValueError: If the service isn't one of the mapped light services.
+        """
+        service = service.lower()
+        if service not in self.SERVICE_URL_MAP:
+            raise ValueError(f'Unknown light service "{service}"; expected one of {", ".join(self.SERVICE_URL_MAP)}!')
 
-    def turn_off(self):
-        # Assemble the url
-        url = self.get_endpoint_url('turn_off')
+        return self.service_url(service)
 
-        data = LightPayload(self.entity.name)
+    def turn_on(self):
+        # The URL and payload are built on first use and reused by every later call.
+        return self._post(self.service_url('turn_on'), self.base_payload, 'turn_on')
 
-        return self._post(url, data.get_payload())
+    def turn_off(self):
+        return self._post(self.service_url('turn_off'), self.base_payload, 'turn_off')
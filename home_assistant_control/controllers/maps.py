@@ -1,5 +1,7 @@
+from home_assistant_control.controllers.camera import CameraController
 from home_assistant_control.controllers.lights import LightPayload, LightController
 
 CONTROLLER_MAP = {
-        'light': LightController
+        'camera': CameraController,
+        'light':  LightController,
         }
@@ -0,0 +1,143 @@
+import threading
+from typing import Any, Dict, List
+
+from home_assistant_control.controllers import Controller
+from home_assistant_control.utils.cache import Subscriber
+
+
+class ControllerRegistry(Subscriber):
+    """
+    Hands out one controller per entity, built on first use from `controllers.maps.CONTROLLER_MAP` and reused after.
+
+    Building a controller validates its category and each controller formats its service URLs and base payload once,
+    so a hot loop that goes through the registry pays for that once per entity instead of once per command. Entries
+    for entities that disappear are dropped after every refresh (using the index's change feed, so that costs
+    O(changes)), and as removals arrive from an EventIngestor the registry is attached to.
+
+    Usage example:
+    >>> client.controllers['light.kitchen'].turn_on()
+    """
+
+    def __init__(self, client, controller_map: Dict[str, type] = None):
+        """
+        Initializes a new instance of the ControllerRegistry class.
+
+        Args:
+            client (Client): The client whose entities the controllers drive.
+            controller_map (dict): Controller classes keyed by domain. Defaults to `CONTROLLER_MAP`; domains without
+                an entry get a plain `Controller`.
+        """
+        if controller_map is None:
+            from home_assistant_control.controllers.maps import CONTROLLER_MAP as controller_map
+
+        self.__client = client
+        self.__controller_map = controller_map
+        self.__controllers: Dict[str, Controller] = {}
+        self.__lock = threading.Lock()
+        self.__cursor = getattr(client.entities, 'change_cursor', None)
+
+        if client.entity_json is not None:
+            # Subscribed after the index, so this runs once the refreshed index is in place.
+            client.entity_json.subscribe(self)
+
+    def __repr__(self):
+        return f'<ControllerRegistry controllers={len(self.__controllers)}>'
+
+    def __len__(self):
+        return len(self.__controllers)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self.__controllers
+
+    def __getitem__(self, entity_id: str) -> Controller:
+        return self.get(entity_id)
+
+    def get(self, entity_id: str) -> Controller:
+        """
+        Get the controller of an entity, building it on first use.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Controller: The controller; an instance of the domain's class in the controller map.
+
+        Raises:
+            KeyError: If the entity isn't in the index.
+        """
+        controller = self.__controllers.get(entity_id)
+        if controller is not None:
+            return controller
+
+        entity = self.__client.entities.get(entity_id)
+        if entity is None:
+            raise KeyError(entity_id)
+
+        controller = self.__controller_map.get(entity.category, Controller)(entity)
+
+        with self.__lock:
+            # Another thread may have won the race; everyone gets the same controller.
+            return self.__controllers.setdefault(entity_id, controller)
+
+    def discard(self, entity_id: str):
+        with self.__lock:
+            self.__controllers.pop(entity_id, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__controllers.clear()
+
+    def update(self):
+        """
+        Update method for the Subscriber interface; called when the client's states were refreshed.
+        """
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        Drop the controllers of entities that are no longer in the index.
+
+        Returns:
+            int: The number of controllers dropped.
+        """
+        if not self.__controllers:
+            self.__cursor = getattr(self.__client.entities, 'change_cursor', None)
+            return 0
+
+        entities = self.__client.entities
+
+        if self.__cursor is None:
+            # No change feed (e.g. a client reading shared state): check every controller.
+            gone = [entity_id for entity_id in list(self.__controllers) if entities.get(entity_id) is None]
+        else:
+            feed = entities.changes_since(self.__cursor)
+            self.__cursor = feed.cursor
+
+            if feed.resync:
+                gone = [entity_id for entity_id in list(self.__controllers) if feed.snapshot.get(entity_id) is None]
+            else:
+                gone = [entity_id for entity_id, entity in feed.changed.items()
+                        if entity is None and entity_id in self.__controllers]
+
+        with self.__lock:
+            for entity_id in gone:
+                self.__controllers.pop(entity_id, None)
+
+        return len(gone)
+
+    def _drop_removed(self, changes: List[Dict[str, Any]]):
+        for change in changes:
+            if change.get('new_state') is None and change.get('entity_id') in self.__controllers:
+                self.discard(change['entity_id'])
+
+    def attach(self, ingestor):
+        """
+        Drop controllers as soon as an EventIngestor applies the removal of their entity.
+
+        Args:
+            ingestor (EventIngestor): The ingestor feeding the client's entity index.
+        """
+        ingestor.add_batch_listener(self._drop_removed)
+
+    def detach(self, ingestor):
+        ingestor.remove_batch_listener(self._drop_removed)
@@ -0,0 +1,322 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+QUEUE_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Command:
+    __slots__ = ('entity_id', 'service', 'data', 'priority', 'future', 'queued_at')
+
+    def __init__(self, entity_id: str, service: str, data: Dict[str, Any], priority: str):
+        self.entity_id = entity_id
+        self.service = service
+        self.data = data
+        self.priority = priority
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class CommandDispatcher:
+    """
+    Sends service calls from a bounded pool of worker threads, with interactive commands ahead of bulk work.
+
+    There is one FIFO queue per priority class. A free worker always takes the oldest interactive command first, so an
+    interactive command never waits behind queued bulk commands, only for a worker to finish the call it is making.
+    Bulk commands are only ever run by `bulk_workers` of the workers at a time (one less than the pool by default),
+    which keeps a worker free for interactive commands however much bulk work is queued; and since every bulk command
+    is a single call, bulk work yields to interactive work between calls.
+
+    The bulk queue is bounded: submitting bulk work to a full queue blocks until the workers catch up, so a job
+    touching thousands of entities doesn't queue them all up front. The interactive queue isn't.
+
+    Per class, `hac_dispatch_queue_seconds` is the time commands spent queued and `hac_dispatch_run_seconds` the time
+    their calls took; `hac_dispatch_completed_total` and `hac_dispatch_errors_total` count them, and
+    `hac_dispatch_queued` is the queue depth.
+
+    Usage example:
+    >>> with CommandDispatcher(client) as dispatcher:
+    ...     dispatcher.submit_many(all_light_ids, 'turn_off', priority=BULK)
+    ...     dispatcher.submit('light.hall', 'turn_on').result()  # Doesn't wait for the bulk job.
+    """
+
+    def __init__(self, client, max_workers: int = 4, bulk_workers: int = None, max_bulk_queue: int = 1000):
+        """
+        Initializes a new instance of the CommandDispatcher class.
+
+        Args:
+            client (Client): The client to make the service calls with. Controllers come from `client.controllers`.
+            max_workers (int): The number of threads making service calls.
+            bulk_workers (int): The most threads running bulk commands at once. Defaults to `max_workers - 1` (but at
+                least 1).
+            max_bulk_queue (int): The most bulk commands queued at once.
+        """
+        if max_workers < 1:
+            raise ValueError('"max_workers" must be at least 1!')
+
+        if bulk_workers is None:
+            bulk_workers = max(1, max_workers - 1)
+
+        if not 1 <= bulk_workers <= max_workers:
+            raise ValueError('"bulk_workers" must be between 1 and "max_workers"!')
+
+        if max_bulk_queue < 1:
+            raise ValueError('"max_bulk_queue" must be at least 1!')
+
+        self.__client = client
+        self.__max_workers = max_workers
+        self.__bulk_workers = bulk_workers
+        self.__max_bulk_queue = max_bulk_queue
+        self.__queues: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self.__running_bulk = 0
+        self.__condition = threading.Condition()
+        self.__threads: List[threading.Thread] = []
+        self.__running = False
+        # Set by `stop()`: nothing is accepted until the next `start()`. A dispatcher that was never started accepts
+        # commands and runs them once it is.
+        self.__stopped = False
+        self.__thread_names = itertools.count()
+
+    def __repr__(self):
+        return (f'<CommandDispatcher interactive={len(self.__queues[INTERACTIVE])} bulk={len(self.__queues[BULK])} '
+                f'workers={self.__max_workers} running={self.__running}>')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def metrics(self):
+        return self.__client.metrics
+
+    @property
+    def max_workers(self) -> int:
+        return self.__max_workers
+
+    @property
+    def bulk_workers(self) -> int:
+        return self.__bulk_workers
+
+    def queued(self, priority: str = None) -> int:
+        """
+        Get the number of commands waiting for a worker.
+
+        Args:
+            priority (str): Only count this class; all classes if omitted.
+
+        Returns:
+            int: The number of queued commands.
+        """
+        if priority is not None:
+            return len(self.__queues[priority])
+
+        return sum(len(queue) for queue in self.__queues.values())
+
+    def start(self):
+        """
+        Start the worker threads. Commands submitted before are run now.
+        """
+        with self.__condition:
+            if self.__running:
+                return
+
+            self.__running = True
+            self.__stopped = False
+
+            for _ in range(self.__max_workers):
+                thread = threading.Thread(target=self._run, name=f'hac-dispatch-{next(self.__thread_names)}',
+                                          daemon=True)
+                thread.start()
+                self.__threads.append(thread)
+
+    def stop(self, wait: bool = True, cancel: bool = False):
+        """
+        Stop the worker threads once the queued commands are done. Until the next `start()`, `submit()` raises.
+
+        Args:
+            wait (bool): Wait for the workers to finish.
+            cancel (bool): Cancel the queued commands instead of running them.
+        """
+        cancelled = []
+
+        with self.__condition:
+            self.__running = False
+            self.__stopped = True
+
+            if cancel:
+                for queue in self.__queues.values():
+                    cancelled.extend(queue)
+                    queue.clear()
+
+                self._update_gauges()
+
+            self.__condition.notify_all()
+
+        for command in cancelled:
+            command.future.cancel()
+
+        if wait:
+            for thread in self.__threads:
+                thread.join()
+
+        self.__threads = []
+
+    def submit(self, entity_id: str, service: str, data: Dict[str, Any] = None, priority: str = INTERACTIVE,
+               timeout: float = None) -> Future:
+        """
+        Queue a service call on an entity.
+
+        Args:
+            entity_id (str): The ID of the entity.
+            service (str): The service of the entity's domain to call, e.g. 'turn_on'.
+            data (dict): Extra service data.
+            priority (str): `INTERACTIVE` or `BULK`.
+            timeout (float): For bulk commands, the most seconds to wait for room in the queue; forever if omitted.
+
+        Returns:
+            Future: Resolves to the response of the call, or to the exception that made it fail.
+
+        Raises:
+            ValueError: If the priority is unknown.
+            RuntimeError: If the dispatcher was stopped (also while waiting for room in the bulk queue).
+            TimeoutError: If the bulk queue stayed full for `timeout` seconds.
+        """
+        if priority not in self.__queues:
+            raise ValueError(f'Unknown priority "{priority}"; expected one of {", ".join(PRIORITIES)}!')
+
+        queue = self.__queues[priority]
+
+        with self.__condition:
+            if priority == BULK and len(queue) >= self.__max_bulk_queue:
+                if not self.__condition.wait_for(lambda: self.__stopped or len(queue) < self.__max_bulk_queue,
+                                                 timeout):
+                    raise TimeoutError('The bulk queue is full!')
+
+            if self.__stopped:
+                # Nothing would ever run it; don't hand out a Future that never resolves.
+                raise RuntimeError('The dispatcher was stopped!')
+
+            command = _Command(entity_id, service, data, priority)
+            queue.append(command)
+            self._update_gauges()
+            # Submitters waiting for room share the condition; wake everyone so a worker is among them.
+            self.__condition.notify_all()
+
+        return command.future
+
+    def submit_many(self, entity_ids: Iterable[str], service: str, data: Dict[str, Any] = None,
+                    priority: str = BULK) -> List[Future]:
+        """
+        Queue the same service call on each of a number of entities, blocking whenever the bulk queue is full.
+
+        Args:
+            entity_ids (Iterable[str]): The IDs of the entities.
+            service (str): The service to call.
+            data (dict): Extra service data.
+            priority (str): `BULK` by default.
+
+        Returns:
+            list: A Future per entity, in order.
+        """
+        return [self.submit(entity_id, service, data, priority) for entity_id in entity_ids]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the queue latency and throughput of each priority class.
+
+        Returns:
+            dict: Per class, the number of commands queued, completed and failed, and the median and 99th percentile of
+                their time in the queue, in seconds.
+        """
+        metrics = self.metrics
+        summary = {}
+
+        for priority in PRIORITIES:
+            histogram = metrics.histogram('hac_dispatch_queue_seconds', priority=priority)
+            summary[priority] = {
+                    'queued':    len(self.__queues[priority]),
+                    'completed': metrics.counter('hac_dispatch_completed_total', priority=priority),
+                    'errors':    metrics.counter('hac_dispatch_errors_total', priority=priority),
+                    'queue_p50': histogram.quantile(0.5) if histogram is not None else 0.0,
+                    'queue_p99': histogram.quantile(0.99) if histogram is not None else 0.0,
+                    }
+
+        return summary
+
+    def _update_gauges(self):
+        for priority, queue in self.__queues.items():
+            self.metrics.set_gauge('hac_dispatch_queued', len(queue), priority=priority)
+
+    def _take(self):
+        interactive = self.__queues[INTERACTIVE]
+        bulk = self.__queues[BULK]
+
+        while True:
+            if interactive:
+                return interactive.popleft()
+
+            if bulk and self.__running_bulk < self.__bulk_workers:
+                self.__running_bulk += 1
+                command = bulk.popleft()
+                # Wake a submitter waiting for room.
+                self.__condition.notify_all()
+                return command
+
+            if not self.__running and not interactive and not bulk:
+                return None
+
+            self.__condition.wait()
+
+    def _run(self):
+        while True:
+            with self.__condition:
+                command = self._take()
+                if command is None:
+                    return
+
+                self._update_gauges()
+
+            try:
+                self._execute(command)
+            finally:
+                if command.priority == BULK:
+                    with self.__condition:
+                        self.__running_bulk -= 1
+                        self.__condition.notify_all()
+
+    def _execute(self, command: _Command):
+        if not command.future.set_running_or_notify_cancel():
+            return
+
+        metrics = self.metrics
+        started = time.monotonic()
+        metrics.observe('hac_dispatch_queue_seconds', started - command.queued_at, buckets=QUEUE_BUCKETS,
+                        priority=command.priority)
+
+        try:
+            controller = self.__client.controllers[command.entity_id]
+            payload = {**controller.base_payload, **command.data} if command.data else controller.base_payload
+            response = controller.send_payload(payload, command.service)
+        except Exception as e:
+            metrics.increment('hac_dispatch_errors_total', priority=command.priority)
+            command.future.set_exception(e)
+            return
+
+        metrics.observe('hac_dispatch_run_seconds', time.monotonic() - started, buckets=QUEUE_BUCKETS,
+                        priority=command.priority)
+        metrics.increment('hac_dispatch_completed_total', priority=command.priority)
+        command.future.set_result(response)
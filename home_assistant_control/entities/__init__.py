@@ -1,18 +1,22 @@
+import threading
+import time
 from abc import ABC
-from collections import defaultdict
-from typing import List, Dict, Any
-from requests import get
-from cachetools import TTLCache, cached
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Mapping, Optional, Tuple
+from cachetools import TTLCache
 from datetime import datetime, timedelta, timezone
-from requests import RequestException
-from typing import List, Dict, Any
 
+from home_assistant_control.errors.client import APIError
 from home_assistant_control.utils import format_time
 from home_assistant_control.utils import validate_and_transform_url
 from home_assistant_control.utils.api import make_request, validate_and_return_token
 from home_assistant_control.utils.cache import Publisher, Subscriber
+from home_assistant_control.utils.metrics import Metrics
 
 from home_assistant_control.entities.categories import Categories, Category
+from home_assistant_control.entities.changes import ChangeLog, Changes
+from home_assistant_control.entities.index import EntityIndex
 
 
 class Entity:
@@ -27,22 +31,53 @@ class Entity:
     >>> entity = Entity('switch.living_room')
     """
 
-    def __init__(self, entity_data: Dict[str, Any], client):
+    def __init__(self, entity_data: Dict[str, Any], client, fetched_at: float = None, pending: bool = False):
         """
         Initialize an Entity object.
 
         Args:
             entity_data (dict): The data associated with the entity.
+            fetched_at (float): When the data was fetched, on the `time.monotonic()` clock. Defaults to now.
+            pending (bool): The data is what a service call is expected to lead to, not yet confirmed by Home Assistant.
         """
         self.__client = client
         self.__entity_id = entity_data['entity_id']
         self.__entity_data = entity_data
+        self.__fetched_at = time.monotonic() if fetched_at is None else fetched_at
+        self.__pending = pending
         self.__category, self.__name = self.get_category_and_name(self.__entity_id)
 
     @property
     def client(self):
         return self.__client
 
+    @property
+    def pending(self) -> bool:
+        """
+        Whether this is an optimistic state still waiting for Home Assistant to confirm it.
+        """
+        return self.__pending
+
+    @property
+    def fetched_at(self) -> float:
+        """
+        Get when the entity's data was fetched from Home Assistant, on the `time.monotonic()` clock.
+
+        Returns:
+            float: The fetch time.
+        """
+        return self.__fetched_at
+
+    @property
+    def age(self) -> float:
+        """
+        Get how old the entity's data is.
+
+        Returns:
+            float: The age in seconds.
+        """
+        return time.monotonic() - self.__fetched_at
+
     @staticmethod
     def get_category_and_name(entity_id: str) -> list[str]:
         """
@@ -98,6 +133,14 @@ class Entity:
 
 
 class Entities(Subscriber, ABC):
+    # `read_many` refreshes stale entities one GET each (in parallel) up to this many ...
+    SINGLE_FETCH_LIMIT = 16
+    # ... and as long as they are less than this share of all entities; past that one full dump is cheaper.
+    SINGLE_FETCH_RATIO = 0.25
+    SINGLE_FETCH_WORKERS = 8
+    REFRESH_STRATEGIES = (None, 'single', 'full')
+    # How many entity changes `changes_since()` can look back over before a poller has to resync.
+    CHANGE_LOG_SIZE = 10000
 
     def __init__(self, client, entity_json, cache_timeout: int = 300):
         self.__client = client
@@ -110,8 +153,11 @@ class Entities(Subscriber, ABC):
         self.__entity_json = entity_json
         self.__entity_json.subscribe(self)
 
-        self.__all_entities = defaultdict(list)
-        self.__categories = {}
+        # The current snapshot of the index. Writers build a new one and swap it in; readers never lock.
+        self.__index = EntityIndex.empty()
+        self.__write_lock = threading.Lock()
+        # Written after each swap, under the write lock, so the index is never older than the log's head.
+        self.__changes = ChangeLog(self.CHANGE_LOG_SIZE)
 
     @staticmethod
     def validate_and_transform_url(url):
@@ -122,58 +168,339 @@ class Entities(Subscriber, ABC):
         Collects and categorizes entity data by calling the EntityJSON object.
         """
         entity_data = self.__entity_json.gather()
-        self._categorize_entities(entity_data)
+        self.load_states(entity_data, self.__entity_json.fetched_at)
+
+    def load_states(self, entity_data: List[Dict[str, Any]], fetched_at: float = None):
+        """
+        Replace the whole index with a full set of states, like a refresh does, e.g. from a recording or a websocket
+        snapshot.
 
-    def _categorize_entities(self, entity_data: List[Dict[str, Any]]):
+        Args:
+            entity_data (List[Dict[str, Any]]): The state objects, as `/api/states` returns them.
+            fetched_at (float): When they were fetched, on the `time.monotonic()` clock. Defaults to now.
+        """
+        self._categorize_entities(entity_data, fetched_at)
+
+    def _categorize_entities(self, entity_data: List[Dict[str, Any]], fetched_at: float = None):
         """
         Sorts entities into their respective categories based on their types.
 
         Args:
             entity_data (List[Dict[str, Any]]): The entity data to categorize.
+            fetched_at (float): When the data was fetched, on the `time.monotonic()` clock. Defaults to now.
+        """
+        metrics = self.client.metrics
+        fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+        with metrics.timer('hac_entity_index_rebuild_seconds'):
+            # Build the new snapshot off to the side; readers keep using the current one until it is swapped in.
+            entities = [Entity(entity, self.client, fetched_at) for entity in entity_data]
+
+            with self.__write_lock:
+                previous = self.__index
+                index = EntityIndex.build(entities, self._new_category, previous.version + 1, previous)
+                self.__index = index
+                self.__changes.extend(self._changed_ids(previous, entities))
+
+        metrics.set_gauge('hac_entity_index_entities', len(index))
+        metrics.set_gauge('hac_entity_index_categories', len(index.categories))
+
+    @staticmethod
+    def _changed_ids(previous: EntityIndex, entities: List[Entity]) -> List[str]:
+        # A full refresh says nothing about what changed; compare it with the snapshot it replaces.
+        changed = []
+        seen = set()
+
+        for entity in entities:
+            entity_id = entity.entity_id
+            seen.add(entity_id)
+            old = previous.get(entity_id)
+
+            if old is None or old.entity_data != entity.entity_data:
+                changed.append(entity_id)
+
+        for members in previous.all_entities.values():
+            changed.extend(old.entity_id for old in members if old.entity_id not in seen)
+
+        return changed
+
+    def _new_category(self, category_name: str) -> Category:
+        return Category(self.__client, category_name)
+
+    def apply_state_changes(self, changes: Iterable[Dict[str, Any]]) -> int:
+        """
+        Apply a batch of `state_changed` event data to the index in a single pass.
+
+        Changes to the same entity within the batch are coalesced; only the last one is applied. The whole batch is
+        published as one new snapshot, which only copies the categories the batch touches.
+
+        Args:
+            changes (Iterable[Dict[str, Any]]): Event data, each holding `entity_id` and `new_state`. A `new_state` of
+                None removes the entity.
+
+        Returns:
+            int: The number of entities that were updated, added or removed.
+        """
+        latest = {}
+        for change in changes:
+            latest[change['entity_id']] = change.get('new_state')
+
+        puts = {entity_id: Entity(new_state, self.client)
+                for entity_id, new_state in latest.items() if new_state is not None}
+        removals = [entity_id for entity_id, new_state in latest.items() if new_state is None]
+
+        with self.client.metrics.timer('hac_entity_index_apply_seconds'):
+            with self.__write_lock:
+                index = self.__index.with_changes(puts, removals, self._new_category, self.__index.version + 1)
+                self.__index = index
+                self.__changes.extend(latest)
+
+        self.client.metrics.increment('hac_entity_index_changes_applied_total', len(latest))
+        self.client.metrics.set_gauge('hac_entity_index_entities', len(index))
+
+        return len(latest)
+
+    def compare_and_set(self, entity_id: str, expected: Optional[Entity], new_state: Optional[Dict[str, Any]],
+                        pending: bool = False) -> Optional[Entity]:
+        """
+        Replace one entity's state, but only if the index still holds the given Entity object for it.
+
+        This lets a writer that read an entity earlier update it without overwriting a newer state that arrived in the
+        meantime, e.g. an event applied by an EventIngestor.
+
+        Args:
+            entity_id (str): The ID of the entity.
+            expected (Entity): The Entity object the index must still hold; None if the entity must be absent.
+            new_state (dict): The new state; None removes the entity.
+            pending (bool): Mark the new Entity as an unconfirmed, optimistic state.
+
+        Returns:
+            Entity: The Entity that was put in the index (None when removing), or `expected` if it was no longer
+                current and nothing changed.
+        """
+        entity = Entity(new_state, self.client, pending=pending) if new_state is not None else None
+        puts = {entity_id: entity} if entity is not None else {}
+        removals = [entity_id] if entity is None else []
+
+        with self.__write_lock:
+            if self.__index.get(entity_id) is not expected:
+                return expected
+
+            index = self.__index.with_changes(puts, removals, self._new_category, self.__index.version + 1)
+            self.__index = index
+            self.__changes.extend((entity_id,))
+
+        self.client.metrics.set_gauge('hac_entity_index_entities', len(index))
+
+        return entity
+
+    def snapshot(self) -> EntityIndex:
+        """
+        Get the current snapshot of the index.
+
+        The snapshot never changes, so several reads from it are always consistent with each other, even while the
+        index is being refreshed.
+
+        Returns:
+            EntityIndex: The current snapshot.
+        """
+        return self.__index
+
+    @property
+    def change_cursor(self) -> int:
+        """
+        Get the sequence number of the latest logged change. Take it together with a `snapshot()` to start following
+        `changes_since()`.
+
+        Returns:
+            int: The cursor.
+        """
+        return self.__changes.head
+
+    def changes_since(self, cursor: int) -> Changes:
+        """
+        Get the entities that changed after a cursor, for consumers that poll.
+
+        Only the last `CHANGE_LOG_SIZE` changes are kept. If the cursor is older than that (or doesn't come from this
+        index), the answer has `resync` set and the caller should rebuild from its `snapshot`. Otherwise, the cost is
+        proportional to the number of changes, not to the size of the index. An entity that changes again while this
+        runs may show up once more in the next poll.
+
+        Args:
+            cursor (int): The cursor the previous call returned, or `change_cursor` at the start.
+
+        Returns:
+            Changes: The new cursor, the changed entities (None for removed ones), the resync flag and a snapshot.
+
+        Usage example:
+        >>> feed = client.entities.changes_since(cursor)
+        >>> if feed.resync:
+        ...     reload(feed.snapshot.all_entities)
+        ... else:
+        ...     apply(feed.changed)
+        >>> cursor = feed.cursor
+        """
+        entity_ids, head = self.__changes.since(cursor)
+        # Read after the log: the snapshot is at least as new as `head`.
+        index = self.__index
+
+        if entity_ids is None:
+            self.client.metrics.increment('hac_change_feed_resyncs_total')
+            return Changes(head, MappingProxyType({}), True, index)
+
+        return Changes(head, MappingProxyType({entity_id: index.get(entity_id) for entity_id in entity_ids}), False,
+                       index)
+
+    @property
+    def version(self) -> int:
+        """
+        Get the version of the current snapshot; it goes up with every refresh or applied batch.
+
+        Returns:
+            int: The version.
+        """
+        return self.__index.version
+
+    def get(self, entity_id: str) -> Optional[Entity]:
+        """
+        Look an entity up by its ID.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Entity: The entity, or None if it isn't in the index.
+        """
+        return self.__index.get(entity_id)
+
+    def read_many(self, entity_ids: Iterable[str], max_age: float = None, strategy: str = None) -> Dict[str, Entity]:
+        """
+        Read several entities at once, answering from the index whenever its data is fresh enough.
+
+        Entities missing from the index or older than `max_age` are refreshed first. A few of them are fetched with
+        parallel `GET /api/states/<entity_id>` calls; when there are many, a single full `/api/states` dump is cheaper
+        and is used instead.
+
+        Args:
+            entity_ids (Iterable[str]): The IDs of the entities to read.
+            max_age (float): The oldest data, in seconds, that may be returned without a refresh. None accepts
+                anything already in the index.
+            strategy (str): Force the refresh strategy: 'single' or 'full'. Chosen automatically by default.
+
+        Returns:
+            Dict[str, Entity]: The entities keyed by ID. Entities that don't exist in Home Assistant map to None.
         """
-        for entity in entity_data:
-            entity_id = entity['entity_id']
-            category_name, name = entity_id.split('.', 1)
-            entity_obj = Entity(entity, self.client)
+        if strategy not in self.REFRESH_STRATEGIES:
+            raise ValueError(f'Invalid strategy: {strategy}. Must be one of {self.REFRESH_STRATEGIES}')
+
+        metrics = self.client.metrics
+        now = time.monotonic()
+        entities = {}
+        stale = []
+
+        index = self.__index
+
+        for entity_id in dict.fromkeys(entity_ids):
+            entity = index.get(entity_id)
+
+            if entity is not None and (max_age is None or now - entity.fetched_at <= max_age):
+                entities[entity_id] = entity
+            else:
+                stale.append(entity_id)
+
+        metrics.increment('hac_read_many_hits_total', len(entities))
+        metrics.increment('hac_read_many_misses_total', len(stale))
+
+        if stale:
+            strategy = strategy or self._refresh_strategy(len(stale))
+            metrics.increment('hac_read_many_refresh_total', strategy=strategy)
 
-            self.__all_entities[category_name].append(entity_obj)
+            with metrics.timer('hac_read_many_refresh_seconds', strategy=strategy):
+                if strategy == 'single':
+                    self._fetch_states(stale)
+                else:
+                    self.refresh()
 
-            # Check if category already exists, if not create it
-            if category_name not in self.__categories:
-                category_obj = Category(self.__client, category_name)
-                self.__categories[category_name] = {
-                        'object':         category_obj,
-                        'member_names':   [],
-                        'member_objects': {}
-                        }
+            for entity_id in stale:
+                entities[entity_id] = self.get(entity_id)
 
-            # Update the category data
-            self.__categories[category_name]['member_names'].append(name)
-            self.__categories[category_name]['member_objects'][name] = entity_obj
+        return entities
+
+    def _refresh_strategy(self, stale_count: int) -> str:
+        if stale_count <= self.SINGLE_FETCH_LIMIT and stale_count < self.SINGLE_FETCH_RATIO * len(self.__index):
+            return 'single'
+
+        return 'full'
+
+    def fetch_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch an entity's current state from Home Assistant with `GET /api/states/<entity_id>`. The index isn't updated;
+        see `read_many()` for that.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            dict: The state object, or None if the entity doesn't exist.
+        """
+        client = self.client
+
+        try:
+            return make_request(
+                    f'{client.url}{EntityJSON.STATES_ENDPOINT}/{entity_id}',
+                    client.token,
+                    policy=client.policy,
+                    metrics=client.metrics
+                    ).json()
+        except APIError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def _fetch_states(self, entity_ids: List[str]):
+        if len(entity_ids) == 1:
+            states = [self.fetch_state(entity_ids[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.SINGLE_FETCH_WORKERS, len(entity_ids))) as pool:
+                states = list(pool.map(self.fetch_state, entity_ids))
+
+        # A 404 means the entity is gone, which removes it from the index as well.
+        self.apply_state_changes({'entity_id': entity_id, 'new_state': state}
+                                 for entity_id, state in zip(entity_ids, states))
 
     @property
     def client(self):
         return self.__client
 
     @property
-    def categories(self) -> Dict:
+    def categories(self) -> Mapping[str, Mapping]:
+        """
+        Returns the read-only mapping of categories from the current snapshot.
+
+        Returns:
+            Mapping: The mapping of categories.
+        """
+        return self.__index.categories
+
+    @property
+    def category_names(self):
         """
-        Returns the dictionary of categories.
+        Returns the names of the categories in the current snapshot.
 
         Returns:
-            dict: The dictionary of categories.
+            KeysView: The category names.
         """
-        return self.__categories
+        return self.__index.categories.keys()
 
     @property
-    def all_entities(self) -> Dict[str, List[Entity]]:
+    def all_entities(self) -> Mapping[str, Tuple[Entity, ...]]:
         """
-        Returns all categorized entities.
+        Returns all categorized entities from the current snapshot.
 
         Returns:
-            Dict[str, List[Entity]]: The categorized entities.
+            Mapping[str, Tuple[Entity, ...]]: The categorized entities.
         """
-        return self.__all_entities
+        return self.__index.all_entities
 
     @property
     def entity_json(self):
@@ -194,38 +521,78 @@ class Entities(Subscriber, ABC):
 
     def get_all_in_category(self, category):
         category = category.lower()
-        return self.__categories[category]['member_objects']
+        return self.__index.categories[category]['member_objects']
 
 
 class EntityJSON(Publisher):
     BASE_ENDPOINT = '/api/'
     STATES_ENDPOINT = '/api/states'
 
-    def __init__(self, url: str, token: str, cache_timeout: int = 300):
+    def __init__(self, url: str, token: str, cache_timeout: int = 300, policy=None, metrics: Metrics = None):
         super().__init__()
         self.__url = url
         self.__token = token
+        self.__policy = policy
+        self.__metrics = metrics or Metrics()
         self.__cache = TTLCache(maxsize=1, ttl=cache_timeout)
         self.__cache_age = None
+        self.__fetched_at = None
         self.__cache_refresh_count = 0
 
     def __repr__(self):
         return f'<EntityJSON url={self.__url} cache_age={self.cache_age} cache_refresh_count={self.__cache_refresh_count}>'
 
-    @cached(cache=TTLCache(maxsize=1, ttl=300))
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
+    def set_credentials(self, url: str, token: str):
+        """
+        Fetch from a different instance and/or with a different token from now on.
+
+        Args:
+            url (str): The URL of the Home Assistant instance.
+            token (str): A long-lived access token.
+        """
+        if url != self.__url:
+            # Another instance's states.
+            self.__cache.clear()
+
+        self.__url = url
+        self.__token = token
+
     def gather(self) -> List[Dict[str, Any]]:
         """
         Gather and cache the entities data from the Home Assistant instance.
 
         Returns:
             List[Dict[str, Any]]: The entities data.
+
+        Raises:
+            APIError: If the data could not be retrieved.
         """
         try:
-            # Assuming make_request is defined elsewhere or is imported
-            res = make_request(f'{self.__url}{self.STATES_ENDPOINT}', self.__token)
-            return res.json()
-        except RequestException as e:
-            raise ConnectionError(f'Failed to retrieve data: {e}') from e
+            data = self.__cache[self.STATES_ENDPOINT]
+        except KeyError:
+            self.__metrics.increment('hac_state_cache_misses_total')
+        else:
+            self.__metrics.increment('hac_state_cache_hits_total')
+            return data
+
+        res = make_request(
+                f'{self.__url}{self.STATES_ENDPOINT}',
+                self.__token,
+                policy=self.__policy,
+                metrics=self.__metrics
+                )
+        data = res.json()
+
+        self.__cache[self.STATES_ENDPOINT] = data
+        self.__cache_age = datetime.now(timezone.utc)
+        self.__fetched_at = time.monotonic()
+        self.__cache_refresh_count += 1
+
+        return data
 
     def refresh_cache(self):
         """
@@ -235,6 +602,16 @@ class EntityJSON(Publisher):
         self.gather()  # This will update the cache
         self._notify()  # Notify subscribers.
 
+    @property
+    def fetched_at(self) -> float:
+        """
+        Get when the cached data was fetched, on the `time.monotonic()` clock.
+
+        Returns:
+            float: The fetch time, or None if nothing was fetched yet.
+        """
+        return self.__fetched_at
+
     @property
     def cache_age(self) -> timedelta:
         """
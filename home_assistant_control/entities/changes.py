@@ -0,0 +1,116 @@
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+
+class Changes(NamedTuple):
+    """
+    The answer to `Entities.changes_since()`.
+
+    Attributes:
+        cursor (int): Pass this to the next `changes_since()` call.
+        changed (Mapping): The entities that changed, keyed by entity ID; None for an entity that was removed. Empty
+            when `resync` is set.
+        resync (bool): The cursor fell out of the change log; rebuild from `snapshot` instead.
+        snapshot (EntityIndex): An index snapshot at least as new as `cursor`.
+    """
+    cursor: int
+    changed: Mapping[str, Optional[Any]]
+    resync: bool
+    snapshot: Any
+
+
+class ChangeLog:
+    """
+    A bounded log of which entities changed, numbered with monotonically increasing sequence numbers.
+
+    It only remembers the last `capacity` changes. Reading what changed since a cursor walks the log backwards from its
+    head, so it costs O(changes since the cursor), however large the index is; a cursor older than what the log still
+    holds has to be answered with a full resync.
+
+    Usage example:
+    >>> log = ChangeLog(capacity=3)
+    >>> log.extend(['light.a', 'light.b'])
+    2
+    >>> log.since(1)
+    (['light.b'], 2)
+    """
+
+    def __init__(self, capacity: int = 10000):
+        """
+        Initializes a new instance of the ChangeLog class.
+
+        Args:
+            capacity (int): The number of changes to keep.
+        """
+        if capacity < 1:
+            raise ValueError('"capacity" must be at least 1!')
+
+        self.__entries = deque(maxlen=capacity)
+        self.__head = 0
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<ChangeLog head={self.__head} oldest={self.oldest} capacity={self.capacity}>'
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def capacity(self) -> int:
+        return self.__entries.maxlen
+
+    @property
+    def head(self) -> int:
+        """
+        The sequence number of the latest change; 0 before the first one.
+        """
+        return self.__head
+
+    @property
+    def oldest(self) -> int:
+        """
+        The oldest cursor the log can still answer; anything older needs a resync.
+        """
+        return self.__head - len(self.__entries)
+
+    def extend(self, entity_ids: Iterable[str]) -> int:
+        """
+        Log a change to each of the given entities.
+
+        Args:
+            entity_ids (Iterable[str]): The entities that changed.
+
+        Returns:
+            int: The new head.
+        """
+        entity_ids = list(entity_ids)
+
+        with self.__lock:
+            # A full deque drops its oldest entries to make room.
+            self.__entries.extend(entity_ids)
+            self.__head += len(entity_ids)
+            return self.__head
+
+    def since(self, cursor: int) -> Tuple[Optional[List[str]], int]:
+        """
+        Get the entities that changed after a cursor.
+
+        Args:
+            cursor (int): The head a previous call returned.
+
+        Returns:
+            tuple: The IDs of the changed entities, oldest first and possibly repeated, or None if the cursor is out of
+                range; and the current head.
+        """
+        with self.__lock:
+            head = self.__head
+
+            if cursor > head or cursor < head - len(self.__entries):
+                return None, head
+
+            entity_ids = list(islice(reversed(self.__entries), head - cursor))
+
+        entity_ids.reverse()
+        return entity_ids, head
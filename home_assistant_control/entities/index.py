@@ -0,0 +1,175 @@
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+_EMPTY = MappingProxyType({})
+
+
+def _freeze_category(category_obj, member_objects: Dict[str, Any]) -> Mapping:
+    return MappingProxyType({
+            'object':         category_obj,
+            'member_names':   tuple(member_objects),
+            'member_objects': MappingProxyType(member_objects),
+            })
+
+
+class EntityIndex:
+    """
+    An immutable snapshot of the entity index.
+
+    `Entities` publishes a new snapshot for every refresh or batch of changes, swapping it in with a single reference
+    assignment. A reader that holds on to a snapshot therefore always sees one complete, consistent version of the
+    index, no matter what writers do in the meantime, and never has to take a lock.
+
+    Every mapping exposed here is read-only; the category member lists are tuples.
+
+    Usage example:
+    >>> index = client.entities.snapshot()
+    >>> index.get('light.kitchen')
+    """
+    __slots__ = ('__version', '__categories', '__all_entities', '__size')
+
+    def __init__(self, categories: Mapping[str, Mapping], version: int = 0,
+                 all_entities: Dict[str, Tuple[Any, ...]] = None, size: int = None):
+        """
+        Initializes a new instance of the EntityIndex class. Use `build()` or `with_changes()` rather than calling this
+        directly.
+
+        Args:
+            categories (Mapping): The frozen category entries, keyed by category name.
+            version (int): The snapshot's version number.
+            all_entities (dict): The member tuples of the categories, if already known; built from `categories`
+                otherwise.
+            size (int): The number of entities, if already known.
+        """
+        if all_entities is None:
+            all_entities = {name: tuple(entry['member_objects'].values()) for name, entry in categories.items()}
+
+        self.__version = version
+        self.__categories = MappingProxyType(dict(categories))
+        self.__all_entities = MappingProxyType(all_entities)
+        self.__size = size if size is not None else sum(len(members) for members in all_entities.values())
+
+    def __repr__(self):
+        return f'<EntityIndex version={self.__version} entities={self.__size} categories={len(self.__categories)}>'
+
+    def __len__(self):
+        return self.__size
+
+    def __contains__(self, entity_id: str) -> bool:
+        return self.get(entity_id) is not None
+
+    @classmethod
+    def empty(cls) -> 'EntityIndex':
+        return cls(_EMPTY)
+
+    @classmethod
+    def build(cls, entities: Iterable[Any], category_factory: Callable[[str], Any], version: int,
+              previous: 'EntityIndex' = None) -> 'EntityIndex':
+        """
+        Build a snapshot from scratch.
+
+        Args:
+            entities (Iterable[Entity]): Every entity of the new snapshot.
+            category_factory (Callable): Creates the Category object for a category name.
+            version (int): The new snapshot's version number.
+            previous (EntityIndex): The snapshot being replaced; its Category objects are reused.
+
+        Returns:
+            EntityIndex: The new snapshot.
+        """
+        members: Dict[str, Dict[str, Any]] = {}
+
+        for entity in entities:
+            members.setdefault(entity.category, {})[entity.name] = entity
+
+        return cls({name: _freeze_category(cls._category_object(name, category_factory, previous), objects)
+                    for name, objects in members.items()}, version)
+
+    def with_changes(self, puts: Dict[str, Any], removals: Iterable[str], category_factory: Callable[[str], Any],
+                     version: int) -> 'EntityIndex':
+        """
+        Derive a new snapshot with some entities added, replaced or removed.
+
+        Only the categories that are touched get copied; the entries and member tuples of all others are shared with
+        this snapshot, so the cost depends on the size of the touched categories, not of the whole index.
+
+        Args:
+            puts (Dict[str, Entity]): The entities to add or replace, keyed by ID.
+            removals (Iterable[str]): The IDs of the entities to remove.
+            category_factory (Callable): Creates the Category object for a new category.
+            version (int): The new snapshot's version number.
+
+        Returns:
+            EntityIndex: The new snapshot.
+        """
+        touched: Dict[str, Dict[str, Any]] = {}
+
+        def members_of(category_name):
+            if category_name not in touched:
+                entry = self.__categories.get(category_name)
+                touched[category_name] = dict(entry['member_objects']) if entry else {}
+            return touched[category_name]
+
+        for entity_id in removals:
+            category_name, _, name = entity_id.partition('.')
+            if category_name in self.__categories or category_name in touched:
+                members_of(category_name).pop(name, None)
+
+        for entity in puts.values():
+            members_of(entity.category)[entity.name] = entity
+
+        categories = dict(self.__categories)
+        all_entities = dict(self.__all_entities)
+        size = self.__size
+
+        for category_name, objects in touched.items():
+            size -= len(all_entities.get(category_name, ()))
+
+            if objects:
+                category_obj = self._category_object(category_name, category_factory, self)
+                categories[category_name] = _freeze_category(category_obj, objects)
+                all_entities[category_name] = tuple(objects.values())
+                size += len(objects)
+            else:
+                categories.pop(category_name, None)
+                all_entities.pop(category_name, None)
+
+        return EntityIndex(categories, version, all_entities, size)
+
+    @staticmethod
+    def _category_object(name: str, category_factory: Callable[[str], Any], previous: Optional['EntityIndex']):
+        entry = previous.categories.get(name) if previous is not None else None
+        return entry['object'] if entry is not None else category_factory(name)
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def categories(self) -> Mapping[str, Mapping]:
+        """
+        Get the read-only category entries, each holding 'object', 'member_names' and 'member_objects'.
+        """
+        return self.__categories
+
+    @property
+    def all_entities(self) -> Mapping[str, Tuple[Any, ...]]:
+        """
+        Get the entities of every category, keyed by category name.
+        """
+        return self.__all_entities
+
+    def get(self, entity_id: str):
+        """
+        Look an entity up by its ID.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            Entity: The entity, or None if it isn't in this snapshot.
+        """
+        category_name, _, name = entity_id.partition('.')
+        entry = self.__categories.get(category_name)
+
+        return entry['member_objects'].get(name) if entry is not None else None
@@ -0,0 +1,285 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+# The state a successful call of each service leaves an entity in. `toggle` flips between 'on' and 'off'.
+SERVICE_STATES = {
+        'turn_on':     'on',
+        'turn_off':    'off',
+        'open_cover':  'open',
+        'close_cover': 'closed',
+        'lock':        'locked',
+        'unlock':      'unlocked',
+        'media_play':  'playing',
+        'media_pause': 'paused',
+        'media_stop':  'idle',
+        }
+
+
+class _Pending:
+    __slots__ = ('before', 'optimistic', 'expected', 'deadline')
+
+    def __init__(self, before, optimistic, expected: str, deadline: float):
+        self.before = before
+        self.optimistic = optimistic
+        self.expected = expected
+        self.deadline = deadline
+
+
+class OptimisticUpdates:
+    """
+    Puts the state a service call is expected to lead to in the entity index as soon as the call succeeds, so reads
+    right after a command see its result without another round trip.
+
+    The optimistic Entity is marked `pending`. It is settled in one of three ways:
+
+    - confirmed at once, when Home Assistant lists the entity among the states the call changed;
+    - confirmed (or superseded, if the state differs) when a `state_changed` event for the entity is applied by an
+      EventIngestor this is attached to;
+    - re-read from Home Assistant when neither happens within `timeout` seconds: the state it reports replaces the
+      optimistic one (a slow device may have got there after all). Only if that request fails is the state from before
+      the call put back.
+
+    Nothing that arrived from Home Assistant in the meantime is ever overwritten: the optimistic state is only put in,
+    and only rolled back, while the index still holds the Entity it replaced (see `Entities.compare_and_set()`).
+
+    Usage example:
+    >>> client = Client(url, token, optimistic=True)
+    >>> client.optimistic.attach(ingestor)
+    >>> LightController(client.entities.get('light.kitchen')).turn_on()
+    >>> client.entities.get('light.kitchen').pending
+    True
+    """
+
+    def __init__(self, entities, timeout: float = 5.0):
+        """
+        Initializes a new instance of the OptimisticUpdates class.
+
+        Args:
+            entities (Entities): The index to update.
+            timeout (float): Seconds to wait for confirmation before rolling an optimistic state back.
+        """
+        if timeout <= 0:
+            raise ValueError('"timeout" must be positive!')
+
+        self.__entities = entities
+        self.__timeout = timeout
+        self.__pending: Dict[str, _Pending] = {}
+        # With one timeout for everything, deadlines come in the order they were set: a FIFO is enough.
+        self.__deadlines = deque()
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__closed = False
+        self.__ingestors = 0
+
+    def __repr__(self):
+        return f'<OptimisticUpdates pending={len(self.__pending)} timeout={self.__timeout}>'
+
+    def __len__(self):
+        return len(self.__pending)
+
+    @property
+    def metrics(self):
+        return self.__entities.client.metrics
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def attached(self) -> bool:
+        """
+        Whether an ingestor keeps the index live, so that settled entries can be read from it too.
+        """
+        return self.__ingestors > 0
+
+    def is_pending(self, entity_id: str) -> bool:
+        return entity_id in self.__pending
+
+    @staticmethod
+    def expected_state(entity, service: str, data: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Work out the state an entity will be in after a successful service call.
+
+        Args:
+            entity (Entity): The entity as it is now.
+            service (str): The service called.
+            data (dict): The service data. With 'turn_on', fields the entity already has as attributes (brightness,
+                colors, ...) are taken over.
+
+        Returns:
+            dict: The expected state object, or None if the service's outcome can't be predicted.
+        """
+        current = entity.entity_data
+
+        if service == 'toggle':
+            if current.get('state') not in ('on', 'off'):
+                return None
+            state = 'off' if current['state'] == 'on' else 'on'
+        else:
+            state = SERVICE_STATES.get(service)
+            if state is None:
+                return None
+
+        attributes = current.get('attributes') or {}
+
+        if service == 'turn_on' and data:
+            changed = {key: value for key, value in data.items() if key != 'entity_id' and key in attributes}
+            if changed:
+                attributes = {**attributes, **changed}
+
+        return {**current, 'state': state, 'attributes': attributes}
+
+    def service_called(self, entity, service: str, data: Dict[str, Any] = None,
+                       changed_states: Iterable[Dict[str, Any]] = None):
+        """
+        Record that a service call for an entity succeeded.
+
+        Args:
+            entity (Entity): The entity as read from the index before the call was made.
+            service (str): The service called.
+            data (dict): The service data.
+            changed_states (Iterable[dict]): The states Home Assistant reported as changed by the call, if any.
+        """
+        entities = self.__entities
+        entity_id = entity.entity_id
+
+        for state in changed_states or ():
+            if state.get('entity_id') == entity_id:
+                # Home Assistant already told us; no guessing needed.
+                settled = self._settle(entity_id)
+                entities.compare_and_set(entity_id, settled.optimistic if settled is not None else entity, state)
+                self.metrics.increment('hac_optimistic_confirmed_total', source='response')
+                return
+
+        new_state = self.expected_state(entity, service, data)
+        if new_state is None:
+            return
+
+        # Whatever this call's predecessor predicted is replaced, but the state to roll back to stays the real one.
+        previous = self.__pending.get(entity_id)
+        before = previous.before if previous is not None else entity
+        current = previous.optimistic if previous is not None else entity
+
+        optimistic = entities.compare_and_set(entity_id, current, new_state, pending=True)
+        if optimistic is current:
+            # Something newer than what the call was based on is in the index already.
+            return
+
+        deadline = time.monotonic() + self.__timeout
+
+        with self.__condition:
+            self.__pending[entity_id] = _Pending(before, optimistic, new_state['state'], deadline)
+            self.__deadlines.append((deadline, entity_id))
+            self._ensure_thread()
+            self.__condition.notify()
+
+        self.metrics.increment('hac_optimistic_applied_total')
+        self.metrics.set_gauge('hac_optimistic_pending', len(self.__pending))
+
+    def _settle(self, entity_id: str) -> Optional[_Pending]:
+        with self.__condition:
+            pending = self.__pending.pop(entity_id, None)
+
+        if pending is not None:
+            self.metrics.set_gauge('hac_optimistic_pending', len(self.__pending))
+
+        return pending
+
+    def process(self, changes: List[Dict[str, Any]]):
+        """
+        Settle pending entities from a batch of applied `state_changed` event data. Suitable as a batch listener.
+
+        Args:
+            changes (list): The event data.
+        """
+        if not self.__pending:
+            return
+
+        for change in changes:
+            entity_id = change.get('entity_id')
+            if entity_id not in self.__pending:
+                continue
+
+            pending = self._settle(entity_id)
+            if pending is None:
+                continue
+
+            # The event itself has already been applied; only count how the prediction fared.
+            new_state = change.get('new_state') or {}
+            outcome = 'confirmed' if new_state.get('state') == pending.expected else 'superseded'
+            self.metrics.increment(f'hac_optimistic_{outcome}_total', source='event')
+
+    def attach(self, ingestor):
+        """
+        Confirm optimistic states from the state changes an EventIngestor (or TrafficReplayer) applies.
+
+        Args:
+            ingestor (EventIngestor): The ingestor feeding the same entity index.
+        """
+        ingestor.add_batch_listener(self.process)
+        self.__ingestors += 1
+
+    def detach(self, ingestor):
+        ingestor.remove_batch_listener(self.process)
+        self.__ingestors -= 1
+
+    def _ensure_thread(self):
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__thread = threading.Thread(target=self._run, name='optimistic-updates', daemon=True)
+            self.__thread.start()
+
+    def _run(self):
+        while True:
+            with self.__condition:
+                while not self.__closed and not self.__deadlines:
+                    self.__condition.wait()
+
+                if self.__closed:
+                    return
+
+                deadline, entity_id = self.__deadlines[0]
+                wait = deadline - time.monotonic()
+
+                if wait > 0:
+                    self.__condition.wait(wait)
+                    continue
+
+                self.__deadlines.popleft()
+                pending = self.__pending.get(entity_id)
+
+                # A later call for the same entity set a later deadline; this one is stale.
+                if pending is None or pending.deadline != deadline:
+                    continue
+
+                del self.__pending[entity_id]
+
+            self._roll_back(entity_id, pending)
+
+    def _roll_back(self, entity_id: str, pending: _Pending):
+        try:
+            # No confirmation doesn't mean the call had no effect; ask where the entity really is.
+            state = self.__entities.fetch_state(entity_id)
+        except Exception:
+            # Home Assistant is unreachable: the state before the call is the best guess left.
+            state = pending.before.entity_data if pending.before is not None else None
+
+        restored = self.__entities.compare_and_set(entity_id, pending.optimistic, state)
+
+        # If the optimistic Entity is gone, something newer replaced it and there is nothing to undo.
+        if restored is not pending.optimistic:
+            if state is not None and state.get('state') == pending.expected:
+                self.metrics.increment('hac_optimistic_confirmed_total', source='refetch')
+            else:
+                self.metrics.increment('hac_optimistic_rolled_back_total')
+
+        self.metrics.set_gauge('hac_optimistic_pending', len(self.__pending))
+
+    def close(self):
+        """
+        Stop the timeout thread. Pending states stay as they are.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
@@ -0,0 +1,282 @@
+import asyncio
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+AREAS = 'areas'
+DEVICES = 'devices'
+ENTITIES = 'entities'
+
+_EMPTY = MappingProxyType({})
+
+
+class Registry:
+    """
+    Home Assistant's area, device and entity registries, loaded over the WebSocket API and kept up to date.
+
+    The registries are fetched once with `config/area_registry/list`, `config/device_registry/list` and
+    `config/entity_registry/list`. Afterwards, each `*_registry_updated` event re-fetches only the registry it concerns.
+    From them the registry builds inverted indexes: area to entities (split by domain), device to entities and label to
+    entities. An entity's area is its own, or its device's if it has none, just like Home Assistant resolves it. Lookups
+    cost O(result), so targeting "every light in the kitchen" doesn't scan anything.
+
+    Like the entity index, the indexes are replaced whole on every update, so readers always see a consistent version.
+
+    Usually a client owns one; see `Client.load_registry()`.
+
+    Usage example:
+    >>> registry = await client.load_registry(ws_client)
+    >>> registry.entities_in_area('Kitchen', domain='light')
+    ('light.kitchen_ceiling', 'light.kitchen_counter')
+    """
+    COMMANDS = {
+            AREAS:    'config/area_registry/list',
+            DEVICES:  'config/device_registry/list',
+            ENTITIES: 'config/entity_registry/list',
+            }
+    UPDATE_EVENTS = {
+            'area_registry_updated':   AREAS,
+            'device_registry_updated': DEVICES,
+            'entity_registry_updated': ENTITIES,
+            }
+    ID_KEYS = {
+            AREAS:    'area_id',
+            DEVICES:  'id',
+            ENTITIES: 'entity_id',
+            }
+
+    def __init__(self, ws_client):
+        """
+        Initializes a new instance of the Registry class.
+
+        Args:
+            ws_client (WebSocketClient): A connected and authenticated WebSocket client.
+        """
+        self.__ws_client = ws_client
+        self.__entries: Dict[str, Mapping[str, Dict[str, Any]]] = {kind: _EMPTY for kind in self.COMMANDS}
+        self.__index = self._build_index(self.__entries)
+        self.__subscription_ids: List[int] = []
+        self.__reloading: Dict[str, asyncio.Task] = {}
+        self.__stale = set()
+        self.__version = 0
+
+    def __repr__(self):
+        return (f'<Registry areas={len(self.areas)} devices={len(self.devices)} entities={len(self.entries)} '
+                f'version={self.__version}>')
+
+    @property
+    def metrics(self):
+        return self.__ws_client.metrics
+
+    @property
+    def version(self) -> int:
+        """
+        Get how many times the registries were (re)loaded.
+        """
+        return self.__version
+
+    @property
+    def areas(self) -> Mapping[str, Dict[str, Any]]:
+        """
+        Get the area registry, keyed by area ID.
+        """
+        return self.__entries[AREAS]
+
+    @property
+    def devices(self) -> Mapping[str, Dict[str, Any]]:
+        """
+        Get the device registry, keyed by device ID.
+        """
+        return self.__entries[DEVICES]
+
+    @property
+    def entries(self) -> Mapping[str, Dict[str, Any]]:
+        """
+        Get the entity registry, keyed by entity ID.
+        """
+        return self.__entries[ENTITIES]
+
+    async def load(self, kinds: Iterable[str] = None):
+        """
+        Fetch registries and rebuild the indexes.
+
+        Args:
+            kinds (Iterable[str]): Which registries to fetch: any of 'areas', 'devices' and 'entities'. All by default.
+        """
+        kinds = list(kinds or self.COMMANDS)
+
+        with self.metrics.timer('hac_registry_load_seconds'):
+            results = await asyncio.gather(*(self.__ws_client.call(self.COMMANDS[kind]) for kind in kinds))
+
+            entries = dict(self.__entries)
+            for kind, items in zip(kinds, results):
+                key = self.ID_KEYS[kind]
+                entries[kind] = MappingProxyType({item[key]: item for item in items})
+
+            index = self._build_index(entries)
+
+        # Swap both in together; nothing awaits in between.
+        self.__entries, self.__index = entries, index
+        self.__version += 1
+
+        for kind in kinds:
+            self.metrics.increment('hac_registry_loads_total', registry=kind)
+            self.metrics.set_gauge('hac_registry_entries', len(entries[kind]), registry=kind)
+
+    async def start(self):
+        """
+        Load the registries and follow their update events.
+        """
+        for event_type in self.UPDATE_EVENTS:
+            self.__subscription_ids.append(await self.__ws_client.subscribe_events(self._on_update, event_type))
+
+        await self.load()
+
+    async def stop(self):
+        """
+        Stop following update events.
+        """
+        for subscription_id in self.__subscription_ids:
+            await self.__ws_client.unsubscribe(subscription_id)
+
+        self.__subscription_ids.clear()
+
+        tasks = list(self.__reloading.values())
+        for task in tasks:
+            task.cancel()
+
+        # Let the cancellations finish, so no task is destroyed while still pending.
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _on_update(self, event: Dict[str, Any]):
+        kind = self.UPDATE_EVENTS.get(event.get('event_type'))
+        if kind is None:
+            return
+
+        # Runs on the socket reader, which must not wait for a command result itself; reload from a task instead.
+        # Updates arriving while a reload is in flight are coalesced into one more reload.
+        if kind in self.__reloading:
+            self.__stale.add(kind)
+            return
+
+        self.__reloading[kind] = asyncio.get_running_loop().create_task(self._reload(kind))
+
+    async def _reload(self, kind: str):
+        try:
+            while True:
+                self.__stale.discard(kind)
+                await self.load([kind])
+
+                if kind not in self.__stale:
+                    break
+        finally:
+            self.__reloading.pop(kind, None)
+
+    @staticmethod
+    def _build_index(entries: Dict[str, Mapping[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        devices = entries[DEVICES]
+        by_area: Dict[str, Dict[str, List[str]]] = {}
+        by_device: Dict[str, List[str]] = {}
+        by_label: Dict[str, List[str]] = {}
+        area_of: Dict[str, str] = {}
+
+        for entity_id, entry in entries[ENTITIES].items():
+            device_id = entry.get('device_id')
+            area_id = entry.get('area_id')
+
+            if device_id is not None:
+                by_device.setdefault(device_id, []).append(entity_id)
+
+                if area_id is None and device_id in devices:
+                    area_id = devices[device_id].get('area_id')
+
+            if area_id is not None:
+                area_of[entity_id] = area_id
+                by_area.setdefault(area_id, {}).setdefault(entity_id.split('.', 1)[0], []).append(entity_id)
+
+            for label in entry.get('labels') or ():
+                by_label.setdefault(label, []).append(entity_id)
+
+        area_names = {}
+        for area_id, area in entries[AREAS].items():
+            for name in (area.get('name'), *(area.get('aliases') or ())):
+                if name:
+                    area_names[name.casefold()] = area_id
+
+        return {
+                'by_area':    {area_id: {domain: tuple(ids) for domain, ids in domains.items()}
+                               for area_id, domains in by_area.items()},
+                'by_device':  {device_id: tuple(ids) for device_id, ids in by_device.items()},
+                'by_label':   {label: tuple(ids) for label, ids in by_label.items()},
+                'area_of':    area_of,
+                'area_names': area_names,
+                }
+
+    def resolve_area(self, area: str) -> Optional[str]:
+        """
+        Find an area's ID by its ID, name or one of its aliases (case-insensitively).
+
+        Args:
+            area (str): The area ID, name or alias.
+
+        Returns:
+            str: The area ID, or None if there is no such area.
+        """
+        if area in self.__entries[AREAS]:
+            return area
+
+        return self.__index['area_names'].get(area.casefold())
+
+    def area_of(self, entity_id: str) -> Optional[str]:
+        """
+        Get the ID of the area an entity is in, directly or through its device.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            str: The area ID, or None if the entity isn't in an area.
+        """
+        return self.__index['area_of'].get(entity_id)
+
+    def entities_in_area(self, area: str, domain: str = None) -> Tuple[str, ...]:
+        """
+        Get the entities in an area.
+
+        Args:
+            area (str): The area ID, name or alias.
+            domain (str): Only return entities of this domain, e.g. 'light'.
+
+        Returns:
+            Tuple[str, ...]: The entity IDs.
+        """
+        area_id = self.resolve_area(area)
+        domains = self.__index['by_area'].get(area_id, {})
+
+        if domain is not None:
+            return domains.get(domain, ())
+
+        return tuple(entity_id for entity_ids in domains.values() for entity_id in entity_ids)
+
+    def entities_of_device(self, device_id: str) -> Tuple[str, ...]:
+        """
+        Get the entities belonging to a device.
+
+        Args:
+            device_id (str): The ID of the device.
+
+        Returns:
+            Tuple[str, ...]: The entity IDs.
+        """
+        return self.__index['by_device'].get(device_id, ())
+
+    def entities_with_label(self, label: str) -> Tuple[str, ...]:
+        """
+        Get the entities carrying a label.
+
+        Args:
+            label (str): The label ID.
+
+        Returns:
+            Tuple[str, ...]: The entity IDs.
+        """
+        return self.__index['by_label'].get(label, ())
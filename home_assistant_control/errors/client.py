@@ -4,6 +4,7 @@ class APIError(Exception):
 
     Attributes:
         message (str): A descriptive error message.
+        status_code (int): The HTTP status code of the failed response, if there was one.
 
     Usage example:
         >>> raise APIError("An unknown API error occurred.")
@@ -12,8 +13,9 @@ class APIError(Exception):
         APIError: An unknown API error occurred.
     """
 
-    def __init__(self, message: str):
+    def __init__(self, message: str, status_code: int = None):
         super().__init__(message)
+        self.status_code = status_code
 
 
 class AuthenticationError(APIError):
@@ -46,3 +48,29 @@ class InvalidTokenError(AuthenticationError):
     def __init__(self, message: str, token: str):
         super().__init__(message)
         self.token = token
+
+
+class RequestTimeoutError(APIError):
+    """
+    An error raised when Home Assistant does not answer within the configured timeouts.
+
+    Usage example:
+        >>> raise RequestTimeoutError("GET http://homeassistant.local:8123/api/states timed out.")
+        Traceback (most recent call last):
+        ...
+        RequestTimeoutError: GET http://homeassistant.local:8123/api/states timed out.
+    """
+    pass
+
+
+class CircuitOpenError(APIError):
+    """
+    An error raised when a request is refused because the circuit breaker is open.
+
+    Usage example:
+        >>> raise CircuitOpenError("Circuit breaker is open.")
+        Traceback (most recent call last):
+        ...
+        CircuitOpenError: Circuit breaker is open.
+    """
+    pass
@@ -0,0 +1,535 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Evaluating a rule takes microseconds; the default request buckets would put every sample in the first one.
+EVALUATION_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 0.01)
+
+
+def _value(state: Optional[Dict[str, Any]], attribute: Optional[str]):
+    if state is None:
+        return None
+
+    if attribute is None:
+        return state.get('state')
+
+    return state.get('attributes', {}).get(attribute)
+
+
+def _as_tuple(value) -> Optional[tuple]:
+    if value is None:
+        return None
+
+    return tuple(value) if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+
+
+class Trigger:
+    """
+    Describes a state change that should start a rule.
+
+    `entity_id` is either an exact entity ID or an `fnmatch` pattern such as 'binary_sensor.*_motion'. Without an
+    `attribute` the trigger watches the entity's state, otherwise that one attribute. It fires whenever the watched value
+    actually changes and the change passes `from_`, `to` and `predicate`.
+
+    Usage example:
+    >>> Trigger('binary_sensor.*_motion', to='on')
+    >>> Trigger('sensor.hall_lux', predicate=lambda old, new: float(new) < 20)
+    """
+
+    def __init__(self, entity_id: str, attribute: str = None, to=None, from_=None,
+                 predicate: Callable[[Any, Any], bool] = None):
+        """
+        Initializes a new instance of the Trigger class.
+
+        Args:
+            entity_id (str): The entity ID or pattern to watch.
+            attribute (str): The attribute to watch instead of the state.
+            to: The value, or values, the watched value must change to.
+            from_: The value, or values, the watched value must change from.
+            predicate (Callable): Called with the old and new value; the trigger only fires if it returns True.
+        """
+        self.__entity_id = entity_id
+        self.__attribute = attribute
+        self.__to = _as_tuple(to)
+        self.__from = _as_tuple(from_)
+        self.__predicate = predicate
+
+    def __repr__(self):
+        return f'<Trigger entity_id={self.__entity_id} attribute={self.__attribute} to={self.__to}>'
+
+    @property
+    def entity_id(self) -> str:
+        return self.__entity_id
+
+    @property
+    def attribute(self) -> Optional[str]:
+        return self.__attribute
+
+    @property
+    def is_pattern(self) -> bool:
+        return any(char in self.__entity_id for char in '*?[')
+
+    def covers(self, entity_id: str) -> bool:
+        """
+        Check whether this trigger watches an entity.
+
+        Args:
+            entity_id (str): The ID of the entity.
+
+        Returns:
+            bool: True if it does.
+        """
+        return fnmatchcase(entity_id, self.__entity_id) if self.is_pattern else entity_id == self.__entity_id
+
+    def matches(self, old_value, new_value) -> bool:
+        """
+        Check whether a change of the watched value fires this trigger.
+
+        Args:
+            old_value: The value before the change.
+            new_value: The value after the change.
+
+        Returns:
+            bool: True if the trigger fires.
+        """
+        if self.__to is not None and new_value not in self.__to:
+            return False
+
+        if self.__from is not None and old_value not in self.__from:
+            return False
+
+        if self.__predicate is not None:
+            try:
+                return bool(self.__predicate(old_value, new_value))
+            except (TypeError, ValueError):
+                # e.g. a numeric comparison against 'unavailable'.
+                return False
+
+        return True
+
+
+def state_is(entity_id: str, *values) -> Callable:
+    """
+    Build a condition that holds while an entity's state is one of `values`.
+
+    Args:
+        entity_id (str): The ID of the entity.
+        *values: The accepted states.
+
+    Returns:
+        Callable: The condition.
+    """
+    def condition(index) -> bool:
+        entity = index.get(entity_id)
+        return entity is not None and entity.entity_data.get('state') in values
+
+    return condition
+
+
+def numeric(entity_id: str, below: float = None, above: float = None, attribute: str = None) -> Callable:
+    """
+    Build a condition that holds while an entity's state, or one of its attributes, is a number within bounds.
+
+    Args:
+        entity_id (str): The ID of the entity.
+        below (float): The value must be less than this.
+        above (float): The value must be greater than this.
+        attribute (str): Check this attribute instead of the state.
+
+    Returns:
+        Callable: The condition.
+
+    Usage example:
+    >>> numeric('sensor.hall_lux', below=20)
+    """
+    def condition(index) -> bool:
+        entity = index.get(entity_id)
+
+        try:
+            value = float(_value(entity.entity_data, attribute)) if entity is not None else None
+        except (TypeError, ValueError):
+            return False
+
+        if value is None:
+            return False
+
+        return (below is None or value < below) and (above is None or value > above)
+
+    return condition
+
+
+def service_action(client, service: str, entity_ids: Iterable[str], **data) -> Callable:
+    """
+    Build a rule action that calls a service on some entities through their controllers in `client.controllers`.
+
+    Args:
+        client (Client): The client whose entities are controlled.
+        service (str): The service to call, e.g. 'turn_on'.
+        entity_ids (Iterable[str]): The entities to call it on.
+        **data: Extra service data, e.g. `brightness=128`.
+
+    Returns:
+        Callable: The action.
+
+    Usage example:
+    >>> service_action(client, 'turn_on', ['light.hall', 'light.stairs'], brightness=200)
+    """
+    entity_ids = list(entity_ids)
+    controllers = client.controllers
+
+    def action(change: Dict[str, Any]):
+        for entity_id in entity_ids:
+            try:
+                controller = controllers[entity_id]
+            except KeyError:
+                continue
+
+            payload = {**controller.base_payload, **data} if data else controller.base_payload
+            controller.send_payload(payload, service)
+
+    return action
+
+
+class Rule:
+    """
+    An automation: when any trigger fires and all conditions hold, run the action.
+
+    Conditions are callables that receive the entity index snapshot the change was applied to. The action receives the
+    `state_changed` data that fired the rule.
+
+    `debounce` delays the action until no trigger fired for that many seconds; `throttle` runs it at most once every so
+    many seconds, dropping the firings in between.
+
+    Usage example:
+    >>> Rule(
+    ...     'hall lights on motion',
+    ...     triggers=[Trigger('binary_sensor.*_motion', to='on')],
+    ...     conditions=[numeric('sensor.hall_lux', below=20)],
+    ...     action=service_action(client, 'turn_on', ['light.hall']),
+    ...     throttle=30
+    ...     )
+    """
+
+    def __init__(self, name: str, triggers: Iterable[Trigger], action: Callable[[Dict[str, Any]], Any],
+                 conditions: Iterable[Callable] = (), debounce: float = None, throttle: float = None):
+        """
+        Initializes a new instance of the Rule class.
+
+        Args:
+            name (str): A unique name for the rule.
+            triggers (Iterable[Trigger]): What starts the rule.
+            action (Callable): What the rule does.
+            conditions (Iterable[Callable]): What must hold for the action to run.
+            debounce (float): Seconds without a firing to wait before running the action.
+            throttle (float): The minimum number of seconds between two runs of the action.
+        """
+        self.__name = name
+        self.__triggers = tuple(triggers)
+        self.__action = action
+        self.__conditions = tuple(conditions)
+        self.__debounce = debounce
+        self.__throttle = throttle
+        self.last_fired = None
+        self.last_error = None
+
+        if not self.__triggers:
+            raise ValueError(f'Rule {name} needs at least one trigger!')
+
+    def __repr__(self):
+        return f'<Rule name={self.__name} triggers={len(self.__triggers)} conditions={len(self.__conditions)}>'
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def triggers(self) -> Tuple[Trigger, ...]:
+        return self.__triggers
+
+    @property
+    def action(self) -> Callable:
+        return self.__action
+
+    @property
+    def conditions(self) -> Tuple[Callable, ...]:
+        return self.__conditions
+
+    @property
+    def debounce(self) -> Optional[float]:
+        return self.__debounce
+
+    @property
+    def throttle(self) -> Optional[float]:
+        return self.__throttle
+
+    def check(self, index) -> bool:
+        """
+        Check the rule's conditions.
+
+        Args:
+            index (EntityIndex): The snapshot to check against.
+
+        Returns:
+            bool: True if every condition holds.
+        """
+        return all(condition(index) for condition in self.__conditions)
+
+
+class RuleEngine:
+    """
+    Evaluates rules against the stream of entity state changes.
+
+    Triggers are compiled into an index keyed by entity ID and watched attribute, so every change is only checked
+    against the rules it can affect; changes to entities no rule watches cost a single dictionary lookup. Pattern
+    triggers are resolved once per entity ID and cached.
+
+    Actions run on a small thread pool so a slow service call never holds up evaluation. Evaluation latency is recorded
+    per rule in the `hac_rule_evaluation_seconds` histogram of the client's metrics; see `latency_report()`.
+
+    Usage example:
+    >>> engine = RuleEngine(client)
+    >>> engine.add_rule(rule)
+    >>> engine.attach(ingestor)
+    """
+
+    def __init__(self, client, max_workers: int = 4):
+        """
+        Initializes a new instance of the RuleEngine class.
+
+        Args:
+            client (Client): The client whose entity index the conditions are evaluated against.
+            max_workers (int): The number of threads running actions.
+        """
+        self.__client = client
+        self.__rules: Dict[str, Rule] = {}
+        # entity_id -> watched attribute (None for the state) -> [(rule, trigger)]
+        self.__exact: Dict[str, Dict[Optional[str], List[Tuple[Rule, Trigger]]]] = {}
+        self.__patterns: List[Tuple[Rule, Trigger]] = []
+        self.__resolved: Dict[str, Dict[Optional[str], List[Tuple[Rule, Trigger]]]] = {}
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hac-rules')
+        self.__debounce_timers: Dict[str, threading.Timer] = {}
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<RuleEngine rules={len(self.__rules)} watched_entities={len(self.__exact)}>'
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def metrics(self):
+        return self.__client.metrics
+
+    @property
+    def rules(self) -> Dict[str, Rule]:
+        return dict(self.__rules)
+
+    def add_rule(self, rule: Rule):
+        """
+        Add a rule, replacing any rule of the same name.
+
+        Args:
+            rule (Rule): The rule to add.
+        """
+        with self.__lock:
+            self.__rules[rule.name] = rule
+            self._compile()
+
+    def remove_rule(self, name: str):
+        """
+        Remove a rule and cancel its pending debounced action, if any.
+
+        Args:
+            name (str): The name of the rule.
+        """
+        with self.__lock:
+            del self.__rules[name]
+            timer = self.__debounce_timers.pop(name, None)
+            self._compile()
+
+        if timer is not None:
+            timer.cancel()
+
+    def _compile(self):
+        exact, patterns = {}, []
+
+        for rule in self.__rules.values():
+            for trigger in rule.triggers:
+                if trigger.is_pattern:
+                    patterns.append((rule, trigger))
+                else:
+                    exact.setdefault(trigger.entity_id, {}).setdefault(trigger.attribute, []).append((rule, trigger))
+
+        # Swap the new tables in whole; `process` may be running on another thread.
+        self.__exact, self.__patterns, self.__resolved = exact, patterns, {}
+
+    def _resolve(self, entity_id: str, resolved: dict) -> Dict[Optional[str], List[Tuple[Rule, Trigger]]]:
+        watched = {attribute: list(entries) for attribute, entries in self.__exact.get(entity_id, {}).items()}
+
+        for rule, trigger in self.__patterns:
+            if trigger.covers(entity_id):
+                watched.setdefault(trigger.attribute, []).append((rule, trigger))
+
+        resolved[entity_id] = watched
+        return watched
+
+    def process(self, changes: Iterable[Dict[str, Any]]) -> int:
+        """
+        Evaluate a batch of `state_changed` event data. This is an `EventIngestor` batch listener, so the index already
+        holds the changes when it runs.
+
+        Args:
+            changes (Iterable[Dict[str, Any]]): Event data, each holding `entity_id`, `old_state` and `new_state`.
+
+        Returns:
+            int: The number of rules that fired.
+        """
+        resolved = self.__resolved
+        perf_counter = time.perf_counter
+        candidates: Dict[str, Tuple[Rule, Dict[str, Any], float]] = {}
+
+        for change in changes:
+            entity_id = change['entity_id']
+            watched = resolved.get(entity_id)
+
+            if watched is None:
+                watched = self._resolve(entity_id, resolved)
+
+            if not watched:
+                continue
+
+            old_state, new_state = change.get('old_state'), change.get('new_state')
+
+            for attribute, entries in watched.items():
+                old_value, new_value = _value(old_state, attribute), _value(new_state, attribute)
+                if old_value == new_value:
+                    continue
+
+                for rule, trigger in entries:
+                    start = perf_counter()
+                    if trigger.matches(old_value, new_value):
+                        # A rule runs once per batch, for the latest change that fired it.
+                        candidates[rule.name] = (rule, change, perf_counter() - start)
+                    else:
+                        self.metrics.observe('hac_rule_evaluation_seconds', perf_counter() - start,
+                                             buckets=EVALUATION_BUCKETS, rule=rule.name)
+
+        if not candidates:
+            return 0
+
+        index = self.__client.entities.snapshot()
+        fired = 0
+
+        for rule, change, elapsed in candidates.values():
+            start = perf_counter()
+            holds = rule.check(index)
+            self.metrics.observe('hac_rule_evaluation_seconds', elapsed + perf_counter() - start,
+                                 buckets=EVALUATION_BUCKETS, rule=rule.name)
+
+            if holds:
+                fired += 1
+                self._fire(rule, change)
+
+        return fired
+
+    def _fire(self, rule: Rule, change: Dict[str, Any]):
+        self.metrics.increment('hac_rule_triggered_total', rule=rule.name)
+
+        if not rule.debounce:
+            self._run(rule, change)
+            return
+
+        with self.__lock:
+            pending = self.__debounce_timers.pop(rule.name, None)
+            if pending is not None:
+                pending.cancel()
+                self.metrics.increment('hac_rule_suppressed_total', rule=rule.name, reason='debounce')
+
+            timer = threading.Timer(rule.debounce, self._debounced, (rule, change))
+            timer.daemon = True
+            self.__debounce_timers[rule.name] = timer
+
+        timer.start()
+
+    def _debounced(self, rule: Rule, change: Dict[str, Any]):
+        with self.__lock:
+            if self.__debounce_timers.get(rule.name) is not threading.current_thread():
+                return
+            del self.__debounce_timers[rule.name]
+
+        self._run(rule, change)
+
+    def _run(self, rule: Rule, change: Dict[str, Any]):
+        now = time.monotonic()
+
+        if rule.throttle and rule.last_fired is not None and now - rule.last_fired < rule.throttle:
+            self.metrics.increment('hac_rule_suppressed_total', rule=rule.name, reason='throttle')
+            return
+
+        rule.last_fired = now
+        self.__executor.submit(self._execute, rule, change)
+
+    def _execute(self, rule: Rule, change: Dict[str, Any]):
+        try:
+            with self.metrics.timer('hac_rule_action_seconds', rule=rule.name):
+                rule.action(change)
+        except Exception as e:
+            rule.last_error = e
+            self.metrics.increment('hac_rule_action_errors_total', rule=rule.name)
+        else:
+            self.metrics.increment('hac_rule_fired_total', rule=rule.name)
+
+    def attach(self, ingestor):
+        """
+        Evaluate every batch an EventIngestor applies.
+
+        Args:
+            ingestor (EventIngestor): The ingestor feeding the client's entity index.
+        """
+        ingestor.add_batch_listener(self.process)
+
+    def detach(self, ingestor):
+        ingestor.remove_batch_listener(self.process)
+
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the evaluation latency of every rule.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per rule name, the number of evaluations and the p50/p99 latency in seconds.
+        """
+        report = {}
+
+        for name in self.__rules:
+            histogram = self.metrics.histogram('hac_rule_evaluation_seconds', rule=name)
+            if histogram is None:
+                report[name] = {'count': 0, 'p50': None, 'p99': None}
+                continue
+
+            report[name] = {
+                    'count': histogram.count,
+                    'p50':   histogram.quantile(0.5),
+                    'p99':   histogram.quantile(0.99),
+                    }
+
+        return report
+
+    def close(self, wait: bool = True):
+        """
+        Cancel pending debounced actions and stop the action threads.
+
+        Args:
+            wait (bool): Wait for running actions to finish.
+        """
+        with self.__lock:
+            timers = list(self.__debounce_timers.values())
+            self.__debounce_timers.clear()
+
+        for timer in timers:
+            timer.cancel()
+
+        self.__executor.shutdown(wait=wait)
@@ -0,0 +1,442 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from home_assistant_control.controllers import call_service
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class ScheduledCommand:
+    """
+    A handle to a service call the Scheduler will make later.
+
+    Usage example:
+    >>> handle = scheduler.schedule('light.hall', 'turn_off', delay=300)
+    >>> handle.reschedule(300)  # Motion; start over.
+    >>> handle.cancel()
+    """
+
+    def __init__(self, scheduler, entity_id: str, service: str, due: float, data: Dict[str, Any] = None,
+                 interval: float = None, key: str = None):
+        self.__scheduler = scheduler
+        self.__entity_id = entity_id
+        self.__service = service
+        self.__data = data or {}
+        self.__interval = interval
+        self.__key = key if key is not None else service
+        self.due = due
+        # Bumped on every reschedule; heap entries of an older generation are skipped.
+        self.generation = 0
+        self.cancelled = False
+        self.fired = 0
+        self.last_error = None
+
+    def __repr__(self):
+        return (f'<ScheduledCommand entity_id={self.__entity_id} service={self.__service} '
+                f'in={self.remaining:.3f}s cancelled={self.cancelled}>')
+
+    @property
+    def entity_id(self) -> str:
+        return self.__entity_id
+
+    @property
+    def domain(self) -> str:
+        return self.__entity_id.split('.', 1)[0]
+
+    @property
+    def service(self) -> str:
+        return self.__service
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self.__data
+
+    @property
+    def interval(self) -> Optional[float]:
+        return self.__interval
+
+    @property
+    def key(self) -> str:
+        return self.__key
+
+    @property
+    def remaining(self) -> float:
+        """
+        Get how long until the command is due, in seconds.
+        """
+        return max(0.0, self.due - time.monotonic())
+
+    def cancel(self) -> bool:
+        """
+        Cancel the command.
+
+        Returns:
+            bool: True if it was still pending.
+        """
+        return self.__scheduler.cancel_handle(self)
+
+    def reschedule(self, delay: float):
+        """
+        Move the command to `delay` seconds from now.
+
+        Args:
+            delay (float): The new delay, in seconds.
+        """
+        self.__scheduler.reschedule(self, delay)
+
+
+class Scheduler:
+    """
+    Runs delayed and recurring service calls from a single thread.
+
+    Commands live in one heap ordered by due time; cancelling or rescheduling only marks the old heap entry stale, so
+    both are O(1) plus one heap push. Every command is keyed by entity ID and a key (the service name by default), and
+    scheduling a command under a key that is already pending replaces it, which is what "turn off in 5 minutes unless
+    motion" needs.
+
+    When a command comes due, every command due within the following `tick` seconds is taken along with it. They are
+    grouped by domain, service and service data, and each group is sent as one service call with a list of entity IDs,
+    on a small pool of threads so a slow call never delays the clock.
+
+    Usage example:
+    >>> with Scheduler(client) as scheduler:
+    ...     scheduler.schedule('light.hall', 'turn_off', delay=300)
+    ...     scheduler.cancel('light.hall')
+    """
+
+    def __init__(self, client, tick: float = 0.05, max_workers: int = 4):
+        """
+        Initializes a new instance of the Scheduler class.
+
+        Args:
+            client (Client): The client to make the service calls with.
+            tick (float): Commands due within this many seconds of each other are sent together.
+            max_workers (int): The number of threads making service calls.
+        """
+        self.__client = client
+        self.__tick = tick
+        self.__max_workers = max_workers
+        self.__heap: List[Tuple[float, int, int, ScheduledCommand]] = []
+        # entity_id -> key -> the pending command.
+        self.__handles: Dict[str, Dict[str, ScheduledCommand]] = {}
+        self.__pending = 0
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__executor = None
+        self.__running = False
+
+    def __repr__(self):
+        return f'<Scheduler pending={self.__pending} tick={self.__tick} running={self.__running}>'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def metrics(self):
+        return self.__client.metrics
+
+    @property
+    def tick(self) -> float:
+        return self.__tick
+
+    @property
+    def pending_count(self) -> int:
+        return self.__pending
+
+    def start(self):
+        """
+        Start the scheduler thread.
+        """
+        if self.__running:
+            return
+
+        self.__running = True
+        self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='hac-scheduler')
+        self.__thread = threading.Thread(target=self._run, name='hac-scheduler', daemon=True)
+        self.__thread.start()
+
+    def stop(self, wait: bool = True):
+        """
+        Stop the scheduler thread. Pending commands are kept and run once the scheduler is started again.
+
+        Args:
+            wait (bool): Wait for service calls in flight to finish.
+        """
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait)
+            self.__executor = None
+
+    def schedule(self, entity_id: str, service: str, delay: float, data: Dict[str, Any] = None,
+                 interval: float = None, key: str = None) -> ScheduledCommand:
+        """
+        Schedule a service call on an entity.
+
+        Args:
+            entity_id (str): The ID of the entity.
+            service (str): The service of the entity's domain to call, e.g. 'turn_off'.
+            delay (float): Seconds from now until the call.
+            data (dict): Extra service data.
+            interval (float): Repeat the call every this many seconds after the first one.
+            key (str): Identifies the command among the entity's commands; defaults to the service. A pending command
+                with the same entity ID and key is replaced.
+
+        Returns:
+            ScheduledCommand: The handle of the command.
+        """
+        if interval is not None and interval <= 0:
+            raise ValueError('"interval" must be positive!')
+
+        handle = ScheduledCommand(self, entity_id, service, time.monotonic() + delay, data, interval, key)
+
+        with self.__condition:
+            commands = self.__handles.setdefault(entity_id, {})
+            previous = commands.get(handle.key)
+
+            if previous is not None:
+                previous.cancelled = True
+            else:
+                self.__pending += 1
+
+            commands[handle.key] = handle
+            self._push(handle)
+
+        return handle
+
+    def reschedule(self, handle: ScheduledCommand, delay: float):
+        """
+        Move a pending command to `delay` seconds from now.
+
+        Args:
+            handle (ScheduledCommand): The command.
+            delay (float): The new delay, in seconds.
+
+        Raises:
+            ValueError: If the command was cancelled or has already run.
+        """
+        with self.__condition:
+            if not self._is_pending(handle):
+                raise ValueError(f'{handle} is no longer pending!')
+
+            handle.due = time.monotonic() + delay
+            handle.generation += 1
+            self._push(handle)
+
+    def cancel(self, entity_id: str, key: str = None) -> int:
+        """
+        Cancel an entity's pending commands.
+
+        Args:
+            entity_id (str): The ID of the entity.
+            key (str): Only cancel the command with this key. Cancels all of the entity's commands by default.
+
+        Returns:
+            int: The number of commands cancelled.
+        """
+        with self.__condition:
+            commands = self.__handles.get(entity_id, {})
+
+            if key is not None:
+                handles = [commands[key]] if key in commands else []
+            else:
+                handles = list(commands.values())
+
+            for handle in handles:
+                self._discard(handle)
+
+        return len(handles)
+
+    def cancel_handle(self, handle: ScheduledCommand) -> bool:
+        with self.__condition:
+            if not self._is_pending(handle):
+                return False
+
+            self._discard(handle)
+
+        return True
+
+    def cancel_all(self) -> int:
+        """
+        Cancel every pending command.
+
+        Returns:
+            int: The number of commands cancelled.
+        """
+        with self.__condition:
+            count = self.__pending
+
+            for commands in self.__handles.values():
+                for handle in commands.values():
+                    handle.cancelled = True
+
+            self.__handles.clear()
+            self.__heap.clear()
+            self.__pending = 0
+
+        return count
+
+    def pending(self, entity_id: str = None) -> List[ScheduledCommand]:
+        """
+        Get the pending commands, soonest first.
+
+        Args:
+            entity_id (str): Only return this entity's commands.
+
+        Returns:
+            List[ScheduledCommand]: The commands.
+        """
+        with self.__condition:
+            if entity_id is not None:
+                handles = list(self.__handles.get(entity_id, {}).values())
+            else:
+                handles = [handle for commands in self.__handles.values() for handle in commands.values()]
+
+        return sorted(handles, key=lambda handle: handle.due)
+
+    def _push(self, handle: ScheduledCommand):
+        # Called with the condition held.
+        heap = self.__heap
+        heapq.heappush(heap, (handle.due, next(self.__sequence), handle.generation, handle))
+
+        # Stale entries pile up under heavy rescheduling; rebuild once they make up most of the heap.
+        if len(heap) > 1024 and len(heap) > 4 * self.__pending:
+            self.__heap = [entry for entry in heap if self._is_live(entry)]
+            heapq.heapify(self.__heap)
+
+        if self.__heap[0][3] is handle:
+            self.__condition.notify()
+
+        self.metrics.set_gauge('hac_scheduler_pending', self.__pending)
+
+    def _is_pending(self, handle: ScheduledCommand) -> bool:
+        return self.__handles.get(handle.entity_id, {}).get(handle.key) is handle
+
+    def _forget(self, handle: ScheduledCommand):
+        # Called with the condition held.
+        commands = self.__handles[handle.entity_id]
+        del commands[handle.key]
+
+        if not commands:
+            del self.__handles[handle.entity_id]
+
+        self.__pending -= 1
+
+    def _discard(self, handle: ScheduledCommand):
+        # Called with the condition held. The heap entry is left behind and skipped when it comes up.
+        handle.cancelled = True
+        self._forget(handle)
+        self.metrics.increment('hac_scheduler_cancelled_total')
+
+    @staticmethod
+    def _is_live(entry) -> bool:
+        _, _, generation, handle = entry
+        return not handle.cancelled and generation == handle.generation
+
+    def _take_due(self) -> List[Tuple[ScheduledCommand, float]]:
+        # Called with the condition held. Returns each command with the time it was due.
+        heap = self.__heap
+        # Whatever comes due within the next tick goes out now, with the command that woke us up.
+        horizon = time.monotonic() + self.__tick
+        due = []
+
+        while heap and heap[0][0] <= horizon:
+            entry = heapq.heappop(heap)
+            if not self._is_live(entry):
+                continue
+
+            handle = entry[3]
+            due.append((handle, entry[0]))
+
+            if handle.interval is not None:
+                # The next slot after this tick. Runs missed while the scheduler was busy or stopped are skipped, not
+                # made up in a burst (and an interval shorter than the tick doesn't fire more than once per tick).
+                slots = int((horizon - handle.due) // handle.interval) + 1
+                if slots > 1:
+                    self.metrics.increment('hac_scheduler_skipped_total', slots - 1)
+
+                handle.due += slots * handle.interval
+                heapq.heappush(heap, (handle.due, next(self.__sequence), handle.generation, handle))
+            else:
+                self._forget(handle)
+
+        return due
+
+    def _run(self):
+        condition = self.__condition
+
+        while True:
+            with condition:
+                while self.__running:
+                    # Drop stale entries at the top so they don't cause early wake-ups.
+                    while self.__heap and not self._is_live(self.__heap[0]):
+                        heapq.heappop(self.__heap)
+
+                    timeout = self.__heap[0][0] - time.monotonic() if self.__heap else None
+                    if timeout is not None and timeout <= 0:
+                        break
+
+                    condition.wait(timeout)
+
+                if not self.__running:
+                    return
+
+                due = self._take_due()
+                self.metrics.set_gauge('hac_scheduler_pending', self.__pending)
+
+            if due:
+                self._dispatch(due)
+
+    def _dispatch(self, due: List[Tuple[ScheduledCommand, float]]):
+        now = time.monotonic()
+        batches: Dict[Tuple[str, str, str], List[ScheduledCommand]] = {}
+
+        for handle, due_at in due:
+            # Measured against when this run was due; a recurring handle's `due` already points at the next one.
+            self.metrics.observe('hac_scheduler_lateness_seconds', max(0.0, now - due_at))
+            # The service data goes into the key as JSON, since its values may be unhashable (e.g. colors).
+            batch_key = (handle.domain, handle.service, json.dumps(handle.data, sort_keys=True))
+            batches.setdefault(batch_key, []).append(handle)
+
+        for (domain, service, _), handles in batches.items():
+            self.metrics.observe('hac_scheduler_batch_size', len(handles), buckets=BATCH_SIZE_BUCKETS)
+            self.__executor.submit(self._call, domain, service, handles)
+
+    def _call(self, domain: str, service: str, handles: List[ScheduledCommand]):
+        entity_ids = list(dict.fromkeys(handle.entity_id for handle in handles))
+        data = {'entity_id': entity_ids if len(entity_ids) > 1 else entity_ids[0], **handles[0].data}
+
+        try:
+            call_service(self.__client, domain, service, data)
+        except Exception as e:
+            for handle in handles:
+                handle.last_error = e
+
+            self.metrics.increment('hac_scheduler_errors_total', domain=domain, service=service)
+            return
+
+        for handle in handles:
+            handle.fired += 1
+
+        self.metrics.increment('hac_scheduler_fired_total', len(handles))
+        self.metrics.increment('hac_scheduler_calls_total', domain=domain, service=service)
@@ -0,0 +1,853 @@
+import base64
+import hashlib
+import itertools
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+from home_assistant_control.client.compressed import compress_state, diff_states
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+DOMAINS = ('light', 'switch', 'sensor', 'binary_sensor', 'climate', 'media_player', 'camera', 'cover')
+
+SERVICES = {
+        'light':        ('turn_on', 'turn_off', 'toggle'),
+        'switch':       ('turn_on', 'turn_off', 'toggle'),
+        'climate':      ('set_temperature', 'set_hvac_mode'),
+        'media_player': ('media_play', 'media_pause', 'volume_set'),
+        'cover':        ('open_cover', 'close_cover'),
+        'homeassistant': ('turn_on', 'turn_off', 'toggle'),
+        }
+
+AREAS = ('kitchen', 'living_room', 'bedroom', 'hall', 'office', 'garage')
+
+# The key identifying the items of each registry; changes to one fire a `<kind>_registry_updated` event.
+REGISTRY_KEYS = {
+        'area':   'area_id',
+        'device': 'id',
+        'entity': 'entity_id',
+        }
+
+_SERVICE_STATES = {
+        'turn_on':     'on',
+        'turn_off':    'off',
+        'open_cover':  'open',
+        'close_cover': 'closed',
+        'media_play':  'playing',
+        'media_pause': 'paused',
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def make_state(entity_id: str, state: str, attributes: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Build a state object shaped like the ones Home Assistant returns.
+
+    Args:
+        entity_id (str): The ID of the entity.
+        state (str): The state value.
+        attributes (dict): The entity's attributes.
+
+    Returns:
+        dict: The state object.
+    """
+    now = _now()
+    return {
+            'entity_id':    entity_id,
+            'state':        state,
+            'attributes':   attributes or {},
+            'last_changed': now,
+            'last_updated': now,
+            'context':      {'id': f'{random.getrandbits(128):032x}', 'parent_id': None, 'user_id': None},
+            }
+
+
+def generate_states(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate a deterministic, realistic-looking set of entity states.
+
+    Args:
+        count (int): The number of entities to generate.
+        seed (int): Seed for the random generator, so runs are comparable.
+
+    Returns:
+        List[Dict[str, Any]]: The generated states.
+    """
+    rng = random.Random(seed)
+    states = []
+
+    for index in range(count):
+        domain = DOMAINS[index % len(DOMAINS)]
+        entity_id = f'{domain}.{domain}_{index:06d}'
+        friendly_name = f'{domain.replace("_", " ").title()} {index}'
+
+        if domain in ('light', 'switch', 'binary_sensor'):
+            state = rng.choice(('on', 'off'))
+            attributes = {'friendly_name': friendly_name}
+            if domain == 'light':
+                attributes.update(brightness=rng.randint(0, 255), color_mode='rgb',
+                                  rgb_color=[rng.randint(0, 255) for _ in range(3)])
+        elif domain == 'sensor':
+            state = f'{rng.uniform(0, 1000):.1f}'
+            attributes = {'friendly_name': friendly_name, 'unit_of_measurement': 'lx', 'state_class': 'measurement'}
+        elif domain == 'climate':
+            state = rng.choice(('heat', 'cool', 'off'))
+            attributes = {'friendly_name': friendly_name, 'temperature': rng.randint(16, 26),
+                          'current_temperature': round(rng.uniform(15, 28), 1)}
+        elif domain == 'cover':
+            state = rng.choice(('open', 'closed'))
+            attributes = {'friendly_name': friendly_name, 'current_position': rng.randint(0, 100)}
+        else:
+            state = rng.choice(('idle', 'playing', 'paused'))
+            attributes = {'friendly_name': friendly_name}
+
+        states.append(make_state(entity_id, state, attributes))
+
+    return states
+
+
+def generate_registries(states: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate area, device and entity registries for a set of states.
+
+    Every three consecutive entities share a device, devices are spread over `AREAS`, every tenth entity overrides its
+    device's area with the next one and every fifth carries the 'night' label.
+
+    Args:
+        states (list): The entity states.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: The 'area', 'device' and 'entity' registries.
+    """
+    areas = [{'area_id': area_id, 'name': area_id.replace('_', ' ').title(), 'aliases': [], 'labels': []}
+             for area_id in AREAS]
+    devices, entities = {}, []
+
+    for index, state in enumerate(states):
+        device_number = index // 3
+        device_id = f'device_{device_number:06d}'
+
+        if device_id not in devices:
+            devices[device_id] = {'id': device_id, 'name': f'Device {device_number}',
+                                  'area_id': AREAS[device_number % len(AREAS)], 'labels': []}
+
+        entities.append({
+                'entity_id': state['entity_id'],
+                'device_id': device_id,
+                'area_id':   AREAS[(device_number + 1) % len(AREAS)] if index % 10 == 0 else None,
+                'labels':    ['night'] if index % 5 == 0 else [],
+                'platform':  'fake',
+                })
+
+    return {'area': areas, 'device': list(devices.values()), 'entity': entities}
+
+
+class WebSocketConnection:
+    """
+    A minimal server side of an RFC 6455 connection over an already-upgraded HTTP request.
+
+    Only what the Home Assistant protocol needs is implemented: text frames, fragmentation, ping/pong and close.
+    """
+
+    def __init__(self, rfile, wfile):
+        self.__rfile = rfile
+        self.__wfile = wfile
+        self.__send_lock = threading.Lock()
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key: str) -> str:
+        digest = hashlib.sha1(f'{key}{WEBSOCKET_GUID}'.encode('ascii')).digest()
+        return base64.b64encode(digest).decode('ascii')
+
+    def _read_exact(self, size: int) -> bytes:
+        data = self.__rfile.read(size)
+        if data is None or len(data) < size:
+            raise ConnectionError('WebSocket peer went away')
+        return data
+
+    def _read_frame(self):
+        first, second = self._read_exact(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        masked, length = second & 0x80, second & 0x7F
+
+        if length == 126:
+            length = struct.unpack('!H', self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._read_exact(8))[0]
+
+        mask = self._read_exact(4) if masked else None
+        payload = self._read_exact(length) if length else b''
+
+        if mask:
+            # XOR the whole payload at once instead of byte by byte.
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+            payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+
+        return bool(fin), opcode, payload
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+
+        with self.__send_lock:
+            if self.closed:
+                return
+            self.__wfile.write(header + payload)
+            self.__wfile.flush()
+
+    def send_text(self, text: str):
+        self._send_frame(0x1, text.encode('utf-8'))
+
+    def send_json(self, message: Any):
+        self.send_text(json.dumps(message))
+
+    def recv(self):
+        """
+        Receive the next text message.
+
+        Returns:
+            str: The message, or None once the connection is closed.
+        """
+        fragments = []
+
+        while True:
+            try:
+                fin, opcode, payload = self._read_frame()
+            except (ConnectionError, OSError, ValueError):
+                self.closed = True
+                return None
+
+            if opcode == 0x8:
+                self._send_frame(0x8, payload[:2])
+                self.closed = True
+                return None
+
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+
+            if opcode in (0x0, 0x1, 0x2):
+                fragments.append(payload)
+                if fin:
+                    return b''.join(fragments).decode('utf-8')
+
+    def close(self):
+        try:
+            self._send_frame(0x8, struct.pack('!H', 1000))
+        except OSError:
+            pass
+        self.closed = True
+
+
+class WebSocketSession:
+    """
+    The state of one authenticated WebSocket client of the fake server.
+    """
+
+    def __init__(self, server, connection: WebSocketConnection):
+        self.server = server
+        self.connection = connection
+        self.subscriptions: Dict[int, Any] = {}
+        # subscribe_entities subscriptions: ID -> set of followed entity IDs, or None for all of them.
+        self.entity_subscriptions: Dict[int, Any] = {}
+
+    def send(self, message: Any):
+        try:
+            self.connection.send_json(message)
+        except OSError:
+            # The client went away mid-burst; its handler thread cleans the session up.
+            self.connection.closed = True
+
+    def result(self, message_id: int, result: Any = None, success: bool = True, error: dict = None):
+        message = {'id': message_id, 'type': 'result', 'success': success, 'result': result}
+        if error is not None:
+            message['error'] = error
+        self.send(message)
+
+
+class FakeHomeAssistant:
+    """
+    A local, in-process stand-in for a Home Assistant instance.
+
+    It serves the parts of the REST API this package talks to (`/api/`, `/api/states`, `/api/states/<entity_id>`,
+    `/api/services` and `/api/services/<domain>/<service>`) and the WebSocket API at `/api/websocket` on the same port,
+    with a configurable number of generated entities and an optional injected latency.
+
+    Usage example:
+    >>> with FakeHomeAssistant(entity_count=1000, latency=0.005) as fake:
+    ...     client = Client(fake.url, fake.token)
+    ...     fake.emit_state_changes(100)
+    """
+
+    def __init__(
+            self,
+            entity_count: int = 100,
+            latency: float = 0.0,
+            token: str = 'fake-token',
+            host: str = '127.0.0.1',
+            port: int = 0,
+            states: List[Dict[str, Any]] = None,
+            seed: int = 0,
+            camera_frame_size: int = 16 * 1024,
+            camera_fps: float = None,
+            service_delay: float = 0.0
+            ):
+        """
+        Initializes a new instance of the FakeHomeAssistant class.
+
+        Args:
+            entity_count (int): How many entities to generate when `states` isn't given.
+            latency (float): Seconds to sleep before answering each REST request.
+            token (str): The only access token the server accepts.
+            host (str): The interface to bind to.
+            port (int): The port to listen on; 0 picks a free one.
+            states (list): Explicit entity states to serve instead of generated ones.
+            seed (int): Seed for the generated states.
+            camera_frame_size (int): The size, in bytes, of the JPEG frames cameras serve.
+            camera_fps (float): The frame rate of camera MJPEG streams; as fast as possible if omitted.
+            service_delay (float): Seconds before a service call takes effect, like a slow device. Delayed calls
+                answer with an empty list of changed states; the change arrives later as an event.
+        """
+        self.latency = latency
+        self.camera_frame_size = camera_frame_size
+        self.camera_fps = camera_fps
+        self.service_delay = service_delay
+        self.token = token
+        self.__address = (host, port)
+        self.__lock = threading.Lock()
+        self.__states: Dict[str, Dict[str, Any]] = {}
+        self.__states_body = None
+        self.__sessions: List[WebSocketSession] = []
+        self.__server = None
+        self.__thread = None
+        self.__request_counts: Dict[str, int] = {}
+        self.__registries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+        self.commands: Dict[str, Callable[[WebSocketSession, dict], None]] = {
+                'ping':               self._ws_ping,
+                'get_states':         self._ws_get_states,
+                'get_services':       self._ws_get_services,
+                'call_service':       self._ws_call_service,
+                'subscribe_events':   self._ws_subscribe_events,
+                'unsubscribe_events': self._ws_unsubscribe_events,
+                'subscribe_entities': self._ws_subscribe_entities,
+                }
+
+        for kind in REGISTRY_KEYS:
+            self.commands[f'config/{kind}_registry/list'] = self._ws_registry_list
+
+
+        self.load_states(states if states is not None else generate_states(entity_count, seed))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __repr__(self):
+        return f'<FakeHomeAssistant url={self.url if self.__server else None} entities={len(self.__states)}>'
+
+    # -- lifecycle -------------------------------------------------------------------------------------------------
+
+    def start(self):
+        """
+        Start serving from a background thread.
+        """
+        self.__server = ThreadingHTTPServer(self.__address, self._make_handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='fake-home-assistant', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Close every WebSocket session and stop serving.
+        """
+        for session in self.sessions:
+            session.connection.close()
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def sessions(self) -> List[WebSocketSession]:
+        with self.__lock:
+            return list(self.__sessions)
+
+    @property
+    def request_counts(self) -> Dict[str, int]:
+        """
+        Get the number of REST requests served, keyed by method and path.
+
+        Returns:
+            dict: E.g. `{'GET /api/states': 3}`.
+        """
+        with self.__lock:
+            return dict(self.__request_counts)
+
+    # -- state -----------------------------------------------------------------------------------------------------
+
+    def load_states(self, states: List[Dict[str, Any]]):
+        """
+        Replace every entity state the server knows about.
+
+        Args:
+            states (list): The new entity states.
+        """
+        registries = generate_registries(states)
+
+        with self.__lock:
+            self.__states = {state['entity_id']: state for state in states}
+            self.__states_body = None
+            self.__registries = {kind: {item[REGISTRY_KEYS[kind]]: item for item in items}
+                                 for kind, items in registries.items()}
+
+    @property
+    def states(self) -> List[Dict[str, Any]]:
+        with self.__lock:
+            return list(self.__states.values())
+
+    def get_state(self, entity_id: str) -> Dict[str, Any]:
+        with self.__lock:
+            return self.__states.get(entity_id)
+
+    def _states_body(self) -> bytes:
+        with self.__lock:
+            if self.__states_body is None:
+                self.__states_body = json.dumps(list(self.__states.values())).encode('utf-8')
+            return self.__states_body
+
+    def set_state(self, entity_id: str, state: str, attributes: Dict[str, Any] = None, fire: bool = True):
+        """
+        Change (or create) an entity's state and, optionally, emit a `state_changed` event for it.
+
+        Args:
+            entity_id (str): The ID of the entity.
+            state (str): The new state.
+            attributes (dict): The new attributes. The previous ones are kept if omitted.
+            fire (bool): Whether to emit a `state_changed` event.
+
+        Returns:
+            dict: The new state object.
+        """
+        with self.__lock:
+            old_state = self.__states.get(entity_id)
+            if attributes is None:
+                attributes = dict(old_state['attributes']) if old_state else {}
+            new_state = make_state(entity_id, state, attributes)
+            self.__states[entity_id] = new_state
+            self.__states_body = None
+
+        if fire:
+            self.fire_event('state_changed', {'entity_id': entity_id, 'old_state': old_state, 'new_state': new_state})
+            self._publish_entity_change(entity_id, old_state, new_state)
+
+        return new_state
+
+    def remove_state(self, entity_id: str, fire: bool = True):
+        with self.__lock:
+            old_state = self.__states.pop(entity_id, None)
+            self.__states_body = None
+
+        if fire and old_state is not None:
+            self.fire_event('state_changed', {'entity_id': entity_id, 'old_state': old_state, 'new_state': None})
+            self._publish_entity_change(entity_id, old_state, None)
+
+    def emit_state_changes(self, count: int, entity_ids: List[str] = None) -> int:
+        """
+        Emit a burst of `state_changed` events as fast as possible by cycling through entities.
+
+        Args:
+            count (int): The number of events to emit.
+            entity_ids (list): The entities to cycle through; all known entities if omitted.
+
+        Returns:
+            int: The number of events emitted.
+        """
+        entity_ids = entity_ids or [state['entity_id'] for state in self.states]
+        sent = 0
+
+        for entity_id in itertools.islice(itertools.cycle(entity_ids), count):
+            current = self.get_state(entity_id)
+            new = 'off' if current and current['state'] == 'on' else 'on'
+            self.set_state(entity_id, new)
+            sent += 1
+
+        return sent
+
+    def registry(self, kind: str) -> List[Dict[str, Any]]:
+        """
+        Get one of the registries.
+
+        Args:
+            kind (str): 'area', 'device' or 'entity'.
+
+        Returns:
+            list: The registry's items.
+        """
+        with self.__lock:
+            return list(self.__registries[kind].values())
+
+    def update_registry(self, kind: str, item: Dict[str, Any], remove: bool = False):
+        """
+        Create, update or remove a registry item and fire the matching `<kind>_registry_updated` event.
+
+        Args:
+            kind (str): 'area', 'device' or 'entity'.
+            item (dict): The item; only its ID is needed to remove it.
+            remove (bool): Remove the item instead.
+        """
+        key = REGISTRY_KEYS[kind]
+        item_id = item[key]
+
+        with self.__lock:
+            registry = self.__registries[kind]
+
+            if remove:
+                registry.pop(item_id, None)
+                action = 'remove'
+            else:
+                action = 'update' if item_id in registry else 'create'
+                registry[item_id] = item
+
+        self.fire_event(f'{kind}_registry_updated', {'action': action, key: item_id})
+
+    def fire_event(self, event_type: str, data: Dict[str, Any]):
+        """
+        Send an event to every session subscribed to it.
+
+        Args:
+            event_type (str): The type of the event.
+            data (dict): The event data.
+        """
+        event = {'event_type': event_type, 'data': data, 'origin': 'LOCAL', 'time_fired': _now()}
+
+        for session in self.sessions:
+            for subscription_id, wanted in list(session.subscriptions.items()):
+                if wanted is None or wanted == event_type:
+                    session.send({'id': subscription_id, 'type': 'event', 'event': event})
+
+    def _publish_entity_change(self, entity_id: str, old_state: Dict[str, Any], new_state: Dict[str, Any]):
+        event = None
+
+        for session in self.sessions:
+            for subscription_id, wanted in list(session.entity_subscriptions.items()):
+                if wanted is not None and entity_id not in wanted:
+                    continue
+
+                if event is None:
+                    # Only pay for the compression when someone is listening.
+                    if new_state is None:
+                        event = {'r': [entity_id]}
+                    elif old_state is None:
+                        event = {'a': {entity_id: compress_state(new_state)}}
+                    else:
+                        event = {'c': {entity_id: diff_states(old_state, new_state)}}
+
+                session.send({'id': subscription_id, 'type': 'event', 'event': event})
+
+    def call_service(self, domain: str, service: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Apply a service call to the fake state.
+
+        Args:
+            domain (str): The service domain.
+            service (str): The service name.
+            data (dict): The service data; `entity_id` may be a string or a list.
+
+        Returns:
+            list: The states that changed.
+        """
+        if self.service_delay:
+            timer = threading.Timer(self.service_delay, self._apply_service, (domain, service, data))
+            timer.daemon = True
+            timer.start()
+            return []
+
+        return self._apply_service(domain, service, data)
+
+    def _apply_service(self, domain: str, service: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        entity_ids = data.get('entity_id') or []
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        changed = []
+
+        for entity_id in entity_ids:
+            current = self.get_state(entity_id)
+            if current is None:
+                continue
+
+            if service == 'toggle':
+                new = 'off' if current['state'] == 'on' else 'on'
+            else:
+                new = _SERVICE_STATES.get(service, current['state'])
+
+            attributes = dict(current['attributes'])
+            attributes.update({key: value for key, value in data.items() if key != 'entity_id'})
+            changed.append(self.set_state(entity_id, new, attributes))
+
+        return changed
+
+    # -- cameras ---------------------------------------------------------------------------------------------------
+
+    def camera_frame(self, number: int = 0) -> bytes:
+        """
+        Make a fake JPEG frame of `camera_frame_size` bytes: start and end markers around a frame counter and filler.
+
+        Args:
+            number (int): The frame number written into the frame.
+
+        Returns:
+            bytes: The frame.
+        """
+        counter = struct.pack('>Q', number)
+        filler = max(self.camera_frame_size - len(counter) - 4, 0)
+        return b'\xff\xd8' + counter + bytes([number % 251]) * filler + b'\xff\xd9'
+
+    @property
+    def serving(self) -> bool:
+        return self.__server is not None
+
+    # -- WebSocket commands ----------------------------------------------------------------------------------------
+
+    def _ws_ping(self, session: WebSocketSession, message: dict):
+        session.send({'id': message['id'], 'type': 'pong'})
+
+    def _ws_get_states(self, session: WebSocketSession, message: dict):
+        session.result(message['id'], self.states)
+
+    def _ws_get_services(self, session: WebSocketSession, message: dict):
+        session.result(message['id'], {domain: {name: {} for name in names} for domain, names in SERVICES.items()})
+
+    def _ws_call_service(self, session: WebSocketSession, message: dict):
+        data = dict(message.get('service_data') or {})
+        target = message.get('target') or {}
+        if 'entity_id' in target:
+            data['entity_id'] = target['entity_id']
+
+        self.call_service(message['domain'], message['service'], data)
+        session.result(message['id'], {'context': {'id': f'{random.getrandbits(128):032x}'}})
+
+    def _ws_registry_list(self, session: WebSocketSession, message: dict):
+        # 'config/<kind>_registry/list'
+        session.result(message['id'], self.registry(message['type'].split('/')[1].rsplit('_', 1)[0]))
+
+    def _ws_subscribe_events(self, session: WebSocketSession, message: dict):
+        session.subscriptions[message['id']] = message.get('event_type')
+        session.result(message['id'])
+
+    def _ws_unsubscribe_events(self, session: WebSocketSession, message: dict):
+        session.subscriptions.pop(message.get('subscription'), None)
+        session.entity_subscriptions.pop(message.get('subscription'), None)
+        session.result(message['id'])
+
+    def _ws_subscribe_entities(self, session: WebSocketSession, message: dict):
+        wanted = set(message['entity_ids']) if message.get('entity_ids') else None
+        session.result(message['id'])
+
+        # Follow changes before taking the snapshot, so nothing slips through in between. A diff that overtakes the
+        # snapshot is for an entity the client doesn't know yet, and the snapshot already holds its new state.
+        session.entity_subscriptions[message['id']] = wanted
+        initial = {state['entity_id']: compress_state(state) for state in self.states
+                   if wanted is None or state['entity_id'] in wanted}
+        session.send({'id': message['id'], 'type': 'event', 'event': {'a': initial}})
+
+    def _run_websocket(self, connection: WebSocketConnection):
+        connection.send_json({'type': 'auth_required', 'ha_version': '2024.1.0'})
+
+        raw = connection.recv()
+        if raw is None:
+            return
+
+        auth = json.loads(raw)
+        if auth.get('type') != 'auth' or auth.get('access_token') != self.token:
+            connection.send_json({'type': 'auth_invalid', 'message': 'Invalid access token or password'})
+            connection.close()
+            return
+
+        connection.send_json({'type': 'auth_ok', 'ha_version': '2024.1.0'})
+        session = WebSocketSession(self, connection)
+
+        with self.__lock:
+            self.__sessions.append(session)
+
+        try:
+            while (raw := connection.recv()) is not None:
+                message = json.loads(raw)
+                handler = self.commands.get(message.get('type'))
+
+                if handler is None:
+                    session.result(message.get('id'), success=False,
+                                   error={'code': 'unknown_command', 'message': 'Unknown command.'})
+                    continue
+
+                handler(session, message)
+        finally:
+            with self.__lock:
+                self.__sessions.remove(session)
+
+    # -- HTTP ------------------------------------------------------------------------------------------------------
+
+    def _count(self, method: str, path: str):
+        with self.__lock:
+            key = f'{method} {path}'
+            self.__request_counts[key] = self.__request_counts.get(key, 0) + 1
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle's algorithm hold the body back.
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body):
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_image(self, image: bytes):
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(image)))
+                self.end_headers()
+                self.wfile.write(image)
+
+            def _send_mjpeg(self):
+                # Like Home Assistant: a multipart body with no length, which only ends when either side hangs up.
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace;boundary=frameboundary')
+                self.end_headers()
+                self.close_connection = True
+
+                interval = 1 / fake.camera_fps if fake.camera_fps else 0
+                number = 0
+
+                try:
+                    while fake.serving:
+                        frame = fake.camera_frame(number)
+                        self.wfile.write(b'--frameboundary\r\nContent-Type: image/jpeg\r\n'
+                                         b'Content-Length: %d\r\n\r\n' % len(frame) + frame + b'\r\n')
+                        number += 1
+
+                        if interval:
+                            time.sleep(interval)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _authorized(self) -> bool:
+                if self.headers.get('Authorization') == f'Bearer {fake.token}':
+                    return True
+
+                self._send_json(401, {'message': '401: Unauthorized'})
+                return False
+
+            def _read_body(self) -> dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length)) if length else {}
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+
+                if path == '/api/websocket' and self.headers.get('Upgrade', '').lower() == 'websocket':
+                    self._upgrade()
+                    return
+
+                fake._count('GET', path)
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if not self._authorized():
+                    return
+
+                if path == '/api/':
+                    self._send_json(200, {'message': 'API running.'})
+                elif path == '/api/states':
+                    self._send_json(200, fake._states_body())
+                elif path.startswith('/api/states/'):
+                    state = fake.get_state(path[len('/api/states/'):])
+                    if state is None:
+                        self._send_json(404, {'message': 'Entity not found.'})
+                    else:
+                        self._send_json(200, state)
+                elif path.startswith('/api/camera_proxy/') or path.startswith('/api/camera_proxy_stream/'):
+                    entity_id = path.rsplit('/', 1)[1]
+                    state = fake.get_state(entity_id)
+
+                    if state is None or not entity_id.startswith('camera.'):
+                        self._send_json(404, {'message': 'Entity not found.'})
+                    elif path.startswith('/api/camera_proxy/'):
+                        self._send_image(fake.camera_frame())
+                    else:
+                        self._send_mjpeg()
+                elif path == '/api/services':
+                    self._send_json(200, [{'domain': domain, 'services': {name: {} for name in names}}
+                                          for domain, names in SERVICES.items()])
+                else:
+                    self._send_json(404, {'message': 'Not found.'})
+
+            def do_POST(self):
+                path = self.path.split('?', 1)[0]
+                fake._count('POST', path)
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                body = self._read_body()
+
+                if not self._authorized():
+                    return
+
+                parts = path.split('/')
+                if len(parts) == 5 and parts[1:3] == ['api', 'services']:
+                    self._send_json(200, fake.call_service(parts[3], parts[4], body))
+                else:
+                    self._send_json(404, {'message': 'Not found.'})
+
+            def _upgrade(self):
+                key = self.headers.get('Sec-WebSocket-Key', '')
+                self.send_response(101, 'Switching Protocols')
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.send_header('Sec-WebSocket-Accept', WebSocketConnection.accept_key(key))
+                self.end_headers()
+                self.wfile.flush()
+
+                self.close_connection = True
+                fake._run_websocket(WebSocketConnection(self.rfile, self.wfile))
+
+        return Handler
@@ -0,0 +1,515 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple
+
+from home_assistant_control.utils.api import make_request
+from home_assistant_control.utils.jsonlib import get_backend
+from home_assistant_control.utils.metrics import Histogram, Metrics
+
+# File layout: a header, then records appended back to back. Each record is a RECORD struct (kind and flags, seconds
+# since the recording started, payload length) followed by a JSON payload, zlib-compressed when FLAG_COMPRESSED is set.
+# A recorder that dies mid-write leaves a truncated last record, which readers skip.
+MAGIC = b'HACR'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHd')
+RECORD = struct.Struct('<BdI')
+
+SNAPSHOT = 1
+EVENT = 2
+KIND_MASK = 0x0f
+FLAG_COMPRESSED = 0x80
+
+# Payloads smaller than this are stored as they are; zlib gains little on a single small event.
+COMPRESS_MIN_BYTES = 1024
+
+LAG_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+STAGE_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class Record(NamedTuple):
+    kind: int
+    offset: float
+    payload: Any
+
+
+class TrafficRecorder:
+    """
+    Records `/api/states` snapshots and WebSocket events into a compact, append-only file.
+
+    `state_changed` events are stored without their `old_state`; it is the previous `new_state` of the same entity, so
+    the replayer rebuilds it. That roughly halves the size of a recording. Large payloads (snapshots, mostly) are
+    zlib-compressed. Opening an existing recording appends to it, and offsets carry on from where it left off.
+
+    Usage example:
+    >>> with TrafficRecorder('traffic.hacr') as recorder:
+    ...     recorder.capture_states(client)
+    ...     await recorder.attach(ws_client)
+    ...     ...
+    ...     await recorder.detach()
+    """
+
+    def __init__(self, path: str, json_backend: str = None, flush_interval: float = 1.0):
+        """
+        Initializes a new instance of the TrafficRecorder class.
+
+        Args:
+            path (str): The file to record to. It is created if missing and appended to otherwise.
+            json_backend (str): The JSON backend used to encode payloads.
+            flush_interval (float): Flush buffered records to disk at least this often, in seconds.
+        """
+        self.__path = path
+        self.__json = get_backend(json_backend)
+        self.flush_interval = flush_interval
+        self.__lock = threading.Lock()
+        self.__records = 0
+        self.__ws_client = None
+        self.__subscription_id = None
+
+        started_at, appended = time.time(), False
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            with open(path, 'r+b') as f:
+                started_at = _read_header(f)
+                # Cut off a record a crashed recorder left half-written, or everything appended after it is lost.
+                f.truncate(_complete_length(f))
+            appended = True
+
+        self.__file = open(path, 'ab')
+
+        if not appended:
+            self.__file.write(HEADER.pack(MAGIC, FORMAT_VERSION, started_at))
+
+        # Offsets are measured on the monotonic clock from here, shifted by however long the recording already ran.
+        self.__base_offset = time.time() - started_at
+        self.__opened = time.monotonic()
+        self.__last_flush = self.__opened
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'<TrafficRecorder path={self.__path} records={self.__records}>'
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def records(self) -> int:
+        """
+        The number of records written by this recorder.
+        """
+        return self.__records
+
+    @property
+    def closed(self) -> bool:
+        return self.__file.closed
+
+    def _write(self, kind: int, payload: Any):
+        data = self.__json.dumps(payload).encode('utf-8')
+        flags = kind
+
+        if len(data) >= COMPRESS_MIN_BYTES:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                data, flags = compressed, flags | FLAG_COMPRESSED
+
+        with self.__lock:
+            if self.__file.closed:
+                return
+
+            now = time.monotonic()
+            self.__file.write(RECORD.pack(flags, self.__base_offset + now - self.__opened, len(data)))
+            self.__file.write(data)
+            self.__records += 1
+
+            if now - self.__last_flush >= self.flush_interval:
+                self.__file.flush()
+                self.__last_flush = now
+
+    def record_states(self, states: List[Dict[str, Any]]):
+        """
+        Record a full snapshot of entity states, as returned by `/api/states`.
+
+        Args:
+            states (list): The entity states.
+        """
+        self._write(SNAPSHOT, states)
+
+    def record_event(self, event: Dict[str, Any]):
+        """
+        Record one WebSocket event. Suitable as a `subscribe_events()` handler.
+
+        Args:
+            event (dict): The `event` object of an event message.
+        """
+        event_type = event.get('event_type')
+        data = event.get('data') or {}
+
+        if event_type == 'state_changed':
+            data = {'entity_id': data.get('entity_id'), 'new_state': data.get('new_state')}
+
+        self._write(EVENT, {'event_type': event_type, 'data': data})
+
+    def capture_states(self, client) -> List[Dict[str, Any]]:
+        """
+        Download `/api/states` through a client, bypassing its cache, and record the result.
+
+        Args:
+            client (Client): The client to download with.
+
+        Returns:
+            list: The recorded states.
+        """
+        states = make_request(f'{client.url}/api/states', client.token, policy=client.policy,
+                              metrics=client.metrics).json()
+        self.record_states(states)
+
+        return states
+
+    async def attach(self, ws_client, event_type: str = None):
+        """
+        Record events from a WebSocket client until `detach()` is called.
+
+        Args:
+            ws_client (WebSocketClient): A connected and authenticated WebSocket client.
+            event_type (str): The event type to record; every event if omitted.
+        """
+        if self.__subscription_id is not None:
+            raise RuntimeError('This recorder is already attached to a WebSocket client.')
+
+        self.__subscription_id = await ws_client.subscribe_events(self.record_event, event_type)
+        self.__ws_client = ws_client
+
+    async def detach(self):
+        if self.__subscription_id is None:
+            return
+
+        subscription_id, self.__subscription_id = self.__subscription_id, None
+        await self.__ws_client.unsubscribe(subscription_id)
+        self.__ws_client = None
+
+    def flush(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.flush()
+                self.__last_flush = time.monotonic()
+
+    def close(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+
+def _read_header(f) -> float:
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError('Not a traffic recording: the file is too short.')
+
+    magic, version, started_at = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('Not a traffic recording.')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported traffic recording version: {version}')
+
+    return started_at
+
+
+def _complete_length(f) -> int:
+    end = f.seek(0, os.SEEK_END)
+    position = HEADER.size
+
+    while position + RECORD.size <= end:
+        f.seek(position)
+        _, _, size = RECORD.unpack(f.read(RECORD.size))
+        if position + RECORD.size + size > end:
+            break
+        position += RECORD.size + size
+
+    return position
+
+
+def read_recording(path: str, json_backend: str = None) -> Iterator[Record]:
+    """
+    Read the records of a traffic recording in order.
+
+    Args:
+        path (str): The recording.
+        json_backend (str): The JSON backend used to decode payloads.
+
+    Returns:
+        Iterator[Record]: The records. A truncated last record is skipped.
+
+    Raises:
+        ValueError: If the file isn't a traffic recording.
+
+    Usage example:
+    >>> for record in read_recording('traffic.hacr'):
+    ...     print(record.kind, record.offset)
+    """
+    loads = get_backend(json_backend).loads
+
+    with open(path, 'rb') as f:
+        _read_header(f)
+
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+
+            flags, offset, size = RECORD.unpack(head)
+            data = f.read(size)
+            if len(data) < size:
+                return
+
+            if flags & FLAG_COMPRESSED:
+                data = zlib.decompress(data)
+
+            yield Record(flags & KIND_MASK, offset, loads(data))
+
+
+class TrafficReplayer:
+    """
+    Replays a traffic recording into an entity index and batch listeners, or into a FakeHomeAssistant.
+
+    Records are paced by their recorded offsets divided by `speed`; a `speed` of None replays as fast as possible.
+    Whatever is due at once is applied as one batch of up to `batch_size` events, the way `EventIngestor` does, and
+    batch listeners get the same `state_changed` data lists, so a `RuleEngine` or `SharedStatePublisher` can be attached
+    to a replayer just like to an ingestor.
+
+    Every run returns a report: the number of `events` and `snapshots` applied and events `skipped`, the `seconds` it
+    took against the `recorded_seconds`, `events_per_second`, the p50/p99 `lag` behind schedule at which events were
+    applied, and per stage (decoding the file, applying to the index or serving, running the listeners) the total
+    `seconds` and p50/p99 seconds per call.
+
+    Usage example:
+    >>> replayer = TrafficReplayer('traffic.hacr', speed=10)
+    >>> engine.attach(replayer)
+    >>> report = replayer.replay_into(client.entities)
+    >>> report['events_per_second'], report['lag']['p99']
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, batch_size: int = 256, metrics: Metrics = None,
+                 json_backend: str = None):
+        """
+        Initializes a new instance of the TrafficReplayer class.
+
+        Args:
+            path (str): The recording to replay.
+            speed (float): How many times faster than recorded to replay; None for as fast as possible.
+            batch_size (int): The maximum number of events applied at once.
+            metrics (Metrics): Where to count replayed events and snapshots. Defaults to a registry of its own.
+            json_backend (str): The JSON backend used to decode payloads.
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError('"speed" must be positive, or None to replay as fast as possible.')
+
+        if batch_size < 1:
+            raise ValueError('"batch_size" must be at least 1!')
+
+        self.__path = path
+        self.speed = speed
+        self.batch_size = batch_size
+        self.__metrics = metrics or Metrics()
+        self.__json_backend = json_backend
+        self.__listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+    def __repr__(self):
+        return f'<TrafficReplayer path={self.__path} speed={self.speed or "max"}>'
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
+    def add_batch_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        """
+        Register a callable to receive each batch of `state_changed` data after it was applied.
+        """
+        self.__listeners.append(listener)
+
+    def remove_batch_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        self.__listeners.remove(listener)
+
+    def replay_into(self, entities) -> Dict[str, Any]:
+        """
+        Replay the recording into an entity index and the batch listeners.
+
+        Snapshots replace the whole index; `state_changed` events are applied in batches. Other events are skipped.
+
+        Args:
+            entities (Entities): The index to replay into.
+
+        Returns:
+            dict: The report; see the class docstring.
+        """
+
+        def apply_snapshot(states):
+            entities.load_states(states)
+
+        def apply_events(batch):
+            data = [event['data'] for event in batch if event['event_type'] == 'state_changed']
+            if data:
+                entities.apply_state_changes(data)
+            return data
+
+        return self._replay(apply_snapshot, apply_events, 'apply')
+
+    def replay_to_server(self, fake) -> Dict[str, Any]:
+        """
+        Replay the recording through a FakeHomeAssistant, so clients connected to it see the recorded traffic.
+
+        Snapshots replace the served states without firing events; `state_changed` events update them and are sent to
+        subscribers; any other event is fired as it is.
+
+        Args:
+            fake (FakeHomeAssistant): A running fake server.
+
+        Returns:
+            dict: The report; see the class docstring.
+        """
+
+        def apply_events(batch):
+            data = []
+
+            for event in batch:
+                if event['event_type'] != 'state_changed':
+                    fake.fire_event(event['event_type'], event['data'])
+                    continue
+
+                change = event['data']
+                new_state = change['new_state']
+
+                if new_state is None:
+                    fake.remove_state(change['entity_id'])
+                else:
+                    fake.set_state(change['entity_id'], new_state['state'], new_state.get('attributes'))
+
+                data.append(change)
+
+            return data
+
+        return self._replay(fake.load_states, apply_events, 'serve')
+
+    def _replay(self, apply_snapshot, apply_events, stage: str) -> Dict[str, Any]:
+        metrics = self.__metrics
+        clock = time.perf_counter
+        records = read_recording(self.__path, self.__json_backend)
+        # Per run, unlike the metrics registry, so every report covers exactly one replay.
+        lag = Histogram(LAG_BUCKETS)
+        stages = {name: Histogram(STAGE_BUCKETS) for name in ('decode', stage, 'listeners')}
+        # The current state of every entity, to give `state_changed` events back the `old_state` the recorder dropped.
+        current: Dict[str, Dict[str, Any]] = {}
+        batch, batch_due = [], []
+        counts = {'events': 0, 'snapshots': 0, 'skipped': 0}
+        first_offset = last_offset = None
+        started = clock()
+
+        def flush():
+            if not batch:
+                return
+
+            start = clock()
+            data = apply_events(batch)
+            done = clock()
+            stages[stage].observe(done - start)
+
+            if data and self.__listeners:
+                for listener in list(self.__listeners):
+                    listener(data)
+
+                start, done = done, clock()
+                stages['listeners'].observe(done - start)
+
+            for due in batch_due:
+                lag.observe(max(done - due, 0.0))
+
+            counts['events'] += len(data)
+            counts['skipped'] += len(batch) - len(data)
+            metrics.increment('hac_replay_events_total', len(batch))
+            batch.clear()
+            batch_due.clear()
+
+        while True:
+            start = clock()
+            record = next(records, None)
+            stages['decode'].observe(clock() - start)
+
+            if record is None:
+                break
+
+            if first_offset is None:
+                first_offset = record.offset
+            last_offset = record.offset
+
+            # Flat out, lag is how long an event waited in its batch after being read.
+            due = clock() if self.speed is None else started + (record.offset - first_offset) / self.speed
+
+            if due > clock():
+                # Apply what is already due before waiting for the next record.
+                flush()
+                wait = due - clock()
+                if wait > 0:
+                    time.sleep(wait)
+
+            if record.kind == SNAPSHOT:
+                flush()
+                current = {state['entity_id']: state for state in record.payload}
+
+                start = clock()
+                apply_snapshot(record.payload)
+                stages[stage].observe(clock() - start)
+
+                counts['snapshots'] += 1
+                metrics.increment('hac_replay_snapshots_total')
+                continue
+
+            event = record.payload
+
+            if event['event_type'] == 'state_changed':
+                data = event['data']
+                entity_id, new_state = data['entity_id'], data['new_state']
+                data['old_state'] = current.get(entity_id)
+
+                if new_state is None:
+                    current.pop(entity_id, None)
+                else:
+                    current[entity_id] = new_state
+
+            batch.append(event)
+            batch_due.append(due)
+
+            if len(batch) >= self.batch_size:
+                flush()
+
+        flush()
+
+        elapsed = clock() - started
+        recorded = last_offset - first_offset if first_offset is not None else 0.0
+
+        return {
+                **counts,
+                'seconds':           elapsed,
+                'recorded_seconds':  recorded,
+                'speedup':           recorded / elapsed if elapsed else None,
+                'events_per_second': counts['events'] / elapsed if elapsed else None,
+                'lag':               {'p50': lag.quantile(0.5), 'p99': lag.quantile(0.99)},
+                'stages':            {
+                        name: {
+                                'seconds': histogram.sum,
+                                'count':   histogram.count,
+                                'p50':     histogram.quantile(0.5),
+                                'p99':     histogram.quantile(0.99),
+                                }
+                        for name, histogram in stages.items() if histogram.count
+                        },
+                }
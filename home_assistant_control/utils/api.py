@@ -1,42 +1,81 @@
+import time
+
+from home_assistant_control.errors.client import APIError
 from home_assistant_control.utils import get_headers
-from requests import get, RequestException
+from home_assistant_control.utils.metrics import endpoint_label
+from home_assistant_control.utils.resilience import DEFAULT_POLICY
 
 BASE_ENDPOINT = '/api/'
 
 
-def make_request(url: str, token: str):
+def make_request(url: str, token: str, method: str = 'GET', data: dict = None, policy=None, metrics=None,
+                 stream: bool = False):
     """Make an HTTP request and handle potential errors.
 
     Args:
         url (str): The URL to send the request to.
         token (str): The authorization token.
+        method (str): The HTTP method to use.
+        data (dict): Optional JSON body to send with the request.
+        policy (RequestPolicy): The timeout/retry/circuit-breaker policy to apply. Defaults to `DEFAULT_POLICY`.
+        metrics (Metrics): Optional registry to record latency, bytes transferred and errors in.
+        stream (bool): Return as soon as the headers arrived and leave the body to be read from the response. The
+            caller must close the response, and count the bytes it reads itself.
 
     Returns:
         Response: The HTTP response.
 
     Raises:
-        RequestException: If there's a network-related error.
+        APIError: If the request failed; see `RequestPolicy.execute` for the more specific subclasses.
     """
+    policy = policy or DEFAULT_POLICY
     headers = get_headers(token)
-    res = get(url, headers=headers)
-    res.raise_for_status()  # This will raise HTTPError for bad responses (4xx and 5xx)
+
+    kwargs = {'headers': headers}
+    if data is not None:
+        kwargs['json'] = data
+    if stream:
+        kwargs['stream'] = True
+
+    if metrics is None:
+        return policy.execute(method, url, **kwargs)
+
+    endpoint = endpoint_label(url)
+    start = time.perf_counter()
+
+    try:
+        res = policy.execute(method, url, **kwargs)
+    except APIError as e:
+        metrics.observe('hac_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, method=method)
+        metrics.increment('hac_request_errors_total', endpoint=endpoint, method=method, error=type(e).__name__)
+        raise
+
+    metrics.observe('hac_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, method=method)
+
+    # Reading `content` would pull a streamed body into memory.
+    if not stream:
+        metrics.increment('hac_request_bytes_received_total', len(res.content), endpoint=endpoint)
+
+    if res.request is not None and res.request.body:
+        metrics.increment('hac_request_bytes_sent_total', len(res.request.body), endpoint=endpoint)
+
     return res
 
 
-def validate_token(url, token) -> bool:
+def validate_token(url, token, policy=None, metrics=None) -> bool:
     """Validate the token by making a request to the base API endpoint.
 
     Returns:
         bool: True if the token is valid, False otherwise.
     """
     try:
-        res = make_request(f'{url}{BASE_ENDPOINT}', token)
+        res = make_request(f'{url}{BASE_ENDPOINT}', token, policy=policy, metrics=metrics)
         return res.status_code == 200
-    except RequestException:
+    except APIError:
         return False
 
 
-def validate_and_return_token(url, token):
-    if not validate_token(url, token):
+def validate_and_return_token(url, token, policy=None, metrics=None):
+    if not validate_token(url, token, policy=policy, metrics=metrics):
         raise ValueError('Invalid token!')
     return token
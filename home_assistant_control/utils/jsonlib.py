@@ -0,0 +1,68 @@
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class JSONBackend:
+    """
+    A pair of JSON encode/decode functions.
+
+    Usage example:
+    >>> backend = get_backend()
+    >>> backend.loads('{"type": "auth_ok"}')
+    {'type': 'auth_ok'}
+    """
+
+    def __init__(self, name: str, loads: Callable[[Any], Any], dumps: Callable[[Any], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return f'<JSONBackend name={self.name}>'
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode('utf-8')
+
+
+STDLIB = JSONBackend('json', json.loads, json.dumps)
+ORJSON = JSONBackend('orjson', orjson.loads, _orjson_dumps) if orjson is not None else None
+
+
+def available_backends() -> dict:
+    """
+    Get every JSON backend that can be used in this environment.
+
+    Returns:
+        dict: The backends, keyed by name.
+    """
+    return {backend.name: backend for backend in (ORJSON, STDLIB) if backend is not None}
+
+
+def get_backend(name: str = None) -> JSONBackend:
+    """
+    Get a JSON backend by name, or the fastest one available.
+
+    Args:
+        name (str): 'orjson' or 'json'. Defaults to orjson when it is installed.
+
+    Returns:
+        JSONBackend: The backend.
+
+    Raises:
+        ValueError: If the named backend isn't available.
+    """
+    backends = available_backends()
+
+    if name is None:
+        return ORJSON or STDLIB
+
+    try:
+        return backends[name]
+    except KeyError:
+        raise ValueError(f'JSON backend {name!r} is not available. Must be one of {sorted(backends)}') from None
@@ -0,0 +1,310 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlparse
+
+# Path prefixes whose trailing segment is an entity ID. Collapsing it keeps the number of label values bounded.
+_ENTITY_PATH_PREFIXES = ('/api/states/', '/api/camera_proxy/', '/api/camera_proxy_stream/', '/api/history/period/')
+
+
+def endpoint_label(url: str) -> str:
+    """
+    Reduce a request URL to a low-cardinality endpoint label.
+
+    Args:
+        url (str): The full request URL.
+
+    Returns:
+        str: The URL path with entity IDs replaced by a placeholder.
+
+    Usage Examples:
+        >>> endpoint_label('http://homeassistant.local:8123/api/states/light.kitchen')
+        '/api/states/{entity_id}'
+
+        >>> endpoint_label('http://homeassistant.local:8123/api/services/light/turn_on')
+        '/api/services/light/turn_on'
+    """
+    path = urlparse(url).path or '/'
+
+    for prefix in _ENTITY_PATH_PREFIXES:
+        if path.startswith(prefix) and len(path) > len(prefix):
+            return f'{prefix}{{entity_id}}'
+
+    return path
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram, compatible with the Prometheus histogram type.
+
+    Usage example:
+    >>> hist = Histogram()
+    >>> hist.observe(0.042)
+    >>> hist.count
+    1
+    """
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: Tuple[float, ...] = None):
+        """
+        Initializes a new instance of the Histogram class.
+
+        Args:
+            buckets (tuple): Sorted upper bounds of the buckets. An implicit +Inf bucket is always added.
+        """
+        self.__buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.__counts = [0] * (len(self.__buckets) + 1)
+        self.__sum = 0.0
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<Histogram count={self.count} sum={self.sum:.6f}>'
+
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        return self.__buckets
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def observe(self, value: float):
+        """
+        Record a single observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        index = bisect.bisect_left(self.__buckets, value)
+
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += value
+            self.__count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by linear interpolation within the bucket it falls in.
+
+        Args:
+            q (float): The quantile to estimate, between 0 and 1.
+
+        Returns:
+            float: The estimated value, or 0.0 if nothing has been observed.
+        """
+        with self.__lock:
+            counts = list(self.__counts)
+            total = self.__count
+
+        if not total:
+            return 0.0
+
+        rank = q * total
+        seen = 0
+
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.__buckets[index - 1] if index else 0.0
+                # Anything past the last bound is reported as the last bound.
+                upper = self.__buckets[index] if index < len(self.__buckets) else self.__buckets[-1]
+                return lower + (upper - lower) * ((rank - seen) / count)
+
+            seen += count
+
+        return self.__buckets[-1]
+
+    def snapshot(self) -> dict:
+        """
+        Get a point-in-time copy of the histogram.
+
+        Returns:
+            dict: The cumulative bucket counts, sum and count.
+        """
+        with self.__lock:
+            counts = list(self.__counts)
+            total, value_sum = self.__count, self.__sum
+
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.__buckets + (float('inf'),), counts):
+            running += count
+            cumulative.append((bound, running))
+
+        return {'buckets': cumulative, 'sum': value_sum, 'count': total}
+
+
+class Metrics:
+    """
+    A thread-safe registry of counters, gauges and histograms describing what the client is doing.
+
+    Every recorded value is also passed to the registered hooks, which makes it easy to forward measurements to
+    another monitoring system. Hooks are called as `hook(kind, name, value, labels)`.
+
+    Usage example:
+    >>> metrics = Metrics()
+    >>> metrics.add_hook(lambda kind, name, value, labels: print(kind, name, value, labels))
+    >>> metrics.increment('hac_state_cache_hits_total')
+    counter hac_state_cache_hits_total 1 {}
+    """
+    COUNTER = 'counter'
+    GAUGE = 'gauge'
+    HISTOGRAM = 'histogram'
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters: Dict[tuple, float] = {}
+        self.__gauges: Dict[tuple, float] = {}
+        self.__histograms: Dict[tuple, Histogram] = {}
+        self.__hooks: List[Callable] = []
+
+    def __repr__(self):
+        return (f'<Metrics counters={len(self.__counters)} gauges={len(self.__gauges)} '
+                f'histograms={len(self.__histograms)} hooks={len(self.__hooks)}>')
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def add_hook(self, hook: Callable):
+        """Register a callable to receive every recorded value."""
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook: Callable):
+        """Stop sending recorded values to a previously registered hook."""
+        self.__hooks.remove(hook)
+
+    def _dispatch(self, kind: str, name: str, value: float, labels: dict):
+        for hook in list(self.__hooks):
+            try:
+                hook(kind, name, value, labels)
+            except Exception:
+                # A broken hook must never break the call being measured.
+                key = self._key('hac_metrics_hook_errors_total', {})
+                with self.__lock:
+                    self.__counters[key] = self.__counters.get(key, 0) + 1
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """
+        Increase a counter.
+
+        Args:
+            name (str): The metric name.
+            value (float): The amount to add.
+            **labels: The metric's labels.
+        """
+        key = self._key(name, labels)
+
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+        self._dispatch(self.COUNTER, name, value, labels)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Set a gauge to an absolute value.
+
+        Args:
+            name (str): The metric name.
+            value (float): The new value.
+            **labels: The metric's labels.
+        """
+        with self.__lock:
+            self.__gauges[self._key(name, labels)] = value
+
+        self._dispatch(self.GAUGE, name, value, labels)
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = None, **labels):
+        """
+        Record an observation in a histogram, creating it on first use.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observed value.
+            buckets (tuple): Bucket bounds, only used when the histogram is created.
+            **labels: The metric's labels.
+        """
+        key = self._key(name, labels)
+        histogram = self.__histograms.get(key)
+
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(key, Histogram(buckets))
+
+        histogram.observe(value)
+        self._dispatch(self.HISTOGRAM, name, value, labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Time the body of a `with` block and record the duration, in seconds, in a histogram.
+
+        Usage example:
+        >>> with metrics.timer('hac_entity_index_rebuild_seconds'):
+        ...     rebuild()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """Get the current value of a counter (0 if it was never incremented)."""
+        return self.__counters.get(self._key(name, labels), 0)
+
+    def gauge(self, name: str, **labels) -> float:
+        """Get the current value of a gauge, or None if it was never set."""
+        return self.__gauges.get(self._key(name, labels))
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """Get a histogram, or None if nothing was observed."""
+        return self.__histograms.get(self._key(name, labels))
+
+    def ratio(self, hits: str, misses: str, **labels) -> float:
+        """
+        Compute a hit rate from a pair of counters.
+
+        Returns:
+            float: hits / (hits + misses), or 0.0 if neither counter was incremented.
+        """
+        hit_count = self.counter(hits, **labels)
+        total = hit_count + self.counter(misses, **labels)
+
+        return hit_count / total if total else 0.0
+
+    def snapshot(self) -> dict:
+        """
+        Get a point-in-time copy of every metric.
+
+        Returns:
+            dict: Lists of counters, gauges and histograms, each entry holding its name, labels and value(s).
+        """
+        with self.__lock:
+            counters = list(self.__counters.items())
+            gauges = list(self.__gauges.items())
+            histograms = list(self.__histograms.items())
+
+        return {
+                'counters':   [{'name': name, 'labels': dict(labels), 'value': value}
+                               for (name, labels), value in counters],
+                'gauges':     [{'name': name, 'labels': dict(labels), 'value': value}
+                               for (name, labels), value in gauges],
+                'histograms': [{'name': name, 'labels': dict(labels), **hist.snapshot()}
+                               for (name, labels), hist in histograms],
+                }
+
+    def reset(self):
+        """
+        Drop every recorded value. Hooks stay registered.
+        """
+        with self.__lock:
+            self.__counters.clear()
+            self.__gauges.clear()
+            self.__histograms.clear()
@@ -0,0 +1,106 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return f'{{{pairs}}}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot: dict) -> str:
+    """
+    Render a `Metrics.snapshot()` in the Prometheus text exposition format.
+
+    Args:
+        snapshot (dict): The metrics snapshot.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} {kind}')
+
+    for entry in sorted(snapshot.get('counters', []), key=lambda e: e['name']):
+        declare(entry['name'], 'counter')
+        lines.append(f'{entry["name"]}{_format_labels(entry["labels"])} {_format_value(entry["value"])}')
+
+    for entry in sorted(snapshot.get('gauges', []), key=lambda e: e['name']):
+        declare(entry['name'], 'gauge')
+        lines.append(f'{entry["name"]}{_format_labels(entry["labels"])} {_format_value(entry["value"])}')
+
+    for entry in sorted(snapshot.get('histograms', []), key=lambda e: e['name']):
+        name, labels = entry['name'], entry['labels']
+        declare(name, 'histogram')
+
+        for bound, count in entry['buckets']:
+            bucket_labels = _format_labels({**labels, 'le': _format_value(bound)})
+            lines.append(f'{name}_bucket{bucket_labels} {count}')
+
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(entry["sum"])}')
+        lines.append(f'{name}_count{_format_labels(labels)} {entry["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def serve(metrics, host: str = '127.0.0.1', port: int = 9464):
+    """
+    Serve the given metrics at `/metrics` from a background thread.
+
+    Args:
+        metrics (Metrics): The metrics registry to expose.
+        host (str): The interface to bind to. Defaults to localhost only.
+        port (int): The port to listen on. Pass 0 to pick a free one.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown()` on it to stop serving.
+
+    Usage example:
+    >>> server = serve(client.metrics, port=9464)
+    >>> server.shutdown()
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+
+            body = render(metrics.snapshot()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, name='hac-metrics-exporter', daemon=True)
+    thread.start()
+
+    return server
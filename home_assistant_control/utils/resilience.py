@@ -0,0 +1,335 @@
+import random
+import threading
+import time
+
+import requests
+from requests import RequestException, ConnectTimeout, Timeout
+from urllib3.exceptions import NewConnectionError
+
+from home_assistant_control.errors.client import (
+    APIError,
+    AuthenticationError,
+    CircuitOpenError,
+    RequestTimeoutError,
+    )
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker guarding calls to a single Home Assistant instance.
+
+    The breaker starts *closed* and lets every call through. After `failure_threshold` consecutive failures it
+    *opens* and rejects calls outright until `recovery_timeout` seconds have passed. It then goes *half-open* and lets a
+    single probe through; a successful probe closes the breaker again, a failed one re-opens it.
+
+    Usage example:
+    >>> breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10)
+    >>> breaker.allow()
+    True
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        Initializes a new instance of the CircuitBreaker class.
+
+        Args:
+            failure_threshold (int): Consecutive failures needed to open the breaker.
+            recovery_timeout (float): Seconds to wait before letting a probe request through.
+        """
+        if failure_threshold < 1:
+            raise ValueError('"failure_threshold" must be at least 1!')
+
+        self.__failure_threshold = failure_threshold
+        self.__recovery_timeout = recovery_timeout
+        self.__lock = threading.Lock()
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probe_in_flight = False
+
+    def __repr__(self):
+        return f'<CircuitBreaker state={self.state} failures={self.__failures}>'
+
+    @property
+    def failure_threshold(self) -> int:
+        return self.__failure_threshold
+
+    @property
+    def recovery_timeout(self) -> float:
+        return self.__recovery_timeout
+
+    @property
+    def state(self) -> str:
+        """
+        Get the current state of the breaker.
+
+        Returns:
+            str: One of 'closed', 'open' or 'half_open'.
+        """
+        with self.__lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # Must be called with the lock held.
+        if self.__state == self.OPEN and time.monotonic() - self.__opened_at >= self.__recovery_timeout:
+            self.__state = self.HALF_OPEN
+            self.__probe_in_flight = False
+
+        return self.__state
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go through right now.
+
+        Returns:
+            bool: True if the call may proceed, False if it should fail fast.
+        """
+        with self.__lock:
+            state = self._current_state()
+
+            if state == self.CLOSED:
+                return True
+
+            if state == self.HALF_OPEN and not self.__probe_in_flight:
+                self.__probe_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self):
+        """
+        Record a successful call, closing the breaker.
+        """
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+            self.__opened_at = None
+            self.__probe_in_flight = False
+
+    def record_failure(self):
+        """
+        Record a failed call, opening the breaker once the threshold is reached.
+        """
+        with self.__lock:
+            self.__failures += 1
+            self.__probe_in_flight = False
+
+            if self.__state == self.HALF_OPEN or self.__failures >= self.__failure_threshold:
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+
+    def reset(self):
+        """
+        Force the breaker back into the closed state.
+        """
+        self.record_success()
+
+
+def _never_sent(error: Exception) -> bool:
+    # Whether the request never left this machine: connecting timed out, was refused or the name didn't resolve.
+    if isinstance(error, ConnectTimeout):
+        return True
+
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+
+    # requests wraps urllib3's MaxRetryError, whose `reason` is the error that ended the attempt. A ConnectionError
+    # raised later (e.g. "Connection aborted" while reading the response) may come after the request was sent.
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, NewConnectionError)
+
+
+class RequestPolicy:
+    """
+    Timeout, retry and circuit-breaker policy applied to every REST call made against Home Assistant.
+
+    Idempotent methods are retried on connection errors, timeouts and retryable status codes using exponential backoff
+    with full jitter. Non-idempotent methods (i.e. service calls made with POST) are only retried when the connection
+    could not be established at all (a connect timeout, a refused connection or a failed name lookup), so a command is
+    never sent twice unless `retry_non_idempotent` is set.
+
+    `requests.Session` isn't documented as thread-safe, so unless a session is passed in, every thread gets a session
+    (and connection pool) of its own. That makes one policy, including the module's `DEFAULT_POLICY`, safe to share
+    between threads.
+
+    Usage example:
+    >>> policy = RequestPolicy(connect_timeout=2, read_timeout=5, max_retries=2, breaker=CircuitBreaker())
+    >>> res = policy.execute('GET', 'http://homeassistant.local:8123/api/', headers={})
+    """
+    IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+    RETRY_STATUSES = frozenset({429, 502, 503, 504})
+    AUTH_STATUSES = frozenset({401, 403})
+
+    def __init__(
+            self,
+            connect_timeout: float = 3.05,
+            read_timeout: float = 10.0,
+            max_retries: int = 3,
+            backoff_base: float = 0.25,
+            backoff_max: float = 5.0,
+            retry_non_idempotent: bool = False,
+            breaker: CircuitBreaker = None,
+            session=None
+            ):
+        """
+        Initializes a new instance of the RequestPolicy class.
+
+        Args:
+            connect_timeout (float): Seconds to wait for the TCP connection to be established.
+            read_timeout (float): Seconds to wait between bytes of the response.
+            max_retries (int): How many times a failed call is retried (0 disables retries).
+            backoff_base (float): Base delay, in seconds, of the exponential backoff.
+            backoff_max (float): Upper bound, in seconds, of a single backoff delay.
+            retry_non_idempotent (bool): Also retry non-idempotent calls after the request may have been sent.
+            breaker (CircuitBreaker): Optional circuit breaker shared by every call made through this policy.
+            session (requests.Session): Optional session to send requests with, from every thread; the caller must
+                make sure that is safe. If omitted, each thread creates its own.
+        """
+        if max_retries < 0:
+            raise ValueError('"max_retries" must not be negative!')
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_non_idempotent = retry_non_idempotent
+        self.__breaker = breaker
+        self.__session = session
+        self.__local = threading.local()
+
+    def __repr__(self):
+        return (f'<RequestPolicy timeout={self.timeout} max_retries={self.max_retries} '
+                f'breaker={self.__breaker}>')
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self.__breaker
+
+    @property
+    def session(self):
+        """
+        The session the calling thread sends requests with.
+        """
+        if self.__session is not None:
+            return self.__session
+
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            session = self.__local.session = requests.Session()
+
+        return session
+
+    @property
+    def timeout(self) -> tuple:
+        """
+        Get the (connect, read) timeout tuple passed to `requests`.
+
+        Returns:
+            tuple: The connect and read timeouts.
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Compute the delay before the given retry attempt using full jitter.
+
+        Args:
+            attempt (int): The zero-based retry attempt.
+
+        Returns:
+            float: The number of seconds to sleep.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def is_idempotent(self, method: str) -> bool:
+        return method.upper() in self.IDEMPOTENT_METHODS
+
+    def _may_retry(self, method: str, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+
+        # The request never left this machine, so even a service call is safe to resend.
+        if _never_sent(error):
+            return True
+
+        return self.is_idempotent(method) or self.retry_non_idempotent
+
+    def execute(self, method: str, url: str, **kwargs):
+        """
+        Send a request under this policy.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to send the request to.
+            **kwargs: Passed through to `requests.Session.request`.
+
+        Returns:
+            Response: The successful HTTP response.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            AuthenticationError: If Home Assistant rejected the token.
+            RequestTimeoutError: If the request timed out on every attempt.
+            APIError: For any other failed request.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+
+        while True:
+            if self.__breaker is not None and not self.__breaker.allow():
+                raise CircuitOpenError(f'Circuit breaker is open; not sending {method} {url}')
+
+            try:
+                res = self.session.request(method, url, **kwargs)
+            except Timeout as e:
+                error = RequestTimeoutError(f'{method} {url} timed out: {e}')
+                error.__cause__ = e
+            except RequestException as e:
+                error = APIError(f'{method} {url} failed: {e}')
+                error.__cause__ = e
+            else:
+                if res.status_code in self.AUTH_STATUSES:
+                    # The server is healthy, it just doesn't like us.
+                    self._record_success()
+                    res.close()
+                    raise AuthenticationError(f'{method} {url} was rejected with status {res.status_code}',
+                                              status_code=res.status_code)
+
+                if res.status_code < 500 and res.status_code not in self.RETRY_STATUSES:
+                    self._record_success()
+
+                    try:
+                        res.raise_for_status()
+                    except RequestException as e:
+                        res.close()
+                        raise APIError(f'{method} {url} failed: {e}', status_code=res.status_code) from e
+
+                    return res
+
+                error = APIError(f'{method} {url} failed with status {res.status_code}', status_code=res.status_code)
+                # Give a streamed response's connection back to the pool before retrying.
+                res.close()
+
+            self._record_failure()
+
+            if not self._may_retry(method, error.__cause__ or error, attempt):
+                raise error
+
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def _record_success(self):
+        if self.__breaker is not None:
+            self.__breaker.record_success()
+
+    def _record_failure(self):
+        if self.__breaker is not None:
+            self.__breaker.record_failure()
+
+
+# Shared by every call made without a policy of its own; safe across threads, since each thread gets its own session.
+DEFAULT_POLICY = RequestPolicy()